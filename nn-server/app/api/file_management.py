@@ -1,6 +1,4 @@
-from database.models import User
 from flask import request
-from flask_jwt_extended import decode_token
 from flask_restful import Resource
 from jwt.exceptions import (ExpiredSignatureError,
                             DecodeError,
@@ -16,6 +14,7 @@ from resources.errors import (format_error_to_return,
                               UserDoesNotExists,
                               )
 from storage.S3 import StorageApi
+from utils.auth import authenticate
 from utils.limiter import apply_limits
 
 console_logger = Logger(__file__)
@@ -58,13 +57,7 @@ class CreateFoldersApi(Resource):
             if not access_token or not num_folders:
                 raise SomeRequestArgumentsMissing('Not all arguments are passed in the request')
 
-            decoded = decode_token(access_token)
-            user_id = decoded['sub']
-
-            exists = User.find_by_id(user_id) is not None
-
-            if not exists:
-                raise UserDoesNotExists
+            user_id = authenticate(access_token)
 
             user_folder = Storage.create_user_folder(user_id)
             dd_mm_yy_folder = Storage.create_dd_mm_yy_folder(user_folder)
@@ -1,9 +1,14 @@
+import base64
+import json
+import math
 import os
 import re
+from datetime import datetime
+from typing import Iterator, Union
 
 from flask import current_app
 from flask import request
-from flask_jwt_extended import decode_token
+from flask import Response, stream_with_context
 from flask_restful import Resource
 from jwt.exceptions import (ExpiredSignatureError,
                             DecodeError,
@@ -12,9 +17,10 @@ from jwt.exceptions import (ExpiredSignatureError,
 from kallosus_packages.over_logging import Logger, GetTraceback
 from redis.exceptions import ConnectionError
 from rq.exceptions import InvalidJobOperation
+from rq.job import Job
 
-from database.db import create_tables, is_table_exists
-from database.models import Task, User
+from database.db import create_tables, db, is_table_exists
+from database.models import Task
 from resources.errors import (format_error_to_return,
                               InternalServerError,
                               SomeRequestArgumentsMissing,
@@ -29,8 +35,13 @@ from resources.errors import (format_error_to_return,
                               UserDoesNotExists,
                               FileExistError,
                               BucketSizeExceeded,
+                              ServerBusyError,
+                              PredictionTimeoutError,
                               )
 from storage.S3 import StorageApi
+from task.detections import downsample, read_timeline
+from task.fan_out import FanOut
+from utils.auth import authenticate
 from utils.limiter import apply_limits
 
 console_logger = Logger(__file__)
@@ -39,6 +50,76 @@ get_traceback = GetTraceback(__file__)
 Storage = StorageApi()
 
 
+def task_status(task: Task, job) -> dict:
+    """
+    :param task: Задача
+    :param job: `rq.Job` задачи, None - задачи уже нет в Redis (прогресс 100, как в `Task.get_progress`)
+    :return: Прогресс, статус и этап обработки задачи
+    """
+
+    meta = job.meta if job is not None else {'progress': 100}
+
+    return {'progress': meta.get('progress', 0),
+            'status': task.status,
+            'eta': meta.get('eta', 0),  # Сколько осталось в секундах до конца обработки
+            'video_no': meta.get('video_no', 0),  # Какое видео обрабатывается сейчас
+            'videos_no': meta.get('videos_no', 0),  # Сколько всего видео
+            'stage': meta.get('stage', ''),
+            # Текущий этап обработки (video-processing/video-loading/images-loading/info-loading)
+            'preview': meta.get('preview', ''),  # Плейлист HLS обрабатываемого видео (`PreviewApi`)
+            # Точность модели, которой обрабатывается задача: fp32, если запрошенной INT8 модели нет на воркере
+            'precision': meta.get('precision', ''),
+            }
+
+
+def encode_cursor(task: Task) -> str:
+    """
+    :param task: Последняя задача страницы
+    :return: Курсор следующей страницы
+    """
+
+    position = json.dumps([task.created_at.isoformat(), task.id])
+
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    :param cursor: Курсор, полученный из `encode_cursor`
+    :return: (`created_at`, `id`) последней задачи предыдущей страницы
+    """
+
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ArgumentError(f'Incorrect `cursor`: {e}')
+
+
+def sign_playlist(playlist: str, folder: str) -> str:
+    """
+    :param playlist: Плейлист HLS, сегменты которого указаны относительно `folder`
+    :param folder: Папка плейлиста в хранилище
+    :return: Плейлист, в котором сегменты заменены ссылками на скачивание (`StorageApi.get_download_link`)
+    """
+
+    def sign(file: str) -> str:
+        return Storage.get_download_link(Storage.path_join(folder, file))
+
+    lines = []
+
+    for line in playlist.splitlines():
+        if line.startswith('#EXT-X-MAP:'):
+            line = re.sub(r'URI="([^"]+)"', lambda match: f'URI="{sign(match.group(1))}"', line)
+        elif line and not line.startswith('#'):
+            line = sign(line)
+
+        lines.append(line)
+
+    return '\n'.join(lines) + '\n'
+
+
 class PredictApi(Resource):
     """
     REST-API class для предсказания болезней растений
@@ -58,7 +139,18 @@ class PredictApi(Resource):
             "queue_files": {"src": ["C:\\Users\\pikro\\Kallosus\\NN server\\DATA\\videos\\cars.mp4"], "folder": ["S3/user_id/dd_mm_yy/time"]},
             "sleep": 0,
             "save_output": true,
-            "is_remove": false
+            "is_remove": false,
+            "batch_size": 8,
+            "execution_mode": "pipeline",
+            "sample_stride": 5,
+            "frame_gate": "diff",
+            "gate_threshold": 0.02,
+            "precision": "int8",
+            "render_mode": "lazy",
+            "top_k": 10,
+            "top_k_gap": 1.0,
+            "parallel": true,
+            "segment_seconds": 300
         }
 
         или
@@ -67,6 +159,28 @@ class PredictApi(Resource):
             "access_token": "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJzdWIiOjN9.2e6bS75p5SyJpacHBFic5KTMa8WA_UChrrAH8pucpyM",
             "queue_files": {"src": ["C:\\Users\\pikro\\Kallosus\\NN server\\DATA\\videos\\cars.mp4"], "dst": ["S3/user_id/dd_mm_yy/time"]}
         }
+
+        `batch_size` - сколько кадров передается в модель за один прямой проход (по умолчанию 1)
+        `execution_mode` - sequential (по умолчанию) или pipeline - декодирование, инференс и кодирование видео
+        выполняются параллельно
+        `sample_stride` - модель запускается только на каждом n-ом кадре, на остальные кадры переносятся последние
+        обнаружения; вместо него можно указать `target_fps` - сколько кадров в секунду обрабатывать моделью
+        `frame_gate` - diff или phash, модель не запускается на кадрах, почти не отличающихся от предыдущего
+        обработанного кадра (порог изменения от 0 до 1 - `gate_threshold`)
+        `precision` - fp32 (по умолчанию) или int8 - квантованная модель, быстрее на CPU, точность сравнивается
+        с fp32 в отчете `python -m task.quantize`. Если INT8 модель не собрана на воркере, видео обрабатывается fp32,
+        точность, с которой обрабатывается задача, - `precision` в статусе задачи
+        `render_mode` - eager (по умолчанию) - видео с bbox кодируется во время обработки, lazy - при первом запросе
+        `RenderApi`, idle - в фоне, когда воркеры свободны
+        `top_k` - сколько кадров с наибольшим количеством обнаружений сохранять (по умолчанию 10), `top_k_gap` -
+        минимальное расстояние между ними в секундах (по умолчанию 1), чтобы кадры не были из одного момента видео
+        `parallel` - видео задачи обрабатываются параллельно на свободных воркерах (по умолчанию false), прогресс и eta
+        считаются по всем видео
+        `segment_seconds` - видео длиннее `segment_seconds` секунд делятся на сегменты, которые обрабатываются
+        параллельно на свободных воркерах, а результаты сегментов объединяются
+        `video_format` - mp4 (по умолчанию) или hls - при `render_mode` eager видео с bbox сохраняется плейлистом HLS,
+        сегменты которого загружаются по мере обработки, поэтому видео можно смотреть до конца обработки
+        (`PreviewApi`, путь до плейлиста - `preview` в статусе задачи)
         """
 
         apply_limits('6/minute')
@@ -87,20 +201,55 @@ class PredictApi(Resource):
             if len(sources) != len(dst_folders):
                 raise ArgumentError('`sources` len must be the same as `dst_folders`')
 
-            decoded = decode_token(access_token)
-            user_id = decoded['sub']
+            if body.get('execution_mode', 'sequential') not in ['sequential', 'pipeline']:
+                raise ArgumentError('`execution_mode` must be one of: sequential, pipeline')
 
-            exists = User.find_by_id(user_id) is not None
+            if body.get('frame_gate') not in [None, 'diff', 'phash']:
+                raise ArgumentError('`frame_gate` must be one of: diff, phash')
 
-            if not exists:
-                raise UserDoesNotExists
+            if body.get('precision', 'fp32') not in ['fp32', 'int8']:
+                raise ArgumentError('`precision` must be one of: fp32, int8')
+
+            if body.get('render_mode', 'eager') not in ['eager', 'lazy', 'idle']:
+                raise ArgumentError('`render_mode` must be one of: eager, lazy, idle')
+
+            if body.get('video_format', 'mp4') not in ['mp4', 'hls']:
+                raise ArgumentError('`video_format` must be one of: mp4, hls')
+
+            for key, value_type in [('sample_stride', int),
+                                    ('target_fps', (int, float)),
+                                    ('gate_threshold', (int, float)),
+                                    ('top_k', int),
+                                    ('segment_seconds', (int, float)),
+                                    ]:
+                value = body.get(key)
+                if value is not None and (not isinstance(value, value_type) or isinstance(value, bool) or value <= 0):
+                    raise ArgumentError(f'`{key}` must be a positive number')
+
+            # Изменение кадра для `frame_gate` нормировано от 0 до 1
+            if body.get('gate_threshold') is not None and body['gate_threshold'] > 1:
+                raise ArgumentError('`gate_threshold` must be in range (0, 1]')
+
+            if not isinstance(body.get('parallel', False), bool):
+                raise ArgumentError('`parallel` must be a boolean')
+
+            top_k_gap = body.get('top_k_gap', 0)
+            if not isinstance(top_k_gap, (int, float)) or isinstance(top_k_gap, bool) or top_k_gap < 0:
+                raise ArgumentError('`top_k_gap` must be a non-negative number')
+
+            user_id = authenticate(access_token)
 
             if not Storage.is_bucket_under_limit():
                 raise BucketSizeExceeded
 
-            for file in sources:
-                if not Storage.path_exists(file):
-                    raise FileExistError(f'File {file} does not exist')
+            exists = Storage.paths_exist(sources)
+            missing = [file for file in sources if not exists[file]]
+
+            if missing:
+                if len(missing) > 1:
+                    console_logger.debug(f'PredictApi: files {missing} do not exist')
+
+                raise FileExistError(f'File {missing[0]} does not exist')
 
             if not is_table_exists('task'):
                 if os.environ.get('UNIT_TEST') in ['0', None]:
@@ -159,6 +308,109 @@ class PredictApi(Resource):
             return format_error_to_return(InternalServerError)
 
 
+class PredictImageApi(Resource):
+    """
+    REST-API class для синхронного прогноза по одному изображению
+    """
+
+    def post(self) -> tuple[dict, int]:
+        """
+        :return: Обнаруженные болезни, ссылка на размеченное изображение и время прогноза, код ответа
+
+        URL: `/api/pd/v{__version__}/predict_image`
+
+        В отличие от `PredictApi` задача не ставится в очередь: модель постоянно загружена (см. `ImagePredictor`),
+        поэтому результат возвращается сразу в ответе.
+
+        Пример запроса (изображение уже загружено в хранилище):
+        {
+            "access_token": "<TOKEN>",
+            "src": "S3/user_id/dd_mm_yy/time/leaf.jpg",
+            "dst": "S3/user_id/dd_mm_yy/time"
+        }
+
+        Или multipart/form-data с полями `access_token`, `dst` (необязательно) и файлом `image`.
+
+        `dst` - папка, куда сохранить изображение с bbox и label болезней, если не указана - изображение не сохраняется
+
+        Пример ответа:
+        {
+            "message": "Prediction done",
+            "detections": [{"label": "apple_rust", "confidence": 0.87, "bbox": [12.0, 40.5, 230.1, 310.0]}],
+            "image": "<URL>",
+            "latency_ms": 63.2
+        }
+        """
+
+        apply_limits('60/minute')
+
+        try:
+            if request.files:
+                body = request.form
+                image = request.files.get('image')
+                image_bytes = image.read() if image else None
+            else:
+                body = request.get_json()
+                image_bytes = None
+
+            access_token: str = body.get('access_token')
+            src: str = body.get('src')
+            dst: str = body.get('dst')
+
+            if not access_token or (image_bytes is None and not src):
+                raise SomeRequestArgumentsMissing('`access_token` or `src`/`image` missing')
+
+            if image_bytes is None and os.path.splitext(src)[1].lower() not in ['.jpg', '.jpeg', '.png']:
+                raise ArgumentError('`src` must be an image: .jpg, .jpeg, .png')
+
+            authenticate(access_token)
+
+            if src and not Storage.path_exists(src):
+                raise FileExistError(f'File {src} does not exist')
+
+            if dst and not Storage.is_bucket_under_limit():
+                raise BucketSizeExceeded
+
+            try:
+                result = current_app.image_predictor.predict(image_bytes=image_bytes, src=src, dst=dst)
+            except ValueError as e:  # Изображение не удалось декодировать
+                raise ArgumentError(f'{e}')
+
+            console_logger.debug(f'PredictImageApi: {len(result["detections"])} detections, {result["latency_ms"]} ms')
+
+            return {'message': 'Prediction done', **result}, 200
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except SomeRequestArgumentsMissing as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(SomeRequestArgumentsMissing)
+        except ArgumentError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ArgumentError)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except FileExistError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(FileExistError, {'file': re.findall('File (.*) does not exist', str(e))[0]})
+        except BucketSizeExceeded as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(BucketSizeExceeded)
+        except ServerBusyError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ServerBusyError)
+        except PredictionTimeoutError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(PredictionTimeoutError)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
+
 class StatusApi(Resource):
     """
     REST-API class для проверки статуса работы
@@ -188,16 +440,11 @@ class StatusApi(Resource):
             if not task_id or not access_token:
                 raise SomeRequestArgumentsMissing('`task_id` or `access_token` missing')
 
-            decoded = decode_token(access_token)
-            user_id = decoded['sub']
-
-            exists = User.find_by_id(user_id) is not None
-            if not exists:
-                raise UserDoesNotExists
+            user_id = authenticate(access_token)
 
             task = Task.find_by_id(task_id)
 
-            if not task:
+            if not task or str(task.user_id) != str(user_id):
                 raise NoTasksError
 
             job_id = task.job_id
@@ -210,22 +457,9 @@ class StatusApi(Resource):
             if not job:
                 raise JobDoesNotExist('Job is `None`')
 
-            progress = job.meta.get('progress', 0)
-            eta = job.meta.get('eta', 0)
-            video_no = job.meta.get('video_no', 0)
-            videos_no = job.meta.get('videos_no', 0)
-            stage = job.meta.get('stage', '')
-
             console_logger.debug('StatusApi')
 
-            return {'progress': progress,
-                    'status': task.status,
-                    'eta': eta,  # Сколько осталось в секундах до конца обработки
-                    'video_no': video_no,  # Какое видео обрабатывается сейчас
-                    'videos_no': videos_no,  # Сколько всего видео
-                    'stage': stage,
-                    # Текущий этап обработки (video-processing/video-loading/images-loading/info-loading)
-                    }, 200
+            return task_status(task, job), 200
         except ExpiredSignatureError as e:
             get_traceback.error(f'{e}')
             return format_error_to_return(ExpiredTokenError)
@@ -252,11 +486,227 @@ class StatusApi(Resource):
             return format_error_to_return(InternalServerError)
 
 
+class BatchStatusApi(Resource):
+    """
+    REST-API class для проверки статуса нескольких работ одним запросом
+    """
+
+    _MAX_TASKS = int(os.getenv('PD_STATUS_BATCH_LIMIT', 100))
+
+    def post(self) -> tuple[dict, int]:
+        """
+        :return: Прогресс выполнения и статус выполнения задач по их id, код ответа
+
+        URL: `/api/pd/v{__version__}/status/batch`
+
+        Задачи читаются из БД одним запросом (`IN`), а задачи RQ - одним pipeline Redis (`Job.fetch_many`),
+        поэтому стоимость запроса не зависит от количества задач.
+
+        Пример запроса:
+        {
+            "access_token", "<Token>",
+            "task_ids": [0, 1]
+        }
+
+        Пример ответа:
+        {
+            "tasks": {"0": {"progress": 100, "status": "complete", "eta": 0, ...}, "1": {...}},
+            "not_found": []
+        }
+
+        Поля статуса задачи - как в `StatusApi`, `not_found` - id задач, которых нет у пользователя
+        """
+
+        apply_limits('120/minute')
+
+        try:
+            body = request.get_json()
+
+            access_token: str = body.get('access_token')
+            task_ids: list[int] = body.get('task_ids')
+
+            if not task_ids or not access_token:
+                raise SomeRequestArgumentsMissing('`task_ids` or `access_token` missing')
+
+            if (not isinstance(task_ids, list) or len(task_ids) > self._MAX_TASKS
+                    or not all(isinstance(task_id, int) and not isinstance(task_id, bool) for task_id in task_ids)):
+                raise ArgumentError(f'`task_ids` must be a list of at most {self._MAX_TASKS} integers')
+
+            user_id = authenticate(access_token)
+
+            tasks = Task.find_by_ids(task_ids, int(user_id))
+            tasks_with_job = [task for task in tasks if task.job_id]
+            jobs = Job.fetch_many([task.job_id for task in tasks_with_job], connection=current_app.redis)
+            jobs_by_task = {task.id: job for task, job in zip(tasks_with_job, jobs)}
+
+            statuses = {str(task.id): task_status(task, jobs_by_task.get(task.id)) for task in tasks}
+            not_found = [task_id for task_id in task_ids if str(task_id) not in statuses]
+
+            console_logger.debug(f'BatchStatusApi: {len(statuses)} tasks')
+
+            return {'tasks': statuses, 'not_found': not_found}, 200
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except SomeRequestArgumentsMissing as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(SomeRequestArgumentsMissing)
+        except ArgumentError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ArgumentError)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except ConnectionError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(WorkerDoesNotRunError)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
+
+class StatusStreamApi(Resource):
+    """
+    REST-API class для получения статуса работы потоком событий (Server-Sent Events)
+    """
+
+    _FINAL_STATUSES = ['complete', 'error', 'stopped']
+    _HEARTBEAT = float(os.getenv('PD_STREAM_HEARTBEAT', 15))  # Интервал комментариев keep-alive в секундах
+
+    def get(self) -> Response | tuple[dict, int]:
+        """
+        :return: Поток событий `text/event-stream` || ошибка, код ответа
+
+        URL: `/api/pd/v{__version__}/status/stream?task_id=0&access_token=<Token>`
+
+        Токен передается в строке запроса, т.к. `EventSource` не позволяет задать тело и заголовки запроса.
+
+        Пользователь и задача проверяются один раз при подключении, затем первым событием отправляется текущий
+        статус (как в `StatusApi`), а дальше - изменения из канала Redis pub/sub задачи (`Task.channel`):
+        прогресс, eta и этап публикует воркер (`ProgressPublisher`), статус - `Task.set_status`/`finish_task`.
+        Событие содержит только изменившиеся поля. Поток закрывается после статуса complete/error/stopped.
+        """
+
+        apply_limits('30/minute')
+
+        try:
+            access_token: str = request.args.get('access_token')
+            task_id: str = request.args.get('task_id')
+
+            if not task_id or not access_token:
+                raise SomeRequestArgumentsMissing('`task_id` or `access_token` missing')
+
+            user_id = authenticate(access_token)
+
+            task = Task.find_by_id(task_id)
+
+            if not task or str(task.user_id) != str(user_id):
+                raise NoTasksError('No task using `task_id` found')
+
+            job_id = task.job_id
+
+            if not job_id:
+                raise IncorrectJobIDError('Job_id is `None`')
+
+            # Подписываемся до чтения статуса, чтобы не пропустить события между чтением и подпиской:
+            # задача уже прочитана выше, поэтому после подписки статус перечитывается
+            pubsub = current_app.redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(Task.channel(task.id))
+            db.session.refresh(task)
+
+            job = current_app.task_queue.fetch_job(job_id)
+
+            if not job:
+                pubsub.close()
+                raise JobDoesNotExist('Job is `None`')
+
+            status = task_status(task, job)
+
+            console_logger.debug(f'StatusStreamApi: task {task.id} subscribed')
+
+            response = Response(stream_with_context(self.stream(pubsub, status)), mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'  # nginx не буферизует ответ
+
+            return response
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except SomeRequestArgumentsMissing as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(SomeRequestArgumentsMissing)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except NoTasksError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(NoTasksError)
+        except IncorrectJobIDError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(IncorrectJobIDError)
+        except JobDoesNotExist as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(JobDoesNotExist)
+        except ConnectionError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(WorkerDoesNotRunError)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
+    @classmethod
+    def stream(cls, pubsub, status: dict) -> Iterator[str]:
+        """
+        :param pubsub: Подписка на канал задачи
+        :param status: Текущий статус задачи
+        :return: События SSE
+
+        Если событий нет `_HEARTBEAT` секунд, отправляется комментарий, чтобы прокси не закрыл соединение
+        """
+
+        try:
+            yield f'data: {json.dumps(status)}\n\n'
+
+            if status['status'] in cls._FINAL_STATUSES:
+                return
+
+            while True:
+                message = pubsub.get_message(timeout=cls._HEARTBEAT)
+
+                if message is None:
+                    yield ': keep-alive\n\n'
+                    continue
+
+                event = json.loads(message['data'])
+                yield f'data: {json.dumps(event)}\n\n'
+
+                if event.get('status') in cls._FINAL_STATUSES:
+                    return
+        finally:
+            pubsub.close()
+
+
 class ResultApi(Resource):
     """
     REST-API class для получения результатов выполнения
     """
 
+    # Поля задачи, которые можно запросить в `fields`, и соответствующие им колонки `Task`
+    _FIELDS = {'files': 'done_res_files',
+               'upload_status': 'is_files_upload',
+               'status': 'status',
+               'job_id': 'job_id',
+               'queue_files': 'queue_files',
+               'user_current_time_folders': 'user_current_time_folders',
+               }
+    _MAX_LIMIT = int(os.getenv('PD_RESULT_PAGE_LIMIT', 100))
+
     def post(self) -> tuple[dict, int]:
         """
         :return: Путь ко всем файлам с результатом в виде списка, а также список словарей для статуса загрузки файлов в облако
@@ -273,6 +723,18 @@ class ResultApi(Resource):
             "access_token": "<TOKEN>"
             "task_id": 0
         }
+
+        Пример запроса для получения задач пользователя по страницам (от новых к старым):
+        {
+            "access_token": "<TOKEN>",
+            "limit": 20,
+            "cursor": "<next_cursor предыдущей страницы>",
+            "fields": ["files", "upload_status"]
+        }
+
+        Ответ: {"tasks": [{"id": 0, "created_at": "...", "files": [...], "upload_status": {...}}, ...],
+        "next_cursor": "<cursor>" || null}. `fields` - любые из `_FIELDS` (по умолчанию files, upload_status),
+        из БД загружаются только их колонки.
         """
 
         apply_limits('60/minute')
@@ -286,12 +748,14 @@ class ResultApi(Resource):
             if not access_token:
                 raise SomeRequestArgumentsMissing('`access_token` missing')
 
-            decoded = decode_token(access_token)
-            user_id = decoded['sub']
+            if not task_id and ('limit' in body or 'cursor' in body):
+                return self.get_page(access_token,
+                                     body.get('limit', 20),
+                                     body.get('cursor'),
+                                     body.get('fields', ['files', 'upload_status']),
+                                     )
 
-            exists = User.find_by_id(user_id) is not None
-            if not exists:
-                raise UserDoesNotExists
+            user_id = authenticate(access_token)
 
             if task_id:  # Получаем done_res_files для одной задачи по ее id
                 task = Task.find_by_id(task_id)
@@ -302,7 +766,7 @@ class ResultApi(Resource):
                 done_res_files = task.done_res_files
                 upload_files_status = task.upload_data
             else:  # Получаем done_res_files для всех задач пользователя по его id
-                tasks = Task.find_by_user_id(user_id, False)
+                tasks = Task.find_by_user_id(user_id, False, columns=['done_res_files', 'is_files_upload'])
 
                 if not tasks:
                     raise NoTasksError('No tasks using `user_id` found')
@@ -344,6 +808,333 @@ class ResultApi(Resource):
             get_traceback.critical(f'{e}', print_full_exception=True)
             return format_error_to_return(InternalServerError)
 
+    def get_page(self, access_token: str, limit: int, cursor: Union[str, None], fields: list[str]) -> tuple[dict, int]:
+        """
+        :param access_token: Токен пользователя
+        :param limit: Количество задач на странице
+        :param cursor: `next_cursor` предыдущей страницы, None - первая страница
+        :param fields: Возвращаемые поля задачи
+        :return: Страница задач пользователя и курсор следующей страницы, код ответа
+        """
+
+        try:
+            if not isinstance(limit, int) or isinstance(limit, bool) or not 0 < limit <= self._MAX_LIMIT:
+                raise ArgumentError(f'`limit` must be in range [1, {self._MAX_LIMIT}]')
+
+            if not isinstance(fields, list) or not set(fields) <= set(self._FIELDS):
+                raise ArgumentError(f'`fields` must be a list of {list(self._FIELDS)}')
+
+            position = decode_cursor(cursor) if cursor is not None else None
+
+            user_id = authenticate(access_token)
+
+            # Запрашиваем на одну задачу больше, чтобы узнать, есть ли следующая страница
+            tasks = Task.find_page_by_user_id(int(user_id),
+                                              limit + 1,
+                                              position,
+                                              [self._FIELDS[field] for field in fields],
+                                              )
+            next_cursor = encode_cursor(tasks[limit - 1]) if len(tasks) > limit else None
+
+            page = []
+            for task in tasks[:limit]:
+                item = {'id': task.id, 'created_at': task.created_at.isoformat()}
+
+                for field in fields:
+                    item[field] = task.upload_data if field == 'upload_status' else getattr(task, self._FIELDS[field])
+
+                page.append(item)
+
+            console_logger.debug(f'ResultApi: page of {len(page)} tasks, next_cursor: {next_cursor}')
+
+            return {'tasks': page, 'next_cursor': next_cursor}, 200
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except ArgumentError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ArgumentError)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
+
+class RenderApi(Resource):
+    """
+    REST-API class для получения видео с bbox, отрисовываемого по запросу
+    """
+
+    def post(self) -> tuple[dict, int]:
+        """
+        :return: Ссылка на видео с bbox (200) или задача отрисовки, если видео еще не готово (202), код ответа
+
+        URL: `/api/pd/v{__version__}/render`
+
+        Если задача запущена с `render_mode` lazy/idle, видео с bbox не кодируется во время обработки,
+        а отрисовывается по сохраненным обнаружениям при первом запросе. Пока видео отрисовывается,
+        запрос можно повторять.
+
+        Пример запроса:
+        {
+            "access_token": "<TOKEN>",
+            "task_id": 0,
+            "video_no": 0
+        }
+
+        `video_no` - номер видео в задаче (по умолчанию 0)
+        """
+
+        apply_limits('60/minute')
+
+        try:
+            body = request.get_json()
+
+            access_token: str = body.get('access_token')
+            task_id: int = body.get('task_id')
+            video_no: int = body.get('video_no', 0)
+
+            if not task_id or not access_token:
+                raise SomeRequestArgumentsMissing('`task_id` or `access_token` missing')
+
+            user_id = authenticate(access_token)
+
+            task = Task.find_by_id(task_id)
+
+            if not task or str(task.user_id) != str(user_id):
+                raise NoTasksError('No task using `task_id` found')
+
+            if task.status != 'complete':
+                raise ArgumentError('Task is not complete')
+
+            num_videos = len(task.done_res_files)
+            if not isinstance(video_no, int) or isinstance(video_no, bool) or not 0 <= video_no < num_videos:
+                raise ArgumentError(f'`video_no` must be in range [0, {num_videos})')
+
+            res_file = task.done_res_files[video_no]
+            data = Storage.read_json(res_file)
+
+            if data.get('dst', '').endswith('.m3u8'):
+                # Сегменты плейлиста доступны только по ссылкам, которые подписывает `PreviewApi`
+                return {'message': 'Video rendered', 'status': 'done', 'dst': data['dst'], 'format': 'hls'}, 200
+
+            if data.get('dst'):
+                dst = Storage.get_download_link(data['dst'])
+
+                return {'message': 'Video rendered', 'status': 'done', 'dst': dst}, 200
+
+            if not data.get('detections'):
+                raise ArgumentError('Video was processed without `save_output`')
+
+            job = Task.launch_render(res_file, at_front=True)
+
+            console_logger.debug(f'RenderApi: {res_file} rendering, job: {job.get_id()}')
+
+            return {'message': 'Video rendering', 'status': job.get_status(), 'job_id': job.get_id()}, 202
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except SomeRequestArgumentsMissing as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(SomeRequestArgumentsMissing)
+        except ArgumentError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ArgumentError)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except NoTasksError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(NoTasksError)
+        except ConnectionError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(WorkerDoesNotRunError)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
+
+class PreviewApi(Resource):
+    """
+    REST-API class для просмотра видео HLS, в том числе во время обработки
+    """
+
+    def get(self) -> Response | tuple[dict, int]:
+        """
+        :return: Плейлист HLS || ошибка, код ответа
+
+        URL: `/api/pd/v{__version__}/preview?path=<Playlist>&access_token=<Token>`
+
+        `path` - плейлист видео, сохраненного с `video_format` hls: `preview` из статуса задачи, пока видео
+        обрабатывается, или `dst` из json результата. Токен передается в строке запроса, т.к. плеер сам
+        запрашивает плейлист.
+
+        Пока видео обрабатывается, плейлист пополняется новыми сегментами (тип EVENT), и плеер периодически
+        запрашивает его заново. Сегменты в ответе заменены ссылками на скачивание, поэтому бакет остается закрытым.
+        """
+
+        apply_limits('120/minute')
+
+        try:
+            access_token: str = request.args.get('access_token')
+            path: str = request.args.get('path')
+
+            if not path or not access_token:
+                raise SomeRequestArgumentsMissing('`path` or `access_token` missing')
+
+            user_id = authenticate(access_token)
+
+            user_folder = StorageApi.win_to_linux_path(Storage.get_user_folder(user_id)).rstrip('/') + '/'
+
+            if (not path.endswith('.m3u8') or '..' in path.split('/')
+                    or not StorageApi.win_to_linux_path(path).startswith(user_folder)):
+                raise ArgumentError('`path` must be a playlist in the user folder')
+
+            if not Storage.path_exists(path):
+                raise FileExistError(f'File {path} does not exist')
+
+            playlist = sign_playlist(Storage.read_bytes(path).decode('utf-8'), os.path.dirname(path))
+
+            response = Response(playlist, mimetype='application/vnd.apple.mpegurl')
+            response.headers['Cache-Control'] = 'no-cache'  # Плейлист обновляется, пока видео обрабатывается
+
+            return response
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except SomeRequestArgumentsMissing as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(SomeRequestArgumentsMissing)
+        except ArgumentError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ArgumentError)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except FileExistError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(FileExistError)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
+
+class TimelineApi(Resource):
+    """
+    REST-API class для получения количества обнаружений по времени
+    """
+
+    def post(self) -> tuple[dict, int]:
+        """
+        :return: Среднее количество обнаружений каждого класса в секунду для интервалов видео, код ответа
+
+        URL: `/api/pd/v{__version__}/timeline`
+
+        Из timeline видео (`{n}_timeline.npy`) читается только запрошенный интервал,
+        который затем усредняется так, чтобы получилось не больше `points` точек.
+
+        Пример запроса:
+        {
+            "access_token": "<TOKEN>",
+            "task_id": 0,
+            "video_no": 0,
+            "start": 0,
+            "end": 600,
+            "points": 300
+        }
+
+        `start`, `end` - интервал видео в секундах (по умолчанию все видео), `points` - максимальное количество точек
+
+        Пример ответа:
+        {
+            "classes": ["apple_rust", "apple_scab"],
+            "step": 2,
+            "seconds": [0, 2, 4],
+            "counts": {"apple_rust": [0.5, 3.0, 1.0], "apple_scab": [0.0, 0.0, 0.5]}
+        }
+        """
+
+        apply_limits('60/minute')
+
+        try:
+            body = request.get_json()
+
+            access_token: str = body.get('access_token')
+            task_id: int = body.get('task_id')
+            video_no: int = body.get('video_no', 0)
+            start: int = body.get('start', 0)
+            end: int = body.get('end', 2 ** 31 - 1)
+            points: int = body.get('points', 300)
+
+            if not task_id or not access_token:
+                raise SomeRequestArgumentsMissing('`task_id` or `access_token` missing')
+
+            for key, value in [('video_no', video_no), ('start', start), ('end', end), ('points', points)]:
+                if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                    raise ArgumentError(f'`{key}` must be a non-negative integer')
+
+            if end <= start or points == 0:
+                raise ArgumentError('`end` must be greater than `start`, `points` must be positive')
+
+            user_id = authenticate(access_token)
+
+            task = Task.find_by_id(task_id)
+
+            if not task or str(task.user_id) != str(user_id):
+                raise NoTasksError('No task using `task_id` found')
+
+            if task.status != 'complete' or video_no >= len(task.done_res_files):
+                raise ArgumentError('Task is not complete or `video_no` is out of range')
+
+            data = Storage.read_json(task.done_res_files[video_no])
+
+            if not data.get('timeline'):
+                raise ArgumentError('Video was processed without timeline')
+
+            counts = read_timeline(lambda offset, size: Storage.read_range(data['timeline'], offset, size), start, end)
+            step = max(1, math.ceil(len(counts) / points))
+            counts = downsample(counts, step).round(2)
+
+            console_logger.debug(f'TimelineApi: {len(counts)} points, step: {step}')
+
+            return {'classes': data['timeline_classes'],
+                    'step': step,
+                    'seconds': [start + i * step for i in range(len(counts))],
+                    'counts': {label: counts[:, i].tolist() for i, label in enumerate(data['timeline_classes'])},
+                    }, 200
+        except ExpiredSignatureError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ExpiredTokenError)
+        except (DecodeError, InvalidTokenError) as e:
+            get_traceback.error(f'DecodeError, InvalidTokenError: {e}')
+            return format_error_to_return(BadTokenError)
+        except SomeRequestArgumentsMissing as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(SomeRequestArgumentsMissing)
+        except ArgumentError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(ArgumentError)
+        except UserDoesNotExists as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(UserDoesNotExists)
+        except NoTasksError as e:
+            get_traceback.error(f'{e}')
+            return format_error_to_return(NoTasksError)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            return format_error_to_return(InternalServerError)
+
 
 class StopJobApi(Resource):
     """
@@ -374,16 +1165,11 @@ class StopJobApi(Resource):
             if not task_id or not access_token:
                 raise SomeRequestArgumentsMissing('`task_id` or `access_token` missing')
 
-            decoded = decode_token(access_token)
-            user_id = decoded['sub']
-
-            exists = User.find_by_id(user_id) is not None
-            if not exists:
-                raise UserDoesNotExists
+            user_id = authenticate(access_token)
 
             task = Task.find_by_id(task_id)
 
-            if not task:
+            if not task or str(task.user_id) != str(user_id):
                 raise NoTasksError(f'No task with task_id: {task_id}')
 
             job_id = task.job_id
@@ -399,6 +1185,11 @@ class StopJobApi(Resource):
             console_logger.debug(f'Job: {job}, {job_id}')
             send_stop_job_command(current_app.redis, job_id)
 
+            # Части задачи, обрабатываемые на других воркерах (`parallel`, `segment_seconds`)
+            children = FanOut.stop_children(job_id, current_app.redis)
+            if children:
+                console_logger.debug(f'StopJobApi: child jobs {children} stopped')
+
             status = job.get_status()
 
             task.set_status('stopped')
@@ -1,4 +1,6 @@
+import atexit
 import os
+import threading
 from typing import NoReturn
 
 import rq
@@ -18,6 +20,11 @@ from database.db import initialize_db
 from path_definitions import current_path, ENV_KALLOSUS_PROD, ENV_KALLOSUS_DEV, ENV_KALLOSUS_TEST
 from resources.errors import ERRORS
 from resources.routes import initialize_routes
+from storage.S3 import StorageApi
+from storage.usage import LEDGER, UsageReconciler
+from task.image_server import ImagePredictor
+from task.reaper import JobReaper
+from utils.auth import UsersCacheInvalidator
 
 console_logger = Logger(__file__)
 console_logger.info(f'ROOT PATH: {current_path}')
@@ -53,6 +60,9 @@ class KallosusNNApplication:
     def _init_redis(self) -> NoReturn:
         self._app.redis = Redis.from_url(self._app.config['KALLOSUS_REDIS_URL'])
         self._app.task_queue = rq.Queue('pd-task', connection=self._app.redis)
+        # Низкий приоритет: воркеры слушают `pd-task pd-render` и берут отрисовку, только когда нет задач обработки
+        self._app.render_queue = rq.Queue('pd-render', connection=self._app.redis)
+        LEDGER.connect(self._app.redis)  # Учет места хранилища при записи и удалении файлов
         console_logger.info('Redis initialized')
 
     def _init_db(self) -> NoReturn:
@@ -73,6 +83,56 @@ class KallosusNNApplication:
         )
         console_logger.info('Limiter initialized')
 
+    def _init_image_predictor(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+
+        Пул процессов с загруженной моделью для `/predict_image`. Процессы запускаются при первом запросе,
+        а с `PD_IMAGE_PRELOAD=1` - сразу в фоне, чтобы не задерживать запуск приложения.
+        При завершении приложения процессы пула останавливаются
+        """
+
+        self._app.image_predictor = ImagePredictor()
+        atexit.register(self._app.image_predictor.shutdown)
+
+        if os.environ.get('PD_IMAGE_PRELOAD') == '1' and os.environ.get('UNIT_TEST') in ['0', None]:
+            threading.Thread(target=self._app.image_predictor.start, daemon=True).start()
+
+        console_logger.info('ImagePredictor initialized')
+
+    def _init_job_reaper(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+
+        Фоновая проверка задач, воркер которых упал (см. `JobReaper`)
+        """
+
+        self._app.job_reaper = JobReaper(self._app)
+        self._app.job_reaper.start()
+        console_logger.info('JobReaper initialized')
+
+    def _init_usage_reconciler(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+
+        Фоновая сверка учета места хранилища с его содержимым (см. `UsageReconciler`)
+        """
+
+        self._app.usage_reconciler = UsageReconciler(StorageApi())
+        self._app.usage_reconciler.start()
+        console_logger.info('UsageReconciler initialized')
+
+    def _init_users_cache_invalidator(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+
+        Фоновый сброс кэша пользователей по сообщениям сервера авторизации (см. `UsersCacheInvalidator`)
+        """
+
+        self._app.users_cache_invalidator = UsersCacheInvalidator(self._app)
+        self._app.users_cache_invalidator.start()
+        console_logger.info('UsersCacheInvalidator initialized')
+
     def _init_rq_dashboard(self) -> NoReturn:
         """
         :return:
@@ -86,8 +146,9 @@ class KallosusNNApplication:
         self._app.register_blueprint(rq_dashboard.blueprint, url_prefix="/rq")
         console_logger.info('RQ dashboard initialized')
 
-    def create_app(self) -> Flask:
+    def create_app(self, is_worker: bool = False) -> Flask:
         """
+        :param is_worker: Приложение создается в RQ воркере, которому не нужен пул `/predict_image`
         :return: Flask application
         """
 
@@ -138,4 +199,13 @@ class KallosusNNApplication:
 
         self._init_routes()
 
+        if not is_worker:
+            self._init_image_predictor()
+            self._init_users_cache_invalidator()
+
+        # В тестах задачи в статусе run создаются без воркера, поэтому проверка не запускается
+        if not is_worker and os.environ.get('UNIT_TEST') in ['0', None]:
+            self._init_job_reaper()
+            self._init_usage_reconciler()
+
         return self._app
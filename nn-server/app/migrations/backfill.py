@@ -0,0 +1,128 @@
+"""
+Перенос `queue_files`, `done_res_files`, `user_current_time_folders` (PickleType) и `is_files_upload` (json в тексте)
+таблицы `task` в колонки JSONB `*_jsonb`, добавленные миграцией 9a4e6b2c1d8f.
+
+Строки переносятся порциями по `id`, каждая порция - отдельная короткая транзакция, поэтому таблица не блокируется
+и приложение работает во время переноса. Перенесенной считается строка с заполненной `queue_files_jsonb`,
+поэтому прерванный перенос можно запустить заново: он продолжится с еще не перенесенных строк,
+а `--after-id` позволяет не просматривать заново уже перенесенное начало таблицы.
+Перенос запускается отдельным шагом до миграции e5b7c3a1f9d2, которая не запускается, пока остались
+не перенесенные строки (`count_pending`).
+
+Запуск: `SQLALCHEMY_DATABASE_URI=... python -m migrations.backfill --chunk-size 1000 --sleep 0.1`
+"""
+
+import argparse
+import json
+import os
+import pickle
+import time
+from typing import Callable, ContextManager, Iterator, NoReturn, Union
+
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Connection
+
+LIST_COLUMNS = ['queue_files', 'done_res_files', 'user_current_time_folders']
+ACTIVE_STATUSES = ['queue', 'run']  # Задачи, списки которых еще меняются (`launch_task`, `finish_task`)
+
+
+def backfill_chunk(conn: Connection, after_id: int, chunk_size: int, refresh_active: bool = False) -> Union[int, None]:
+    """
+    :param conn: Подключение к БД
+    :param after_id: id последней строки предыдущей порции
+    :param chunk_size: Количество строк в порции
+    :param refresh_active: Перенести заново задачи в queue/run
+    :return: id последней строки порции, None - строк для переноса больше нет
+    """
+
+    condition = 'queue_files_jsonb IS NULL'
+    params = {'after_id': after_id, 'chunk_size': chunk_size}
+
+    if refresh_active:
+        condition = f'({condition} OR status IN :active)'
+        params['active'] = ACTIVE_STATUSES
+
+    query = text(f'SELECT id, {", ".join(LIST_COLUMNS)}, is_files_upload FROM task '
+                 f'WHERE id > :after_id AND {condition} ORDER BY id LIMIT :chunk_size')
+
+    if refresh_active:
+        query = query.bindparams(bindparam('active', expanding=True))
+
+    rows = conn.execute(query, params).fetchall()
+
+    if not rows:
+        return None
+
+    updates = []
+    for row in rows:
+        update = {column: json.dumps(list(pickle.loads(value)) if (value := getattr(row, column)) is not None else [])
+                  for column in LIST_COLUMNS}
+        update['is_files_upload'] = row.is_files_upload  # Уже json, NULL остается NULL
+        update['id'] = row.id
+        updates.append(update)
+
+    conn.execute(text('UPDATE task SET '
+                      'queue_files_jsonb = CAST(:queue_files AS JSONB), '
+                      'done_res_files_jsonb = CAST(:done_res_files AS JSONB), '
+                      'user_current_time_folders_jsonb = CAST(:user_current_time_folders AS JSONB), '
+                      'is_files_upload_jsonb = CAST(:is_files_upload AS JSONB) '
+                      'WHERE id = :id'),
+                 updates)
+
+    return rows[-1].id
+
+
+def backfill(begin: Callable[[], ContextManager[Connection]],
+             chunk_size: int = 1000,
+             after_id: int = 0,
+             refresh_active: bool = False,
+             ) -> Iterator[int]:
+    """
+    :param begin: Открывает транзакцию одной порции (`engine.begin`)
+    :param chunk_size: Количество строк в порции
+    :param after_id: Перенос начинается со строк с `id` больше `after_id`
+    :param refresh_active: Перенести заново задачи в queue/run
+    :return: id последней строки каждой перенесенной порции
+    """
+
+    while True:
+        with begin() as conn:  # Транзакция на одну порцию
+            after_id = backfill_chunk(conn, after_id, chunk_size, refresh_active)
+
+        if after_id is None:
+            return
+
+        yield after_id
+
+
+def count_pending(conn: Connection) -> int:
+    """
+    :param conn: Подключение к БД
+    :return: Количество еще не перенесенных строк
+    """
+
+    return conn.execute(text('SELECT count(*) FROM task WHERE queue_files_jsonb IS NULL')).scalar()
+
+
+def main() -> NoReturn:
+    parser = argparse.ArgumentParser(description='Перенос колонок task в JSONB порциями')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='Количество строк в порции')
+    parser.add_argument('--sleep', type=float, default=0.0, help='Пауза между порциями в секундах')
+    parser.add_argument('--after-id', type=int, default=0, help='Продолжить перенос после строки с этим id')
+    parser.add_argument('--refresh-active', action='store_true', help='Перенести заново задачи в queue/run')
+    args = parser.parse_args()
+
+    engine = create_engine(os.environ['SQLALCHEMY_DATABASE_URI'])
+    rows = 0
+
+    for after_id in backfill(engine.begin, args.chunk_size, args.after_id, args.refresh_active):
+        rows += args.chunk_size
+        print(f'Backfilled up to task id {after_id} (~{rows} rows)')
+        time.sleep(args.sleep)
+
+    with engine.connect() as conn:
+        print(f'Rows left to backfill: {count_pending(conn)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -9,3 +9,12 @@ def column_exists(table_name, column_name):
     result = conn.execute(query, {"table": table_name, "column": column_name})
 
     return result.fetchone() is not None
+
+
+def index_exists(table_name, index_name):
+    """Helper function to check if an index exists on the specified table."""
+    conn = op.get_bind()
+    query = text("SELECT indexname FROM pg_indexes WHERE tablename=:table AND indexname=:index")
+    result = conn.execute(query, {"table": table_name, "index": index_name})
+
+    return result.fetchone() is not None
@@ -0,0 +1,76 @@
+"""Switched task list columns and is_files_upload to JSONB
+
+Revision ID: e5b7c3a1f9d2
+Revises: 9a4e6b2c1d8f
+Create Date: 2026-10-18 13:30:00.000000
+
+Перед миграцией данные переносятся отдельным шагом: `python -m migrations.backfill` (см. migrations/README).
+Миграция не переносит таблицу в своей транзакции и не запускается, если остались не перенесенные строки.
+"""
+import json
+import pickle
+from contextlib import nullcontext
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy import text
+
+from migrations.backfill import LIST_COLUMNS, backfill, count_pending
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7c3a1f9d2'
+down_revision = '9a4e6b2c1d8f'
+branch_labels = None
+depends_on = None
+
+COLUMNS = LIST_COLUMNS + ['is_files_upload']
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    if pending := count_pending(conn):
+        raise RuntimeError(f'{pending} task rows are not backfilled to JSONB columns, '
+                           f'run `python -m migrations.backfill` before this migration')
+
+    # Списки задач в queue/run могли измениться после переноса, таких задач немного
+    for _ in backfill(lambda: nullcontext(conn), refresh_active=True):
+        pass
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in COLUMNS:
+            batch_op.drop_column(column)
+            batch_op.alter_column(f'{column}_jsonb', new_column_name=column)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in LIST_COLUMNS:
+            batch_op.alter_column(column, server_default=sa.text("'[]'::jsonb"))
+
+
+def downgrade():
+    conn = op.get_bind()
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in COLUMNS:
+            batch_op.alter_column(column, new_column_name=f'{column}_jsonb', server_default=None)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in LIST_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.PickleType(), nullable=True))
+        batch_op.add_column(sa.Column('is_files_upload', sa.Text(), nullable=True))
+
+    rows = conn.execute(text(f'SELECT id, {", ".join(f"{column}_jsonb" for column in COLUMNS)} FROM task')).fetchall()
+
+    for row in rows:
+        values = {column: pickle.dumps(getattr(row, f'{column}_jsonb') or []) for column in LIST_COLUMNS}
+        upload = row.is_files_upload_jsonb
+        values['is_files_upload'] = json.dumps(upload) if upload is not None else None
+        values['id'] = row.id
+        conn.execute(text('UPDATE task SET queue_files = :queue_files, done_res_files = :done_res_files, '
+                          'user_current_time_folders = :user_current_time_folders, '
+                          'is_files_upload = :is_files_upload WHERE id = :id'),
+                     values)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in COLUMNS:
+            batch_op.drop_column(f'{column}_jsonb')
@@ -105,6 +105,24 @@ class BucketSizeExceeded(Exception):
     """
 
 
+class ServerBusyError(Exception):
+    """
+    Too many concurrent requests
+    status: 429
+
+    - Возникает, когда одновременно обрабатывается максимальное количество синхронных запросов
+    """
+
+
+class PredictionTimeoutError(Exception):
+    """
+    Prediction timed out
+    status: 504
+
+    - Возникает, когда синхронный прогноз не уложился в отведенное время
+    """
+
+
 ERRORS = {
     "InternalServerError": {
         "message": "Something went wrong",
@@ -171,6 +189,16 @@ ERRORS = {
         "status": 413,
         "from": "app",
     },
+    "ServerBusyError": {
+        "message": "Too many concurrent requests",
+        "status": 429,
+        "from": "app",
+    },
+    "PredictionTimeoutError": {
+        "message": "Prediction timed out",
+        "status": 504,
+        "from": "app",
+    },
 }
 
 
@@ -187,13 +215,16 @@ def format_error_to_return(exception: [InternalServerError,
                                        UserDoesNotExists,
                                        FileExistError,
                                        BucketSizeExceeded,
+                                       ServerBusyError,
+                                       PredictionTimeoutError,
                                        ],
                            additional_params: Union[dict, None] = None
                            ):
     """
     :param exception: `InternalServerError`, `SomeRequestArgumentsMissing`, `BadTokenError`,
     `ExpiredTokenError`, `IncorrectJobIDError`, `NoTasksError`, `WorkerDoesNotRunError`, `JobDoesNotExist`,
-    `JobIsNotCurrentlyExecuted`, `ArgumentError`, `UserDoesNotExists`, `FileExistError`, `BucketSizeExceeded`
+    `JobIsNotCurrentlyExecuted`, `ArgumentError`, `UserDoesNotExists`, `FileExistError`, `BucketSizeExceeded`,
+    `ServerBusyError`, `PredictionTimeoutError`
     :return: tuple[{message: error}, status]
     :param additional_params: Дополнительные параметры сообщения
     """
@@ -2,12 +2,28 @@ from flask_restful import Api
 
 from api import __version__
 from api.file_management import CreateFoldersApi
-from api.restful_api import PredictApi, StatusApi, ResultApi, StopJobApi
+from api.restful_api import (PredictApi,
+                             PredictImageApi,
+                             StatusApi,
+                             BatchStatusApi,
+                             StatusStreamApi,
+                             ResultApi,
+                             RenderApi,
+                             PreviewApi,
+                             TimelineApi,
+                             StopJobApi,
+                             )
 
 
 def initialize_routes(api: Api):
     api.add_resource(CreateFoldersApi, f'/api/file_management/v{__version__}/create')
     api.add_resource(PredictApi, f'/api/pd/v{__version__}/predict')
+    api.add_resource(PredictImageApi, f'/api/pd/v{__version__}/predict_image')
     api.add_resource(StatusApi, f'/api/pd/v{__version__}/status')
+    api.add_resource(BatchStatusApi, f'/api/pd/v{__version__}/status/batch')
+    api.add_resource(StatusStreamApi, f'/api/pd/v{__version__}/status/stream')
     api.add_resource(ResultApi, f'/api/pd/v{__version__}/result')
+    api.add_resource(RenderApi, f'/api/pd/v{__version__}/render')
+    api.add_resource(PreviewApi, f'/api/pd/v{__version__}/preview')
+    api.add_resource(TimelineApi, f'/api/pd/v{__version__}/timeline')
     api.add_resource(StopJobApi, f'/api/pd/v{__version__}/stop')
@@ -3,11 +3,30 @@ import platform
 import subprocess
 
 test_files = [
+    'tests/test_auth.py',
+    'tests/test_backfill.py',
+    'tests/test_backends.py',
+    'tests/test_batching.py',
+    'tests/test_checkpoint.py',
     'tests/test_create_folders.py',
+    'tests/test_fan_out.py',
+    'tests/test_frame_selector.py',
+    'tests/test_pipeline.py',
     'tests/test_predict.py',
+    'tests/test_predict_image.py',
+    'tests/test_preview.py',
+    'tests/test_quantize.py',
+    'tests/test_progress.py',
+    'tests/test_render.py',
     'tests/test_result.py',
     'tests/test_S3.py',
+    'tests/test_segments.py',
     'tests/test_status.py',
+    'tests/test_stream.py',
+    'tests/test_timeline.py',
+    'tests/test_top_k.py',
+    'tests/test_transfer.py',
+    'tests/test_usage.py',
     'tests/test_stop.py',
 ]
 
@@ -2,12 +2,12 @@ import json
 import mimetypes
 import os
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import NoReturn, Callable, Union
 
 import boto3
 import cv2
 import numpy as np
-from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
 from kallosus_packages.over_logging import Logger, GetTraceback
@@ -15,6 +15,9 @@ from tqdm import tqdm
 
 import env_register  # noqa
 from storage import local_main_s3_path, local_test_s3_path, remote_main_s3_path, remote_test_s3_path
+from storage.stream import MultipartStream
+from storage.transfer import PLANNER
+from storage.usage import LEDGER
 
 console_logger = Logger(__file__)
 get_traceback = GetTraceback(__file__)
@@ -58,13 +61,20 @@ class StorageApi:
     Путь должен быть обработан с использованием функционала `StorageApi.path_join`, без этого использовать функции Api запрещено.
     """
 
-    def __init__(self, storage: str = os.getenv('DATA_STORAGE')):
+    def __init__(self,
+                 storage: str = os.getenv('DATA_STORAGE'),
+                 upload_workers: int = int(os.getenv('PD_UPLOAD_WORKERS', 4)),
+                 ):
         """
         :param storage: `os.getenv('DATA_STORAGE')` локальное или удаленное хранилище - local/s3
+        :param upload_workers: Сколько файлов загружается одновременно в фоне (`submit`)
         """
 
         self.storage = storage
         self.s3: boto3.client = None
+        self.upload_workers = upload_workers
+        self._upload_pool: Union[ThreadPoolExecutor, None] = None
+        self._upload_pid = None  # Процесс, в котором создан `_upload_pool`
 
         if self.storage not in ['local', 's3']:
             raise EnvironmentError('DATA_STORAGE must be either local or s3')
@@ -188,15 +198,40 @@ class StorageApi:
         :return: путь к файлу json формата `%H_%M_%S`
         """
 
-        h_m_s_ms = time.strftime("%H_%M_%S_") + str(time.time_ns() // 1_000_000)
-
-        filename = h_m_s_ms + '.json'
-        dst = self.path_join(current_time_folder, filename)
+        dst = self.get_data_path(current_time_folder)
 
         self.save_json(dst, data)
 
         return dst
 
+    def get_data_path(self, current_time_folder: str) -> str:
+        """
+        :param current_time_folder: путь до папки с временем загрузки src
+        :return: путь к новому файлу json формата `%H_%M_%S_ms`
+        """
+
+        h_m_s_ms = time.strftime("%H_%M_%S_") + str(time.time_ns() // 1_000_000)
+
+        return self.path_join(current_time_folder, h_m_s_ms + '.json')
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        :param fn: Запись в хранилище, например `self.write_bytes` или `self.save_json`
+        :param args: Аргументы `fn`
+        :param kwargs: Именованные аргументы `fn`
+        :return: `Future` с результатом `fn`
+
+        Выполняет запись в фоновом потоке, чтобы загрузка файлов не задерживала обработку. Одновременно
+        выполняется не больше `upload_workers` записей. Пул потоков создается в процессе, который его использует,
+        т.к. потоки не переживают `fork` (RQ выполняет каждую задачу в дочернем процессе)
+        """
+
+        if self._upload_pool is None or self._upload_pid != os.getpid():
+            self._upload_pool = ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix='pd-upload')
+            self._upload_pid = os.getpid()
+
+        return self._upload_pool.submit(fn, *args, **kwargs)
+
     def upload_large_file(self, src: str, dst: str, progress_callback: Union[Callable, None] = None) -> bool:
         """
         :param src: Файл, который загружаем src.mp4 (локальный)
@@ -210,14 +245,11 @@ class StorageApi:
             return False
 
         mime = self._get_mime(src)
+        size = os.path.getsize(src)
 
-        # Конфигурация мультипарт-загрузки
-        config = TransferConfig(
-            multipart_threshold=1024 * 25,  # Порог, с которого начинается мультипарт-загрузка, в байтах
-            max_concurrency=10,  # Количество параллельных потоков
-            multipart_chunksize=1024 * 25,  # Размер каждой части, в байтах
-            use_threads=True,
-        )
+        # Размер частей и количество потоков мультипарт-загрузки подбираются по размеру файла и скорости загрузки
+        config = PLANNER.plan(size)
+        start = time.monotonic()
 
         try:
             self.s3.upload_file(
@@ -228,7 +260,12 @@ class StorageApi:
                 ExtraArgs={'ContentType': mime} if mime else {},
                 Callback=ProgressPercentage(src, progress_callback),
             )
-            console_logger.debug(f'Successfully uploaded {src} to {self.bucket_name}/{dst}')
+            seconds = time.monotonic() - start
+            PLANNER.record(size, seconds, config)
+            console_logger.debug(f'Successfully uploaded {src} to {self.bucket_name}/{dst}: '
+                                 f'{round(size / 1024 ** 2 / max(seconds, 1e-6), 2)} Mb/s, '
+                                 f'part {config.multipart_chunksize // 1024 ** 2} Mb x {config.max_concurrency}')
+            LEDGER.record_put(dst, size)
 
             return True
         except Exception as e:
@@ -236,6 +273,17 @@ class StorageApi:
 
             return False
 
+    def open_stream(self, dst: str) -> MultipartStream:
+        """
+        :param dst: Куда загружаем
+        :return: Поток, байты которого загружаются в `dst` частями по мере записи (только для S3)
+        """
+
+        if self.storage != 's3':
+            raise ValueError(f'Storage type {self.storage} does not support streaming upload')
+
+        return MultipartStream(self.s3, self.bucket_name, dst, self._get_mime(dst))
+
     def get_download_link(self, filename: str, expiration=7 * 24 * 60 * 60):
         """
         :param filename: Путь до файла в S3 bucket
@@ -261,12 +309,25 @@ class StorageApi:
 
         return url
 
-    def get_bucket_size(self) -> int:
+    def list_object_sizes(self) -> dict[str, int]:
         """
-        :return: Размер бакета в байтах
+        :return: Размеры всех файлов хранилища в байтах по путям (для S3 - всего бакета)
+
+        Листинг всего хранилища: O(количество объектов) запросов, используется только для сверки учета (`UsageLedger`)
         """
 
-        total_size = 0
+        sizes = {}
+
+        if self.storage == 'local':
+            root = local_main_s3_path if os.environ.get('UNIT_TEST') in ['0', None] else local_test_s3_path
+
+            for folder, _, files in os.walk(root):
+                for file in files:
+                    path = os.path.join(folder, file)
+                    sizes[path] = os.path.getsize(path)
+
+            return sizes
+
         continuation_token = None
 
         while True:
@@ -279,7 +340,7 @@ class StorageApi:
             # Проверяем наличие объектов в ответе
             if 'Contents' in response:
                 for obj in response['Contents']:
-                    total_size += obj['Size']
+                    sizes[obj['Key']] = obj['Size']
 
             # Проверяем наличие следующей страницы результатов
             if response.get('IsTruncated'):
@@ -287,12 +348,38 @@ class StorageApi:
             else:
                 break
 
-        return total_size
+        return sizes
+
+    def get_bucket_size(self) -> int:
+        """
+        :return: Размер бакета в байтах
+        """
+
+        return sum(self.list_object_sizes().values())
+
+    def get_used_size(self) -> int:
+        """
+        :return: Занятое место в байтах по учету (`UsageLedger`)
+
+        Если учет еще не заполнен, он заполняется листингом хранилища (один раз), без Redis - размер бакета
+        """
+
+        total = LEDGER.total()
+
+        if total is None:
+            if LEDGER.connection is not None:
+                total = LEDGER.reconcile(self.list_object_sizes())
+            else:
+                total = self.get_bucket_size()
+
+        return total
 
     def is_bucket_under_limit(self, limit_gb: int = 10) -> bool:
         """
         :param limit_gb: Какой максимальный размер бакета в Гб
         :return: Превышен ли размер или нет
+
+        Размер берется из учета (`get_used_size`), а не листингом бакета
         """
 
         if os.getenv('BUCKET_LIMIT_GB'):
@@ -302,7 +389,7 @@ class StorageApi:
 
         limit_bytes = limit_gb * (1024 ** 3)
 
-        if self.get_bucket_size() > limit_bytes:
+        if self.get_used_size() > limit_bytes:
             return False
         else:
             return True
@@ -327,17 +414,47 @@ class StorageApi:
         :return: Успешно ли сохранение
         """
 
+        body = json.dumps(data, ensure_ascii=False, indent=4)
+
         if self.storage == 'local':
             with open(dst, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+                f.write(body)
         elif self.storage == 's3':
             self.s3.put_object(Bucket=self.bucket_name,
-                               Body=json.dumps(data, ensure_ascii=False, indent=4),
+                               Body=body,
                                Key=dst,
                                )
 
+        LEDGER.record_put(dst, len(body.encode('utf-8')))
+
         return True
 
+    def read_range(self, path: str, offset: int, size: int) -> bytes:
+        """
+        :param path: Путь до файла
+        :param offset: С какого байта читать
+        :param size: Сколько байт прочитать
+        :return: Часть файла (для S3 загружается только запрошенный диапазон)
+        """
+
+        if self.storage == 'local':
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return f.read(size)
+        elif self.storage == 's3':
+            byte_range = f'bytes={offset}-{offset + size - 1}'
+            return self.s3.get_object(Bucket=self.bucket_name, Key=path, Range=byte_range)['Body'].read()
+        else:
+            raise ValueError(f'Storage type {self.storage} not supported')
+
+    def read_json(self, path: str) -> dict:
+        """
+        :param path: Путь до json файла
+        :return: Содержимое json файла
+        """
+
+        return json.loads(self.read_bytes(path))
+
     def makedirs(self, path: str, exist_ok=True) -> bool:
         """
         :param path: Папка(-и), для S3 мы сами явно укажем, что это папка путем добавления обратного слеша.
@@ -406,6 +523,73 @@ class StorageApi:
                 # Если метаданные успешно получены, объект существует
             return True
 
+    def paths_exist(self, paths: list[str]) -> dict[str, bool]:
+        """
+        :param paths: Пути до файлов/папок (как в `path_exists`)
+        :return: Существует ли каждый путь
+
+        Для S3 файлы группируются по папке: если в папке проверяется не меньше `PD_LIST_MIN_KEYS` файлов,
+        они проверяются листингом папки (`list_objects_v2`), иначе - параллельными `head_object`
+        (не больше `PD_HEAD_WORKERS` одновременно), поэтому проверка не выполняет запросы последовательно
+        """
+
+        if self.storage == 'local':
+            return {path: os.path.exists(path) for path in paths}
+
+        min_keys = int(os.getenv('PD_LIST_MIN_KEYS', 3))
+        groups = {}
+        head_paths = []
+        exists = {}
+
+        for path in set(paths):
+            if path.endswith('/'):
+                # Папки проверяются `head_object`: при листинге они видны, только если в них есть файлы
+                head_paths.append(path)
+            else:
+                prefix = path.rpartition('/')[0] + '/' if '/' in path else ''
+                groups.setdefault(prefix, []).append(path)
+
+        for prefix, keys in groups.items():
+            if len(keys) < min_keys:
+                head_paths.extend(keys)
+                continue
+
+            listed = self._list_keys(prefix, max(keys))
+
+            if listed is None:  # Папка слишком большая для листинга
+                head_paths.extend(keys)
+                continue
+
+            exists.update({key: key in listed for key in keys})
+
+        if head_paths:
+            with ThreadPoolExecutor(max_workers=min(int(os.getenv('PD_HEAD_WORKERS', 16)), len(head_paths))) as pool:
+                exists.update(zip(head_paths, pool.map(self.path_exists, head_paths)))
+
+        return {path: exists[path] for path in paths}
+
+    def _list_keys(self, prefix: str, last_key: str, max_pages: int = 5) -> Union[set[str], None]:
+        """
+        :param prefix: Папка
+        :param last_key: Ключи после него не нужны (листинг идет в лексикографическом порядке)
+        :param max_pages: Максимальное количество страниц листинга (по 1000 ключей)
+        :return: Ключи файлов папки до `last_key` включительно, None - не уложились в `max_pages`
+        """
+
+        keys = set()
+        kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix, 'Delimiter': '/'}
+
+        for _ in range(max_pages):
+            response = self.s3.list_objects_v2(**kwargs)
+            keys.update(obj['Key'] for obj in response.get('Contents', []))
+
+            if not response.get('IsTruncated') or any(key >= last_key for key in keys):
+                return keys
+
+            kwargs['ContinuationToken'] = response.get('NextContinuationToken')
+
+        return None
+
     def rm_folder(self, folder: str) -> bool:
         """
         :param folder:
@@ -414,6 +598,7 @@ class StorageApi:
 
         if self.storage == 'local':
             os.remove(folder)
+            LEDGER.record_delete([folder])
         else:
             objects_to_delete = self.s3.list_objects(Bucket=self.bucket_name, Prefix=self.ensure_trailing_slash(folder))
 
@@ -421,6 +606,7 @@ class StorageApi:
             delete_keys['Objects'] = [{'Key': k} for k in [obj['Key'] for obj in objects_to_delete.get('Contents', [])]]
 
             self.s3.delete_objects(Bucket=self.bucket_name, Delete=delete_keys)
+            LEDGER.record_delete([obj['Key'] for obj in delete_keys['Objects']])
 
         return True
 
@@ -433,12 +619,49 @@ class StorageApi:
         if self.storage == 'local':
             for file in files:
                 os.remove(file)
+                LEDGER.record_delete([file])
         else:
             forDeletion = [{'Key': self.win_to_linux_path(file)} for file in files]
             response = self.s3.delete_objects(Bucket=self.bucket_name, Delete={'Objects': forDeletion})
             if response.get('ResponseMetadata').get('HTTPStatusCode') != 200:
                 return False
 
+            LEDGER.record_delete([obj['Key'] for obj in forDeletion])
+
+        return True
+
+    def read_bytes(self, path: str) -> bytes:
+        """
+        :param path: Путь до файла
+        :return: Содержимое файла
+        """
+
+        if self.storage == 'local':
+            with open(path, 'rb') as f:
+                return f.read()
+        elif self.storage == 's3':
+            return self.s3.get_object(Bucket=self.bucket_name, Key=path)['Body'].read()
+        else:
+            raise ValueError(f'Storage type {self.storage} not supported')
+
+    def write_bytes(self, path: str, data: bytes) -> bool:
+        """
+        :param path: Куда сохраняем
+        :param data: Содержимое файла (например, уже сжатое изображение)
+        :return: Успешно ли сохранение
+        """
+
+        if self.storage == 'local':
+            with open(path, 'wb') as f:
+                f.write(data)
+        elif self.storage == 's3':
+            mime = self._get_mime(path)
+            self.s3.put_object(Bucket=self.bucket_name, Body=data, Key=path, **({'ContentType': mime} if mime else {}))
+        else:
+            raise ValueError(f'Storage type {self.storage} not supported')
+
+        LEDGER.record_put(path, len(data))
+
         return True
 
     def imwrite(self, path: str, image: np.ndarray) -> bool:
@@ -450,9 +673,11 @@ class StorageApi:
 
         if self.storage == 'local':
             cv2.imwrite(path, image)
+            LEDGER.record_put(path, os.path.getsize(path))
         elif self.storage == 's3':
             data_serial = cv2.imencode('.png', image)[1].tobytes()
             self.s3.put_object(Bucket=self.bucket_name, Body=data_serial, Key=path, ContentType='image/PNG')
+            LEDGER.record_put(path, len(data_serial))
         else:
             raise ValueError(f'Storage type {self.storage} not supported')
 
@@ -0,0 +1,136 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NoReturn, Union
+
+from kallosus_packages.over_logging import GetTraceback, Logger
+
+from storage.transfer import MIN_PART_SIZE, PLANNER
+from storage.usage import LEDGER
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+
+class MultipartStream:
+    """
+    Загрузка в S3 данных, размер которых заранее неизвестен (например, видео, которое еще кодируется).
+
+    Записанные байты накапливаются до `part_size` и отправляются частью мультипарт-загрузки в фоновом потоке,
+    поэтому загрузка идет одновременно с записью, а файл целиком нигде не хранится. Одновременно в памяти
+    не больше `max_concurrency` частей: при медленной загрузке `write` ждет, пока часть отправится.
+    Объект появляется в хранилище только после `close`, при ошибке загрузка отменяется (`abort`).
+    """
+
+    def __init__(self,
+                 s3,
+                 bucket_name: str,
+                 dst: str,
+                 content_type: Union[str, None] = None,
+                 part_size: int = PLANNER.min_part_size,
+                 max_concurrency: int = PLANNER.max_concurrency,
+                 ):
+        """
+        :param s3: Клиент S3 (`StorageApi.s3`)
+        :param bucket_name: Бакет
+        :param dst: Куда загружаем
+        :param content_type: MIME тип объекта
+        :param part_size: Размер части в байтах, объект может быть не больше 10 000 частей
+        :param max_concurrency: Сколько частей загружается одновременно
+        """
+
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.dst = dst
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.size = 0  # Сколько байт записано
+
+        self._buffer = bytearray()
+        self._parts: list[Future] = []
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='pd-stream')
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.upload_id = self.s3.create_multipart_upload(Bucket=self.bucket_name,
+                                                         Key=self.dst,
+                                                         **({'ContentType': content_type} if content_type else {}),
+                                                         )['UploadId']
+
+    def write(self, data: bytes) -> NoReturn:
+        """
+        :param data: Следующие байты объекта
+        :return: `NoReturn`
+
+        Ошибка загрузки уже отправленной части пробрасывается при следующей записи
+        """
+
+        self._buffer += data
+        self.size += len(data)
+
+        while len(self._buffer) >= self.part_size:
+            self._send(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def _send(self, body: bytes) -> NoReturn:
+        for part in self._parts:
+            if part.done() and part.exception() is not None:
+                raise part.exception()
+
+        self._slots.acquire()
+        part = self._pool.submit(self._upload_part, len(self._parts) + 1, body)
+        part.add_done_callback(lambda _: self._slots.release())
+        self._parts.append(part)
+
+    def _upload_part(self, number: int, body: bytes) -> dict:
+        response = self.s3.upload_part(Bucket=self.bucket_name,
+                                       Key=self.dst,
+                                       UploadId=self.upload_id,
+                                       PartNumber=number,
+                                       Body=body,
+                                       )
+
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    def close(self) -> bool:
+        """
+        Отправляет последнюю часть и завершает загрузку
+
+        :return: Загружен ли объект
+        """
+
+        try:
+            # Последняя часть может быть меньше 5 Мб, пустой объект - одна пустая часть
+            if self._buffer or not self._parts:
+                self._send(bytes(self._buffer))
+                self._buffer.clear()
+
+            parts = [part.result() for part in self._parts]
+            self.s3.complete_multipart_upload(Bucket=self.bucket_name,
+                                              Key=self.dst,
+                                              UploadId=self.upload_id,
+                                              MultipartUpload={'Parts': parts},
+                                              )
+            LEDGER.record_put(self.dst, self.size)
+            console_logger.debug(f'Successfully streamed {round(self.size / 1024 ** 2, 2)} Mb '
+                                 f'to {self.bucket_name}/{self.dst} in {len(parts)} parts')
+
+            return True
+        except Exception as e:
+            get_traceback.critical(f'Error streaming {self.dst}: {e}', print_full_exception=True)
+            self.abort()
+
+            return False
+        finally:
+            self._pool.shutdown(wait=False)
+
+    def abort(self) -> NoReturn:
+        """
+        Отменяет загрузку, уже загруженные части удаляются
+
+        :return: `NoReturn`
+        """
+
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+        try:
+            self.s3.abort_multipart_upload(Bucket=self.bucket_name, Key=self.dst, UploadId=self.upload_id)
+        except Exception as e:
+            get_traceback.error(f'{e}')
@@ -0,0 +1,111 @@
+import math
+import os
+import threading
+from typing import NoReturn, Union
+
+from boto3.s3.transfer import TransferConfig
+
+MB = 1024 ** 2
+MIN_PART_SIZE = 5 * MB  # Минимальный размер части мультипарт-загрузки S3 (кроме последней)
+MAX_PART_SIZE = 5 * 1024 * MB  # Максимальный размер части
+MAX_PARTS = 10_000  # Максимальное количество частей одного объекта
+
+
+class TransferPlanner:
+    """
+    Подбор параметров мультипарт-загрузки (`TransferConfig`) по размеру файла и скорости прошлых загрузок.
+
+    Размер части выбирается так, чтобы одна часть загружалась примерно `part_seconds` секунд при скорости
+    одного соединения, измеренной на прошлых загрузках (`record`): мелкие части дают тысячи запросов на файл,
+    а крупные дольше повторяются при ошибке. При этом часть не больше доли файла на один поток, чтобы файл
+    загружался всеми потоками, не меньше 5 Мб и не меньше размера, при котором частей больше 10 000
+    (ограничения S3). Потоков не больше, чем частей.
+    """
+
+    def __init__(self,
+                 min_part_size: int = int(os.getenv('PD_MIN_PART_SIZE', 8 * MB)),
+                 max_concurrency: int = int(os.getenv('PD_UPLOAD_CONCURRENCY', 10)),
+                 part_seconds: float = float(os.getenv('PD_PART_SECONDS', 2.0)),
+                 smoothing: float = 0.3,
+                 ):
+        """
+        :param min_part_size: Минимальный размер части в байтах (не меньше `MIN_PART_SIZE`)
+        :param max_concurrency: Максимальное количество параллельных потоков загрузки
+        :param part_seconds: Сколько секунд должна загружаться одна часть
+        :param smoothing: Вес нового измерения скорости в скользящем среднем
+        """
+
+        self.min_part_size = max(min_part_size, MIN_PART_SIZE)
+        self.max_concurrency = max_concurrency
+        self.part_seconds = part_seconds
+        self.smoothing = smoothing
+
+        self._throughput = None  # Сглаженная скорость одного соединения, байт/с
+        self._lock = threading.Lock()
+
+    @property
+    def throughput(self) -> Union[float, None]:
+        """
+        :return: Скорость одного соединения в байтах в секунду, None - загрузок еще не было
+        """
+
+        return self._throughput
+
+    def part_size(self, size: int) -> int:
+        """
+        :param size: Размер файла в байтах
+        :return: Размер части в байтах, кратный 1 Мб
+        """
+
+        part_size = self.min_part_size
+
+        if self._throughput:
+            by_throughput = int(self._throughput * self.part_seconds)
+            part_size = max(part_size, min(by_throughput, math.ceil(size / self.max_concurrency)))
+
+        part_size = max(part_size, math.ceil(size / MAX_PARTS))
+
+        return min(math.ceil(part_size / MB) * MB, MAX_PART_SIZE)
+
+    def plan(self, size: int) -> TransferConfig:
+        """
+        :param size: Размер файла в байтах
+        :return: Конфигурация загрузки файла
+        """
+
+        part_size = self.part_size(size)
+
+        return TransferConfig(
+            multipart_threshold=part_size,  # Файл меньше одной части загружается одним запросом
+            multipart_chunksize=part_size,
+            max_concurrency=max(1, min(self.max_concurrency, math.ceil(size / part_size))),
+            use_threads=True,
+        )
+
+    def record(self, size: int, seconds: float, config: TransferConfig) -> NoReturn:
+        """
+        :param size: Размер загруженного файла в байтах
+        :param seconds: Время загрузки в секундах
+        :param config: Конфигурация, с которой загружен файл (`plan`)
+        :return: `NoReturn`
+
+        Загрузки меньше `MIN_PART_SIZE` не учитываются: их время определяется задержкой запроса, а не скоростью
+        """
+
+        if size < MIN_PART_SIZE or seconds <= 0:
+            return
+
+        streams = min(config.max_concurrency, math.ceil(size / config.multipart_chunksize))
+        throughput = size / seconds / max(1, streams)
+
+        with self._lock:
+            if self._throughput is None:
+                self._throughput = throughput
+            else:
+                self._throughput = self.smoothing * throughput + (1 - self.smoothing) * self._throughput
+
+
+PLANNER = TransferPlanner()
+"""
+Параметры загрузок процесса: скорость, измеренная на одной загрузке, используется для следующих
+"""
@@ -0,0 +1,110 @@
+"""
+Сравнение скорости мультипарт-загрузки с разными `TransferConfig` на локальном S3.
+
+Запуск S3 (любой из вариантов):
+    moto_server -p 9000
+    docker run -p 9000:9000 minio/minio server /data
+
+Запуск бенчмарка из nn-server/app:
+    python -m storage.transfer_benchmark --endpoint http://localhost:9000 --sizes 16 128 512
+"""
+
+import argparse
+import math
+import os
+import tempfile
+import time
+from typing import NoReturn
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+from storage.transfer import MAX_PARTS, MB, TransferPlanner
+
+
+def get_configs(size: int, planner: TransferPlanner) -> dict[str, TransferConfig]:
+    """
+    :param size: Размер файла в байтах
+    :param planner: Планировщик, уже измеривший скорость на прогревочной загрузке
+    :return: Сравниваемые конфигурации по названию
+    """
+
+    return {
+        'fixed 25 Kb x 10': TransferConfig(multipart_threshold=25 * 1024, multipart_chunksize=25 * 1024,
+                                           max_concurrency=10),
+        'fixed 8 Mb x 10': TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=8 * MB, max_concurrency=10),
+        'planner': planner.plan(size),
+    }
+
+
+def upload(s3, bucket: str, src: str, config: TransferConfig) -> float:
+    """
+    :param s3: Клиент S3
+    :param bucket: Бакет
+    :param src: Загружаемый файл
+    :param config: Конфигурация загрузки
+    :return: Время загрузки в секундах
+    """
+
+    start = time.monotonic()
+    s3.upload_file(Filename=src, Bucket=bucket, Key=os.path.basename(src), Config=config)
+    seconds = time.monotonic() - start
+    s3.delete_object(Bucket=bucket, Key=os.path.basename(src))
+
+    return seconds
+
+
+def main() -> NoReturn:
+    parser = argparse.ArgumentParser(description='Benchmark S3 multipart upload configurations')
+    parser.add_argument('--endpoint', default=os.getenv('PD_BENCH_ENDPOINT', 'http://localhost:9000'))
+    parser.add_argument('--access-key', default=os.getenv('PD_BENCH_ACCESS_KEY', 'minioadmin'))
+    parser.add_argument('--secret-key', default=os.getenv('PD_BENCH_SECRET_KEY', 'minioadmin'))
+    parser.add_argument('--bucket', default='pd-transfer-benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 128, 512], help='File sizes in Mb')
+    parser.add_argument('--repeat', type=int, default=3, help='Uploads per configuration, best is reported')
+    args = parser.parse_args()
+
+    s3 = boto3.client('s3',
+                      endpoint_url=args.endpoint,
+                      region_name='us-east-1',
+                      aws_access_key_id=args.access_key,
+                      aws_secret_access_key=args.secret_key,
+                      )
+
+    if args.bucket not in [bucket['Name'] for bucket in s3.list_buckets()['Buckets']]:
+        s3.create_bucket(Bucket=args.bucket)
+
+    planner = TransferPlanner()
+
+    print(f'{"size, Mb":>10} {"config":>18} {"part, Mb":>10} {"threads":>8} {"parts":>7} {"Mb/s":>8}')
+
+    with tempfile.TemporaryDirectory() as folder:
+        for size_mb in args.sizes:
+            size = size_mb * MB
+            src = os.path.join(folder, f'{size_mb}.bin')
+
+            with open(src, 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(MB))
+
+            # Прогрев: планировщик измеряет скорость так же, как при загрузках `StorageApi`
+            warm_up = planner.plan(size)
+            planner.record(size, upload(s3, args.bucket, src, warm_up), warm_up)
+
+            for name, config in get_configs(size, planner).items():
+                parts = math.ceil(size / config.multipart_chunksize) if size >= config.multipart_threshold else 1
+                row = (f'{size_mb:>10} {name:>18} {round(config.multipart_chunksize / MB, 2):>10} '
+                       f'{config.max_concurrency:>8} {parts:>7}')
+
+                if parts > MAX_PARTS:
+                    print(f'{row} {"-":>8} (more than {MAX_PARTS} parts)')
+                    continue
+
+                seconds = min(upload(s3, args.bucket, src, config) for _ in range(args.repeat))
+                print(f'{row} {round(size_mb / seconds, 2):>8}')
+
+            os.remove(src)
+
+
+if __name__ == '__main__':
+    main()
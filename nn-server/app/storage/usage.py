@@ -0,0 +1,221 @@
+import os
+import threading
+import time
+from typing import Iterable, NoReturn, Union
+
+from kallosus_packages.over_logging import GetTraceback, Logger
+from redis import Redis
+
+from storage import local_main_s3_path, local_test_s3_path, remote_main_s3_path, remote_test_s3_path
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+# Изменяет размер объекта и на ту же разницу - общий счетчик и счетчик пользователя.
+# KEYS: размеры объектов, общий счетчик, счетчики пользователей; ARGV: объект, новый размер (-1 - удален), пользователь
+_RECORD_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local size = tonumber(ARGV[2])
+local delta
+
+if size < 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    delta = -old
+else
+    redis.call('HSET', KEYS[1], ARGV[1], size)
+    delta = size - old
+end
+
+if delta ~= 0 then
+    redis.call('INCRBY', KEYS[2], delta)
+    if ARGV[3] ~= '' then
+        redis.call('HINCRBY', KEYS[3], ARGV[3], delta)
+    end
+end
+
+return delta
+"""
+
+
+class UsageLedger:
+    """
+    Учет занятого места в хранилище в Redis: размер каждого объекта, общий размер и размер данных каждого пользователя.
+
+    `StorageApi` записывает изменения при каждой записи и удалении файла, поэтому проверка лимита хранилища
+    (`StorageApi.is_bucket_under_limit`) - одно чтение из Redis вместо листинга всего бакета. Размеры объектов
+    хранятся, чтобы при перезаписи и удалении изменять счетчики на точную разницу.
+    Расхождения (файлы, записанные в обход `StorageApi`, ошибки между записью файла и учетом) исправляет
+    `reconcile`, который периодически запускает `UsageReconciler`.
+    """
+
+    _SIZES_KEY = 'pd-storage:usage:sizes'
+    _TOTAL_KEY = 'pd-storage:usage:total'
+    _USERS_KEY = 'pd-storage:usage:users'
+
+    def __init__(self, connection: Union[Redis, None] = None):
+        """
+        :param connection: Подключение к Redis, None - учет выключен до вызова `connect`
+        """
+
+        self.connection = None
+        self._record = None
+
+        if connection is not None:
+            self.connect(connection)
+
+    def connect(self, connection: Redis) -> NoReturn:
+        self.connection = connection
+        self._record = connection.register_script(_RECORD_SCRIPT)
+
+    @staticmethod
+    def get_user_id(path: str) -> str:
+        """
+        :param path: Путь до файла в хранилище (`StorageApi.get_user_folder`/...)
+        :return: id пользователя - первая папка после корня хранилища, '' - файл не в папке пользователя
+        """
+
+        path = path.replace('\\', '/')
+
+        for root in [local_main_s3_path, local_test_s3_path, remote_main_s3_path, remote_test_s3_path]:
+            root = root.replace('\\', '/').rstrip('/') + '/'
+
+            if path.startswith(root):
+                user_id = path[len(root):].split('/', 1)[0]
+
+                return user_id if user_id.isdigit() else ''
+
+        return ''
+
+    def record_put(self, path: str, size: int) -> NoReturn:
+        """
+        :param path: Записанный файл
+        :param size: Размер файла в байтах
+        :return: `NoReturn`
+        """
+
+        self._record_size(path, size)
+
+    def record_delete(self, paths: Iterable[str]) -> NoReturn:
+        """
+        :param paths: Удаленные файлы
+        :return: `NoReturn`
+        """
+
+        for path in paths:
+            self._record_size(path, -1)
+
+    def _record_size(self, path: str, size: int) -> NoReturn:
+        if self._record is None:
+            return
+
+        try:
+            self._record(keys=[self._SIZES_KEY, self._TOTAL_KEY, self._USERS_KEY],
+                         args=[path, size, self.get_user_id(path)],
+                         )
+        except Exception as e:
+            # Ошибка учета не должна ломать запись файла, расхождение исправит `reconcile`
+            get_traceback.error(f'{e}')
+
+    def total(self) -> Union[int, None]:
+        """
+        :return: Общий размер хранилища в байтах, None - учет выключен или еще не заполнен (`reconcile`)
+        """
+
+        if self.connection is None:
+            return None
+
+        total = self.connection.get(self._TOTAL_KEY)
+
+        return int(total) if total is not None else None
+
+    def user_usage(self, user_id: Union[int, str]) -> int:
+        """
+        :param user_id: id пользователя
+        :return: Размер данных пользователя в байтах
+        """
+
+        if self.connection is None:
+            return 0
+
+        return int(self.connection.hget(self._USERS_KEY, str(user_id)) or 0)
+
+    def reconcile(self, sizes: dict[str, int]) -> int:
+        """
+        :param sizes: Размеры всех объектов хранилища (`StorageApi.list_object_sizes`)
+        :return: Общий размер хранилища в байтах
+
+        Заменяет учет одной транзакцией. Изменения, записанные во время листинга хранилища, могут быть потеряны
+        до следующей сверки
+        """
+
+        total = sum(sizes.values())
+        users = {}
+
+        for path, size in sizes.items():
+            user_id = self.get_user_id(path)
+
+            if user_id:
+                users[user_id] = users.get(user_id, 0) + size
+
+        pipeline = self.connection.pipeline(transaction=True)
+        pipeline.delete(self._SIZES_KEY, self._USERS_KEY)
+
+        if sizes:
+            pipeline.hset(self._SIZES_KEY, mapping=sizes)
+
+        if users:
+            pipeline.hset(self._USERS_KEY, mapping=users)
+
+        pipeline.set(self._TOTAL_KEY, total)
+        pipeline.execute()
+
+        return total
+
+
+LEDGER = UsageLedger()
+"""
+Учет места хранилища, общий для всех `StorageApi` процесса, подключается к Redis при создании приложения
+"""
+
+
+class UsageReconciler:
+    """
+    Периодическая сверка учета места (`UsageLedger`) с содержимым хранилища в фоновом потоке процесса API.
+    Блокировка в Redis не дает нескольким процессам листать хранилище одновременно.
+    """
+
+    _LOCK_KEY = 'pd-storage:usage:lock'
+
+    def __init__(self, storage, interval: float = float(os.getenv('PD_USAGE_RECONCILE_INTERVAL', 60 * 60))):
+        """
+        :param storage: `StorageApi`, содержимое которого сверяется
+        :param interval: Как часто сверять учет в секундах
+        """
+
+        self.storage = storage
+        self.interval = interval
+
+    def start(self) -> NoReturn:
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> NoReturn:
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                get_traceback.error(f'{e}')
+
+            time.sleep(self.interval)
+
+    def reconcile(self) -> Union[int, None]:
+        """
+        :return: Общий размер хранилища в байтах, None - сверку выполняет другой процесс
+        """
+
+        if not LEDGER.connection.set(self._LOCK_KEY, 1, nx=True, ex=max(1, int(self.interval))):
+            return None
+
+        total = LEDGER.reconcile(self.storage.list_object_sizes())
+        console_logger.info(f'Storage usage reconciled: {round(total / 1024 ** 2, 2)} Mb')
+
+        return total
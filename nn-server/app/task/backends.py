@@ -0,0 +1,155 @@
+import importlib.util
+import os
+from typing import NoReturn, Union
+
+from kallosus_packages.over_logging import Logger, GetTraceback
+from ultralytics import YOLO
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+
+class ModelBackend:
+    """
+    Способ выполнения модели YOLO. Для графовых runtime модель один раз экспортируется из `.pt`,
+    а экспортированный артефакт кэшируется рядом с `.pt` в `model_folder` и переиспользуется при следующих запусках.
+    Экспортированную модель загружает тот же `ultralytics.YOLO`, поэтому результат `predict` имеет тот же формат.
+    """
+
+    def __init__(self,
+                 name: str,
+                 export_format: Union[str, None] = None,
+                 artifact_suffix: str = '',
+                 required_module: Union[str, None] = None,
+                 ):
+        """
+        :param name: Название backend
+        :param export_format: Формат `YOLO.export`, None - модель выполняется напрямую из `.pt` (PyTorch eager)
+        :param artifact_suffix: Суффикс экспортированного артефакта относительно имени `.pt` без расширения
+        :param required_module: Модуль, который должен быть установлен для работы backend
+        """
+
+        self.name = name
+        self.export_format = export_format
+        self.artifact_suffix = artifact_suffix
+        self.required_module = required_module
+
+    def is_available(self) -> bool:
+        """
+        :return: Установлен ли runtime для backend
+        """
+
+        return self.required_module is None or importlib.util.find_spec(self.required_module) is not None
+
+    def artifact_path(self, pt_path: str) -> str:
+        """
+        :param pt_path: Путь до `.pt` модели
+        :return: Путь до модели, которую загружает backend
+        """
+
+        if self.export_format is None:
+            return pt_path
+
+        return os.path.splitext(pt_path)[0] + self.artifact_suffix
+
+    def export(self, pt_path: str, **export_kwargs) -> str:
+        """
+        :param pt_path: Путь до `.pt` модели
+        :param export_kwargs: Дополнительные параметры `YOLO.export`
+        :return: Путь до экспортированной модели
+
+        Экспортирует модель (`ultralytics` сохраняет артефакт рядом с `.pt`)
+        """
+
+        console_logger.info(f'Exporting {pt_path} to {self.export_format}...')
+
+        # dynamic=True - переменный размер батча и изображения, требуется для пакетного инференса
+        exported = YOLO(pt_path).export(format=self.export_format, dynamic=True, **export_kwargs)
+        console_logger.info(f'Model exported: {exported}')
+
+        return str(exported)
+
+    def ensure_exported(self, pt_path: str) -> str:
+        """
+        :param pt_path: Путь до `.pt` модели
+        :return: Путь до модели для загрузки, экспорт выполняется только если артефакта еще нет
+        """
+
+        if not self.is_available():
+            raise ModuleNotFoundError(f'`{self.required_module}` is required for `{self.name}` backend')
+
+        path = self.artifact_path(pt_path)
+
+        if not os.path.exists(path):
+            self.export(pt_path)
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'{path} does not exists after export')
+
+        return path
+
+    def load(self, pt_path: str) -> YOLO:
+        """
+        :param pt_path: Путь до `.pt` модели
+        :return: Модель, готовая к `predict`
+        """
+
+        return YOLO(self.ensure_exported(pt_path), task='detect')
+
+
+class QuantizedBackend(ModelBackend):
+    """
+    INT8 модель после статического квантования. Квантование требует калибровки на кадрах видео и занимает
+    несколько минут, поэтому артефакт не строится автоматически, а собирается заранее `python -m task.quantize`.
+    """
+
+    def export(self, pt_path: str, **export_kwargs) -> str:
+        raise FileNotFoundError(f'{self.artifact_path(pt_path)} does not exists, '
+                                f'build it with `python -m task.quantize`')
+
+
+BACKENDS = {
+    'torch': ModelBackend('torch'),
+    'onnx': ModelBackend('onnx', export_format='onnx', artifact_suffix='.onnx', required_module='onnxruntime'),
+    'openvino': ModelBackend('openvino',
+                             export_format='openvino',
+                             artifact_suffix='_openvino_model',
+                             required_module='openvino',
+                             ),
+    'onnx_int8': QuantizedBackend('onnx_int8',
+                                  export_format='onnx',
+                                  artifact_suffix='_int8.onnx',
+                                  required_module='onnxruntime',
+                                  ),
+}
+
+# Точность модели -> backend, None - backend из настроек (`PD_BACKEND`)
+PRECISIONS = {
+    'fp32': None,
+    'int8': 'onnx_int8',
+}
+
+
+def get_backend(name: Union[str, None] = None) -> ModelBackend:
+    """
+    :param name: Название backend: torch/onnx/openvino/onnx_int8,
+    по умолчанию берется из переменной окружения `PD_BACKEND`
+    :return: `ModelBackend`
+    """
+
+    name = name or os.getenv('PD_BACKEND') or 'torch'
+
+    if name not in BACKENDS:
+        raise ValueError(f'backend must be one of {list(BACKENDS)}')
+
+    return BACKENDS[name]
+
+
+def check_backends() -> NoReturn:
+    """
+    :return: `NoReturn`
+    Выводит в лог, какие backend доступны на текущем воркере
+    """
+
+    available = {name: backend.is_available() for name, backend in BACKENDS.items()}
+    console_logger.info(f'Inference backends available: {available}')
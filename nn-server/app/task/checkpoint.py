@@ -0,0 +1,99 @@
+import io
+import json
+import os
+import time
+from typing import NoReturn, Union
+
+from redis import Redis
+
+from task.detections import DetectionsRecorder, load_detections
+from task.top_k import TopKFrames
+
+
+class Checkpoint:
+    """
+    Состояние обработки задачи в Redis, с которого задача продолжается после падения воркера (см. `JobReaper`).
+
+    Хранится номер видео и кадра, с которого продолжать, уже обработанные видео задачи, а для текущего видео -
+    `detected`, `num_detected`, обнаружения обработанных кадров и K лучших кадров (сжатыми).
+    Все поля записываются одной транзакцией, поэтому чекпоинт всегда согласован.
+    """
+
+    _TTL = 7 * 24 * 60 * 60  # Сколько хранить чекпоинт незавершенной задачи
+
+    def __init__(self,
+                 task_id: int,
+                 connection: Redis,
+                 interval: float = float(os.getenv('PD_CHECKPOINT_INTERVAL', 60)),
+                 ):
+        """
+        :param task_id: id задачи `Task` (не меняется при повторной постановке задачи в очередь)
+        :param connection: Подключение к Redis
+        :param interval: Как часто сохранять чекпоинт во время обработки видео в секундах
+        """
+
+        self.key = f'pd-checkpoint:{task_id}'
+        self.connection = connection
+        self.interval = interval
+        self._last_save = time.time()
+
+    def is_due(self) -> bool:
+        """
+        :return: Прошло ли `interval` секунд с последнего сохранения
+        """
+
+        return time.time() - self._last_save >= self.interval
+
+    def save(self,
+             state: dict,
+             recorder: Union[DetectionsRecorder, None] = None,
+             top_frames: Union[TopKFrames, None] = None,
+             ) -> NoReturn:
+        """
+        :param state: Состояние задачи (сериализуется в json)
+        :param recorder: Обнаружения обработанных кадров текущего видео
+        :param top_frames: K лучших кадров текущего видео
+        :return: `NoReturn`
+        """
+
+        mapping = {'state': json.dumps(state)}
+
+        if recorder is not None:
+            detections = io.BytesIO()
+            recorder.save(detections)
+            mapping['detections'] = detections.getvalue()
+
+        if top_frames is not None:
+            items = top_frames.items()
+            mapping['top_frames'] = json.dumps([[time_code, labels] for time_code, labels, _ in items])
+            mapping.update({f'top_frame_{i}': image for i, (_, _, image) in enumerate(items)})
+
+        pipeline = self.connection.pipeline(transaction=True)
+        pipeline.delete(self.key)
+        pipeline.hset(self.key, mapping=mapping)
+        pipeline.expire(self.key, self._TTL)
+        pipeline.execute()
+
+        self._last_save = time.time()
+
+    def load(self) -> Union[dict, None]:
+        """
+        :return: Состояние задачи с полями `detections` (`load_detections`) и `top_frames` [(time_code, labels,
+        сжатый кадр), ...], None - чекпоинта нет
+        """
+
+        values = self.connection.hgetall(self.key)
+
+        if not values:
+            return None
+
+        checkpoint = json.loads(values[b'state'])
+        checkpoint['detections'] = load_detections(values[b'detections']) if b'detections' in values else None
+        top_frames = json.loads(values.get(b'top_frames', '[]'))
+        checkpoint['top_frames'] = [(time_code, labels, values[f'top_frame_{i}'.encode()])
+                                    for i, (time_code, labels) in enumerate(top_frames)]
+
+        return checkpoint
+
+    def clear(self) -> NoReturn:
+        self.connection.delete(self.key)
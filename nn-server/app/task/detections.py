@@ -0,0 +1,192 @@
+import io
+import math
+from typing import Callable, Iterator, NoReturn
+
+import numpy as np
+
+
+class DetectionsRecorder:
+    """
+    Компактное хранение обнаружений всех кадров видео (sidecar к json с результатами).
+
+    Обнаружения хранятся по столбцам: номер кадра, время, класс, уверенность и рамка - по одной строке
+    на обнаружение, поэтому размер файла зависит от количества обнаружений, а не от длины видео. По этим данным можно
+    в любой момент отрисовать видео с bbox, не запуская модель повторно (см. `task.render`).
+
+    Дополнительно сохраняется timeline - количество обнаружений каждого класса за каждую секунду видео
+    (несжатый `.npy`, строка на секунду), из которого можно прочитать любой интервал, не загружая весь файл.
+    """
+
+    def __init__(self, fps: float, width: int, height: int, class_names: dict):
+        """
+        :param fps: Частота кадров видео
+        :param width: Ширина видео
+        :param height: Высота видео
+        :param class_names: Названия классов по индексам
+        """
+
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.class_names = class_names
+        self.length = 0  # Сколько кадров записано
+
+        self._frame = []
+        self._cls = []
+        self._conf = []
+        self._box = []
+
+    def add(self, frame_no: int, detections: list[list[float]]) -> NoReturn:
+        """
+        :param frame_no: Номер кадра начиная с 0
+        :param detections: Обнаружения кадра [[xmin, ymin, xmax, ymax, conf, cls], ...]
+        :return: `NoReturn`
+        """
+
+        self.length = max(self.length, frame_no + 1)
+
+        for xmin, ymin, xmax, ymax, conf, cls in detections:
+            self._frame.append(frame_no)
+            self._cls.append(cls)
+            self._conf.append(conf)
+            self._box.append((xmin, ymin, xmax, ymax))
+
+    def extend(self, detections: dict) -> NoReturn:
+        """
+        :param detections: Обнаружения другой части того же видео (`load_detections`), номера кадров - от начала видео
+        :return: `NoReturn`
+
+        Части добавляются по возрастанию номеров кадров (сегменты видео, см. `task.segments`)
+        """
+
+        self.length = max(self.length, int(detections['length']))
+        self._frame.extend(detections['frame'].tolist())
+        self._cls.extend(detections['cls'].tolist())
+        self._conf.extend(detections['conf'].tolist())
+        self._box.extend(map(tuple, detections['box'].tolist()))
+
+    def save(self, path: str) -> str:
+        """
+        :param path: Путь до `.npz` файла
+        :return: `path`
+        """
+
+        class_ids = sorted(self.class_names)
+        frames = np.asarray(self._frame, dtype=np.int32)
+
+        np.savez_compressed(path,
+                            frame=frames,
+                            timestamp=(frames / self.fps).astype(np.float32),
+                            cls=np.asarray(self._cls, dtype=np.int16),
+                            conf=np.asarray(self._conf, dtype=np.float16),
+                            box=np.asarray(self._box, dtype=np.int16).reshape(-1, 4),
+                            fps=np.float32(self.fps),
+                            size=np.asarray([self.width, self.height], dtype=np.int32),
+                            length=np.int32(self.length),
+                            class_ids=np.asarray(class_ids, dtype=np.int16),
+                            class_names=np.asarray([self.class_names[i] for i in class_ids]),
+                            )
+
+        return path
+
+    def counts_per_second(self) -> np.ndarray:
+        """
+        :return: Матрица секунд x классов (по возрастанию индекса класса) с количеством обнаружений
+        """
+
+        class_ids = sorted(self.class_names)
+        num_seconds = max(1, math.ceil(self.length / self.fps))
+        counts = np.zeros((num_seconds, len(class_ids)), dtype=np.uint32)
+
+        if self._frame:
+            seconds = (np.asarray(self._frame) / self.fps).astype(np.int64)
+            columns = np.searchsorted(class_ids, np.asarray(self._cls))
+            np.add.at(counts, (seconds, columns), 1)
+
+        return counts
+
+    def save_timeline(self, path: str) -> str:
+        """
+        :param path: Путь до `.npy` файла
+        :return: `path`
+        """
+
+        np.save(path, self.counts_per_second())
+
+        return path
+
+    def timeline_classes(self) -> list[str]:
+        """
+        :return: Названия классов в порядке столбцов timeline
+        """
+
+        return [self.class_names[i] for i in sorted(self.class_names)]
+
+
+def read_timeline(read_range: Callable[[int, int], bytes], start: int, end: int) -> np.ndarray:
+    """
+    :param read_range: Функция чтения `(offset, size) -> bytes` из `.npy` файла timeline (`StorageApi.read_range`)
+    :param start: Первая секунда интервала
+    :param end: Секунда, на которой интервал заканчивается (не включительно)
+    :return: Количество обнаружений классов за секунды [start, end)
+
+    Читает только заголовок и нужные строки файла
+    """
+
+    header = io.BytesIO(read_range(0, 256))
+    major, _ = np.lib.format.read_magic(header)
+    read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+    shape, _, dtype = read_header(header)
+    offset = header.tell()
+
+    num_seconds, num_classes = shape
+    start, end = max(0, start), min(end, num_seconds)
+
+    if start >= end:
+        return np.zeros((0, num_classes), dtype=dtype)
+
+    row_size = num_classes * dtype.itemsize
+    data = read_range(offset + start * row_size, (end - start) * row_size)
+
+    return np.frombuffer(data, dtype=dtype).reshape(end - start, num_classes)
+
+
+def downsample(counts: np.ndarray, step: int) -> np.ndarray:
+    """
+    :param counts: Количество обнаружений по секундам (секунды x классы)
+    :param step: Сколько секунд объединять в одну точку
+    :return: Среднее количество обнаружений в секунду для каждых `step` секунд
+    """
+
+    if step <= 1 or not len(counts):
+        return counts.astype(np.float32)
+
+    pad = -len(counts) % step
+    padded = np.pad(counts.astype(np.float32), ((0, pad), (0, 0)), constant_values=np.nan)
+
+    return np.nanmean(padded.reshape(-1, step, counts.shape[1]), axis=1)
+
+
+def load_detections(data: bytes) -> dict:
+    """
+    :param data: Содержимое `.npz` файла, сохраненного `DetectionsRecorder.save`
+    :return: Столбцы обнаружений и параметры видео
+    """
+
+    with np.load(io.BytesIO(data)) as npz:
+        return {key: npz[key] for key in npz.files}
+
+
+def iter_frame_detections(detections: dict) -> Iterator[list[list[float]]]:
+    """
+    :param detections: Результат `load_detections`
+    :return: Обнаружения каждого кадра по порядку в формате `DiseasesDetection.detect`
+    """
+
+    frames, boxes = detections['frame'], detections['box']
+    cls, conf = detections['cls'], detections['conf']
+    # Строки записаны по возрастанию номера кадра, поэтому границы кадров находим бинарным поиском
+    bounds = np.searchsorted(frames, np.arange(int(detections['length']) + 1))
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        yield [[*boxes[i].tolist(), float(conf[i]), int(cls[i])] for i in range(start, end)]
@@ -4,7 +4,6 @@ import matplotlib.pyplot as plt
 import numpy as np
 import ultralytics
 from PIL import Image
-from ultralytics import YOLO
 
 try:
     matplotlib.use('TkAgg')
@@ -22,20 +21,35 @@ from torch import __version__ as torch_ver
 from torchvision import __version__ as torch_vision_ver
 import gdown
 
+try:
+    from .backends import PRECISIONS, check_backends, get_backend
+except ImportError:
+    from backends import PRECISIONS, check_backends, get_backend
+
 console_logger = Logger(__file__)
 get_traceback = GetTraceback(__file__)
 
 ultralytics.checks()
 
 console_logger.info(f'ultralytics: {ultralytics.__version__}; torch: {torch_ver}; torchvision: {torch_vision_ver}')
+check_backends()
 
 
 class DiseasesDetection:
-    def __init__(self, save: bool = False, threshold: float = 0.5, line_width: int = 2):
+    def __init__(self,
+                 save: bool = False,
+                 threshold: float = 0.5,
+                 line_width: int = 2,
+                 backend: Union[str, None] = None,
+                 precision: str = 'fp32',
+                 ):
         """
         :param save: Флаг, сохранять ли выход
         :param threshold: Порог срабатывания
         :param line_width: Толщина линии обводки
+        :param backend: Способ выполнения модели: torch (PyTorch eager), onnx (onnxruntime CPU), openvino.
+        По умолчанию берется из переменной окружения `PD_BACKEND`, если ее нет - torch
+        :param precision: Точность модели: fp32 или int8 (квантованная ONNX модель, собирается `task.quantize`)
         """
 
         # Определяем основные объекта переменные класса
@@ -65,6 +79,13 @@ class DiseasesDetection:
         self._threshold = threshold
         self._line_width = line_width
 
+        if precision not in PRECISIONS:
+            raise ValueError(f'precision must be one of {list(PRECISIONS)}')
+
+        self.precision = precision
+        self.backend = get_backend(PRECISIONS[precision] or backend)
+        self.fallback_from: Union[str, None] = None  # Backend, который не загрузился и был заменен на torch
+
         self.model = None
         self.class_names_dict = {}
 
@@ -81,14 +102,23 @@ class DiseasesDetection:
         Загружаем модель
         """
 
-        console_logger.debug('Loading model...')
+        console_logger.debug(f'Loading model using `{self.backend.name}` backend...')
 
         # Загрузите сохраненную модель и создайте функцию обнаружения
-        if os.path.exists(self.__model_path):
-            self.model = YOLO(self.__model_path)
-        else:
+        if not os.path.exists(self.__model_path):
             raise FileNotFoundError(f'{self.__model_path} does not exists')
-        console_logger.debug('Model loaded')
+
+        try:
+            self.model = self.backend.load(self.__model_path)
+        except Exception as e:
+            # Экспорт может не поддерживаться на конкретном воркере, в этом случае работаем на PyTorch
+            console_logger.warning(f'Backend `{self.backend.name}` failed to load: {e}, falling back to torch backend')
+            self.fallback_from = self.backend.name
+            self.backend = get_backend('torch')
+            self.precision = 'fp32'  # Например, INT8 модель не собрана на этом воркере
+            self.model = self.backend.load(self.__model_path)
+
+        console_logger.debug(f'Model loaded: {self.backend.artifact_path(self.__model_path)}')
 
         # Открываем файл и считываем его содержимое
         with open(self.__names_path, 'r') as file:
@@ -107,36 +137,44 @@ class DiseasesDetection:
 
         return img_arr
 
-    def predict(self, image: Union[str, np.ndarray], show: bool = False) -> tuple[np.ndarray, list[int], list[str]]:
+    def detect(self, images: list[np.ndarray]) -> list[list[list[float]]]:
         """
-        :param image: Путь до изображения
-        :param show: Показывать ли изображение с bbox
-        :return: картинка с bbox и обнаруженные на ней болезни списком в виде индексов и меток
+        :param images: Список изображений, которые передаются в модель одним батчем
+        :return: Для каждого изображения список обнаружений `[xmin, ymin, xmax, ymax, confidence, class_id]`
+
+        Выполняет только инференс модели, без отрисовки рамок
         """
 
+        if not images:
+            return []
+
         if not self.model:
             console_logger.info('`self.model` не определена, загружаем модель')
             self.load()
 
-        if isinstance(image, str):
-            image_np = self.load_image_into_numpy_array(image)
-        else:
-            image_np = image
+        results = self.model.predict(images, conf=self._threshold, verbose=False)
+        detections = []
+
+        for result in results:
+            # Отфильтруем слабые обнаружения
+            detections.append([data for data in result.boxes.data.tolist() if float(data[4]) >= self._threshold])
+
+        return detections
+
+    def annotate(self, image_np: np.ndarray, detections: list[list[float]]) -> tuple[np.ndarray, list[int], list[str]]:
+        """
+        :param image_np: Изображение, на котором рисуем рамки (изменяется на месте)
+        :param detections: Обнаружения, полученные из `self.detect`
+        :return: картинка с bbox и обнаруженные на ней болезни списком в виде индексов и меток
+        """
 
-        detections = self.model.predict(image_np, conf=self._threshold)[0]
         class_indices = []
         class_labels = []
         text_thickness = 2
         font_scale = 1
 
         # Проходимся по detections
-        for data in detections.boxes.data.tolist():
-            confidence = data[4]
-
-            # Отфильтруем слабые обнаружения
-            if float(confidence) < self._threshold:
-                continue
-
+        for data in detections:
             # Рисуем рамку
             xmin, ymin, xmax, ymax = int(data[0]), int(data[1]), int(data[2]), int(data[3])
             conf = round(data[4], 2)
@@ -151,6 +189,22 @@ class DiseasesDetection:
             cv2.putText(image_np, text, (xmin + 5, ymin - 15), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (255, 0, 0),
                         text_thickness)
 
+        return image_np, class_indices, class_labels
+
+    def predict(self, image: Union[str, np.ndarray], show: bool = False) -> tuple[np.ndarray, list[int], list[str]]:
+        """
+        :param image: Путь до изображения
+        :param show: Показывать ли изображение с bbox
+        :return: картинка с bbox и обнаруженные на ней болезни списком в виде индексов и меток
+        """
+
+        if isinstance(image, str):
+            image_np = self.load_image_into_numpy_array(image)
+        else:
+            image_np = image
+
+        image_np, class_indices, class_labels = self.annotate(image_np, self.detect([image_np])[0])
+
         if show:
             plt.figure()
             plt.imshow(image_np)
@@ -163,8 +217,42 @@ class DiseasesDetection:
 
         return image_np, class_indices, class_labels
 
+    def predict_batch(self, images: list[np.ndarray]) -> list[tuple[np.ndarray, list[int], list[str]]]:
+        """
+        :param images: Список изображений (кадров видео)
+        :return: Для каждого изображения в том же порядке: картинка с bbox, индексы и метки обнаруженных болезней
+
+        Все изображения передаются в модель за один прямой проход, что снижает накладные расходы на вызов модели
+        """
+
+        return [self.annotate(image_np, detections) for image_np, detections in zip(images, self.detect(images))]
+
 
 PREDICTOR = DiseasesDetection()
+_PREDICTORS = {'fp32': PREDICTOR}
+
+
+def get_predictor(precision: Union[str, None] = None) -> DiseasesDetection:
+    """
+    :param precision: Точность модели fp32/int8, по умолчанию fp32
+    :return: Загруженная модель нужной точности, модели кэшируются, чтобы загружаться один раз на воркер
+    """
+
+    precision = precision or 'fp32'
+
+    if precision not in _PREDICTORS:
+        predictor = DiseasesDetection(precision=precision)
+        predictor.load()
+
+        if predictor.fallback_from is not None:
+            # Вместо модели нужной точности загружена fp32 модель, вторая копия fp32 модели воркеру не нужна
+            console_logger.info(f'{precision} model is not available, {precision} tasks use fp32 model')
+            predictor = _PREDICTORS['fp32']
+
+        _PREDICTORS[precision] = predictor
+
+    return _PREDICTORS[precision]
+
 
 if __name__ == '__main__':
     # image = np.random.randint(0, 256, (640, 640, 3), dtype=np.uint8)
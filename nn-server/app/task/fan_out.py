@@ -0,0 +1,235 @@
+import json
+import time
+from typing import Callable, NoReturn, Union
+
+from redis import Redis
+from rq import Queue
+from rq.command import send_stop_job_command
+from rq.exceptions import InvalidJobOperation
+from rq.job import Job
+
+
+class FanOut:
+    """
+    Распределение частей одной задачи (видео задачи) между воркерами через дочерние задачи RQ.
+
+    Для каждой части ставится дочерняя задача, но перед обработкой часть нужно захватить (`HSETNX`).
+    Родительская задача сама захватывает и обрабатывает еще не взятые части, поэтому при одном свободном воркере
+    все выполняется последовательно в родительской задаче, а при нескольких - части обрабатываются параллельно.
+    Дочерняя задача, часть которой уже захвачена, сразу завершается.
+
+    Результаты частей хранятся в Redis, пока их не соберет родительская задача.
+    """
+
+    _TTL = 2 * 24 * 60 * 60  # Сколько хранить состояние в Redis
+
+    def __init__(self, parent_id: str, num_parts: int, connection: Redis):
+        """
+        :param parent_id: id родительской задачи RQ
+        :param num_parts: Количество частей
+        :param connection: Подключение к Redis
+        """
+
+        self.parent_id = parent_id
+        self.num_parts = num_parts
+        self.connection = connection
+
+        self._claims_key = f'pd-fan-out:{parent_id}:claims'
+        self._results_key = f'pd-fan-out:{parent_id}:results'
+        self._children_key = f'pd-fan-out:{parent_id}:children'
+
+    def enqueue(self, queue: Queue, func: str, meta: dict, *args, **kwargs) -> list[Job]:
+        """
+        :param queue: Очередь, в которую ставятся дочерние задачи
+        :param func: Функция дочерней задачи, первыми аргументами получает `parent_id` и номер части
+        :param meta: meta дочерних задач (к ней добавляются `parent_id` и `part_no`)
+        :param args: Аргументы функции
+        :param kwargs: Аргументы функции
+        :return: Дочерние задачи
+
+        Для частей, дочерние задачи которых уже поставлены (задача запущена повторно), новые задачи не ставятся
+        """
+
+        jobs = []
+        children = self.children()
+
+        for part_no in range(self.num_parts):
+            if part_no in children:
+                continue
+
+            job = queue.enqueue(func, self.parent_id, part_no, *args, **kwargs,
+                                meta={**meta, 'parent_id': self.parent_id, 'part_no': part_no},
+                                job_timeout=-1,
+                                )
+            jobs.append(job)
+            self.connection.hset(self._children_key, part_no, job.get_id())
+
+        self.connection.expire(self._children_key, self._TTL)
+
+        return jobs
+
+    def claim(self, part_no: int, owner: str) -> bool:
+        """
+        :param part_no: Номер части
+        :param owner: id задачи, которая будет обрабатывать часть
+        :return: Удалось ли захватить часть (никто другой ее еще не взял)
+
+        Задача, повторно поставленная в очередь после падения воркера (`JobReaper`), сохраняет id,
+        поэтому снова получает свои части
+        """
+
+        is_claimed = bool(self.connection.hsetnx(self._claims_key, part_no, owner))
+        self.connection.expire(self._claims_key, self._TTL)
+
+        return is_claimed or self.connection.hget(self._claims_key, part_no) == owner.encode()
+
+    def claim_next(self, owner: str) -> Union[int, None]:
+        """
+        :param owner: id задачи, которая будет обрабатывать часть
+        :return: Номер первой еще не захваченной части (или захваченной `owner`, но не обработанной - после
+        повторного запуска задачи), None - все части захвачены
+        """
+
+        claims = self.claims()
+        results = self.results()
+
+        for part_no in range(self.num_parts):
+            if part_no in results:
+                continue
+
+            if claims.get(part_no) == owner or part_no not in claims and self.claim(part_no, owner):
+                return part_no
+
+        return None
+
+    def claims(self) -> dict[int, str]:
+        """
+        :return: id задач, захвативших части, по номерам частей
+        """
+
+        claims = self.connection.hgetall(self._claims_key)
+
+        return {int(part_no): owner.decode() for part_no, owner in claims.items()}
+
+    def set_result(self, part_no: int, result: dict) -> NoReturn:
+        """
+        :param part_no: Номер части
+        :param result: Результат обработки части (сериализуется в json)
+        """
+
+        self.connection.hset(self._results_key, part_no, json.dumps(result))
+        self.connection.expire(self._results_key, self._TTL)
+
+    def results(self) -> dict[int, dict]:
+        """
+        :return: Результаты уже обработанных частей по номерам
+        """
+
+        results = self.connection.hgetall(self._results_key)
+
+        return {int(part_no): json.loads(result) for part_no, result in results.items()}
+
+    def children(self) -> dict[int, str]:
+        """
+        :return: id дочерних задач по номерам частей
+        """
+
+        children = self.connection.hgetall(self._children_key)
+
+        return {int(part_no): job_id.decode() for part_no, job_id in children.items()}
+
+    def progress(self, local_progress: dict[int, float]) -> float:
+        """
+        :param local_progress: Прогресс частей, обрабатываемых в текущей задаче
+        :return: Общий прогресс всех частей (0-100)
+        """
+
+        results = self.results()
+        children = self.children()
+        pending = [part_no for part_no in children if part_no not in results and part_no not in local_progress]
+        jobs = Job.fetch_many([children[part_no] for part_no in pending], connection=self.connection)
+        child_progress = {job.meta.get('part_no'): job.meta.get('progress', 0) for job in jobs if job is not None}
+
+        total = 0
+        for part_no in range(self.num_parts):
+            if part_no in results:
+                total += 100
+            elif part_no in local_progress:
+                total += local_progress[part_no]
+            else:
+                total += child_progress.get(part_no, 0)
+
+        return total / self.num_parts
+
+    def wait(self, on_poll: Callable[[], NoReturn], poll_interval: float = 1.0) -> dict[int, dict]:
+        """
+        :param on_poll: Вызывается при каждой проверке (обновление общего прогресса)
+        :param poll_interval: Интервал проверки в секундах
+        :return: Результаты всех частей, для частей, дочерняя задача которых завершилась ошибкой - {'error': True}
+        """
+
+        while True:
+            results = self.results()
+            pending = [part_no for part_no in range(self.num_parts) if part_no not in results]
+
+            if not pending:
+                return results
+
+            # Часть обрабатывает задача, которая ее захватила, а пока часть никто не взял - ее дочерняя задача
+            claims = self.claims()
+            children = self.children()
+            jobs = Job.fetch_many([claims.get(part_no, children[part_no]) for part_no in pending],
+                                  connection=self.connection)
+
+            for part_no, job in zip(pending, jobs):
+                if job is None or job.get_status() in ['failed', 'stopped', 'canceled']:
+                    self.set_result(part_no, {'error': True})
+
+            on_poll()
+            time.sleep(poll_interval)
+
+    @staticmethod
+    def stop_children(job_id: str, connection: Redis) -> list[str]:
+        """
+        :param job_id: id задачи RQ, которую останавливают
+        :param connection: Подключение к Redis
+        :return: id остановленных или отмененных дочерних задач
+
+        Останавливает дочерние задачи всех распределений задачи `job_id` (частей видео и сегментов `{job_id}:{n}`),
+        включая дочерние задачи дочерних задач: выполняющиеся останавливаются, ожидающие в очереди отменяются
+        """
+
+        stopped = []
+        parents = [job_id]
+
+        while parents:
+            parent = parents.pop()
+            child_ids = []
+
+            for key in connection.scan_iter(match=f'pd-fan-out:{parent}*:children'):
+                child_ids += [child_id.decode() for child_id in connection.hvals(key)]
+
+            for job in Job.fetch_many(child_ids, connection=connection):
+                if job is None:
+                    continue
+
+                status = job.get_status()
+
+                try:
+                    if status == 'started':
+                        send_stop_job_command(connection, job.get_id())
+                    elif status in ['queued', 'deferred', 'scheduled']:
+                        job.cancel()
+                    else:
+                        continue
+                except InvalidJobOperation:  # Задача завершилась, пока ее останавливали
+                    continue
+
+                stopped.append(job.get_id())
+
+            parents += child_ids
+
+        return stopped
+
+    def cleanup(self) -> NoReturn:
+        self.connection.delete(self._claims_key, self._results_key, self._children_key)
@@ -0,0 +1,161 @@
+from typing import Union
+
+import cv2
+import numpy as np
+
+
+class FrameSelector:
+    """
+    Решает, какие кадры видео передаются в модель. Для остальных кадров переиспользуются (переносятся вперед)
+    обнаружения последнего кадра, прошедшего через модель.
+
+    Кадры отбираются по шагу `sample_stride`, а затем (если задан `frame_gate`) дешевым детектором изменений:
+    если кадр почти не отличается от последнего обработанного моделью кадра, модель на нем не запускается.
+    """
+
+    _FRAME_GATES = ['diff', 'phash']
+    _DEFAULT_THRESHOLDS = {
+        'diff': 0.02,  # Средняя абсолютная разница уменьшенных серых кадров (0..1)
+        'phash': 0.1,  # Доля отличающихся бит перцептивного хэша (0..1)
+    }
+
+    def __init__(self,
+                 sample_stride: int = 1,
+                 frame_gate: Union[str, None] = None,
+                 gate_threshold: Union[float, None] = None,
+                 max_reused: int = 150,
+                 ):
+        """
+        :param sample_stride: Модель запускается на каждом `sample_stride` кадре, 1 - на каждом кадре
+        :param frame_gate: Детектор изменений кадра: None - не используется, diff - разница уменьшенных серых кадров,
+        phash - перцептивный хэш
+        :param gate_threshold: Порог изменения (0..1), ниже которого обнаружения переиспользуются,
+        по умолчанию зависит от `frame_gate`
+        :param max_reused: Сколько кадров подряд можно переиспользовать обнаружения детектором изменений,
+        после чего модель запускается принудительно
+        """
+
+        if frame_gate is not None and frame_gate not in self._FRAME_GATES:
+            raise ValueError(f'frame_gate must be one of {self._FRAME_GATES}')
+
+        self.sample_stride = max(1, int(sample_stride))
+        self.frame_gate = frame_gate
+        self.gate_threshold = gate_threshold if gate_threshold is not None else self._DEFAULT_THRESHOLDS.get(frame_gate)
+        self.max_reused = max_reused
+
+        self.frames_inferred = 0  # Сколько кадров прошло через модель
+        self.frames_reused = 0  # Для скольких кадров обнаружения перенесены с предыдущего кадра
+
+        self._reference = None  # Отпечаток последнего кадра, прошедшего через модель
+        self._reused_in_row = 0
+
+    @classmethod
+    def from_options(cls,
+                     fps: float,
+                     sample_stride: Union[int, None] = None,
+                     target_fps: Union[float, None] = None,
+                     frame_gate: Union[str, None] = None,
+                     gate_threshold: Union[float, None] = None,
+                     ) -> 'FrameSelector':
+        """
+        :param fps: Частота кадров видео
+        :param sample_stride: Шаг выборки кадров, имеет приоритет над `target_fps`
+        :param target_fps: Сколько кадров в секунду обрабатывать моделью, шаг вычисляется из `fps` видео
+        :param frame_gate: Детектор изменений кадра diff/phash
+        :param gate_threshold: Порог детектора изменений
+        :return: `FrameSelector`
+        """
+
+        if sample_stride:
+            stride = sample_stride
+        elif target_fps and fps:
+            stride = round(fps / target_fps)
+        else:
+            stride = 1
+
+        # Принудительно обновляем обнаружения хотя бы раз в 5 секунд видео
+        max_reused = int(fps * 5) if fps else 150
+
+        return cls(sample_stride=max(1, int(stride)),
+                   frame_gate=frame_gate,
+                   gate_threshold=gate_threshold,
+                   max_reused=max_reused,
+                   )
+
+    def should_infer(self, count: int, image: np.ndarray) -> bool:
+        """
+        :param count: Номер кадра начиная с 0
+        :param image: Кадр
+        :return: Нужно ли запускать модель на кадре, иначе переиспользуются предыдущие обнаружения
+        """
+
+        is_inferred = count % self.sample_stride == 0
+
+        if is_inferred and self.frame_gate:
+            is_inferred = self._is_changed(image)
+
+        if is_inferred:
+            self.frames_inferred += 1
+            self._reused_in_row = 0
+        else:
+            self.frames_reused += 1
+            self._reused_in_row += 1
+
+        return is_inferred
+
+    def _is_changed(self, image: np.ndarray) -> bool:
+        """
+        :param image: Кадр
+        :return: Изменился ли кадр относительно последнего кадра, прошедшего через модель
+
+        При изменении кадр становится новым эталоном для сравнения
+        """
+
+        fingerprint = self._fingerprint(image)
+
+        if self._reference is not None and self._reused_in_row < self.max_reused:
+            if self._distance(self._reference, fingerprint) < self.gate_threshold:
+                return False
+
+        self._reference = fingerprint
+
+        return True
+
+    def _fingerprint(self, image: np.ndarray) -> np.ndarray:
+        """
+        :param image: Кадр BGR
+        :return: Уменьшенный серый кадр для diff или 64-битный перцептивный хэш для phash
+        """
+
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+        if self.frame_gate == 'diff':
+            return cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+        # pHash: низкие частоты DCT уменьшенного кадра, сравниваемые с медианой
+        small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+        low_freq = cv2.dct(small)[:8, :8]
+
+        return low_freq > np.median(low_freq)
+
+    def _distance(self, reference: np.ndarray, fingerprint: np.ndarray) -> float:
+        """
+        :param reference: Отпечаток эталонного кадра
+        :param fingerprint: Отпечаток текущего кадра
+        :return: Степень изменения от 0 до 1
+        """
+
+        if self.frame_gate == 'diff':
+            return float(np.mean(np.abs(reference - fingerprint)) / 255)
+
+        return float(np.count_nonzero(reference != fingerprint) / reference.size)
+
+    def json(self) -> dict:
+        """
+        :return: Статистика отбора кадров
+        """
+
+        return {
+            'frames_inferred': self.frames_inferred,
+            'frames_reused': self.frames_reused,
+        }
@@ -0,0 +1,187 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from typing import NoReturn, Union
+
+import cv2
+import numpy as np
+from kallosus_packages.over_logging import Logger, GetTraceback
+
+from resources.errors import PredictionTimeoutError, ServerBusyError
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+# Состояние процесса с моделью, заполняется `_init_process`
+_predictor = None
+_storage = None
+
+
+def _init_process(precision: str) -> NoReturn:
+    """
+    :param precision: Точность модели fp32/int8
+    :return: `NoReturn`
+
+    Выполняется один раз при старте процесса пула: загружает модель и подключается к хранилищу,
+    после чего процесс обслуживает запросы без повторной загрузки
+    """
+
+    global _predictor, _storage
+
+    from storage.S3 import StorageApi
+    from task.disiases_detection import get_predictor
+
+    _predictor = get_predictor(precision)
+    _storage = StorageApi()
+
+    _predictor.detect([np.zeros((640, 640, 3), dtype=np.uint8)])  # Прогрев
+    console_logger.info(f'Image predictor process {os.getpid()} ready')
+
+
+def _predict_image(image_bytes: Union[bytes, None], src: Union[str, None], dst: Union[str, None]) -> dict:
+    """
+    :param image_bytes: Загруженное изображение (если не указан `src`)
+    :param src: Путь до изображения в хранилище
+    :param dst: Папка в хранилище, куда сохранить изображение с bbox и label болезней, None - не сохранять
+    :return: Обнаружения и ссылка на размеченное изображение
+
+    Выполняется в процессе пула
+    """
+
+    if image_bytes is None:
+        image_bytes = _storage.read_bytes(src)
+
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    if image is None:
+        raise ValueError('Image can not be decoded')
+
+    detections = _predictor.detect([image])[0]
+
+    result = {
+        'detections': [{'label': _predictor.class_names_dict[int(cls)],
+                        'confidence': round(float(conf), 3),
+                        'bbox': [round(float(value), 1) for value in (xmin, ymin, xmax, ymax)],
+                        }
+                       for xmin, ymin, xmax, ymax, conf, cls in detections],
+        'image': None,
+    }
+
+    if dst:
+        annotated, _, _ = _predictor.annotate(image, detections)
+        name = os.path.splitext(os.path.basename(src or 'image'))[0]
+        path = _storage.path_join(dst, f'{name}_{time.time()}.png')
+
+        if _storage.imwrite(path, annotated):
+            result['image'] = _storage.get_download_link(path)
+
+    return result
+
+
+class ImagePredictor:
+    """
+    Синхронный прогноз для одного изображения без очереди RQ. Модель постоянно загружена в небольшом пуле процессов,
+    поэтому время ответа определяется временем инференса, а не запуском задачи.
+
+    Одновременно выполняется не более `max_concurrency` запросов (остальные сразу получают `ServerBusyError`),
+    а каждый запрос ограничен временем `timeout` (`PredictionTimeoutError` при превышении). Запрос занимает место,
+    пока процесс пула его не выполнит, даже если ответ уже вернулся с `PredictionTimeoutError`.
+
+    Процессы пула запускаются при первом запросе (`predict`) или заранее (`start`) и завершаются `shutdown`.
+    """
+
+    def __init__(self,
+                 workers: int = int(os.getenv('PD_IMAGE_WORKERS', 1)),
+                 max_concurrency: int = int(os.getenv('PD_IMAGE_MAX_CONCURRENCY', 4)),
+                 timeout: float = float(os.getenv('PD_IMAGE_TIMEOUT', 2)),
+                 precision: str = os.getenv('PD_IMAGE_PRECISION', 'fp32'),
+                 ):
+        """
+        :param workers: Количество процессов с загруженной моделью
+        :param max_concurrency: Сколько запросов может одновременно обрабатываться или ждать свободный процесс
+        :param timeout: Максимальное время ответа (SLO) в секундах, включая ожидание свободного процесса
+        :param precision: Точность модели fp32/int8
+        """
+
+        self.workers = max(1, workers)
+        self.max_concurrency = max(self.workers, max_concurrency)
+        self.timeout = timeout
+        self.precision = precision
+
+        self._executor: Union[ProcessPoolExecutor, None] = None
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+
+    def start(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+
+        Запускает процессы пула и дожидается загрузки в них модели
+        """
+
+        with self._lock:
+            if self._executor is not None:
+                return
+
+            # spawn - дочерние процессы не наследуют соединения с БД и Redis процесса Flask
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_process,
+                                                 initargs=(self.precision,),
+                                                 )
+
+        # `ProcessPoolExecutor` запускает процессы по мере поступления задач, поэтому загружаем все сразу
+        for future in [self._executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+        console_logger.info(f'ImagePredictor started: {self.workers} workers, max concurrency {self.max_concurrency}')
+
+    def predict(self,
+                image_bytes: Union[bytes, None] = None,
+                src: Union[str, None] = None,
+                dst: Union[str, None] = None,
+                ) -> dict:
+        """
+        :param image_bytes: Загруженное изображение
+        :param src: Путь до изображения в хранилище (если не передано `image_bytes`)
+        :param dst: Папка в хранилище для размеченного изображения, None - не сохранять
+        :return: {'detections': [{'label', 'confidence', 'bbox'}], 'image': ссылка или None, 'latency_ms'}
+        """
+
+        slots = self._slots
+
+        if not slots.acquire(blocking=False):
+            raise ServerBusyError(f'More than {self.max_concurrency} concurrent image predictions')
+
+        try:
+            self.start()  # Первый запрос ждет загрузки модели, время загрузки не входит в `timeout`
+            start = time.perf_counter()
+            future = self._executor.submit(_predict_image, image_bytes, src, dst)
+        except BaseException:
+            slots.release()
+            raise
+
+        # Место освобождается, только когда процесс закончил запрос (или запрос отменен до начала выполнения)
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            result = future.result(timeout=max(0.0, self.timeout - (time.perf_counter() - start)))
+        except TimeoutError:
+            future.cancel()  # Если процесс еще не взял запрос, он не будет выполнен
+            raise PredictionTimeoutError(f'Image prediction exceeded {self.timeout} s')
+
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+        return result
+
+    def shutdown(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        """
+
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
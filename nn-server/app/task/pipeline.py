@@ -0,0 +1,344 @@
+import heapq
+import queue
+import threading
+import time
+from typing import Any, Callable, NoReturn, Union
+
+import cv2
+import numpy as np
+from kallosus_packages.over_logging import Logger
+
+console_logger = Logger(__file__)
+
+_END = object()  # Маркер конца потока кадров
+
+
+class StageStats:
+    """
+    Статистика работы одной стадии конвейера: сколько времени стадия была занята полезной работой,
+    сколько ждала входных данных и сколько ждала освобождения места в следующей очереди
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name: Название стадии
+        """
+
+        self.name = name
+        self.items = 0
+        self.busy = 0.0  # Время полезной работы
+        self.wait_input = 0.0  # Время ожидания данных из предыдущей стадии (стадия голодает)
+        self.wait_output = 0.0  # Время ожидания места в очереди следующей стадии (стадия заблокирована)
+
+    def json(self, wall_time: float) -> dict:
+        """
+        :param wall_time: Общее время работы конвейера
+        :return: Статистика в виде `dict`, доли времени указаны относительно `wall_time`
+        """
+
+        wall_time = wall_time or 1
+
+        return {
+            'items': self.items,
+            'busy': round(self.busy / wall_time, 3),
+            'wait_input': round(self.wait_input / wall_time, 3),
+            'wait_output': round(self.wait_output / wall_time, 3),
+        }
+
+
+class BoundedQueue:
+    """
+    Очередь ограниченного размера между стадиями конвейера. Ограничение размера дает обратное давление:
+    быстрая стадия блокируется, пока медленная не освободит место, поэтому память не растет.
+    Дополнительно считает среднюю заполненность, чтобы видеть, где скапливаются кадры.
+    """
+
+    def __init__(self, name: str, maxsize: int, stop_event: threading.Event):
+        """
+        :param name: Название очереди
+        :param maxsize: Максимальное количество элементов
+        :param stop_event: Событие остановки конвейера (при ошибке в одной из стадий)
+        """
+
+        self.name = name
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop_event = stop_event
+        self._fill_sum = 0
+        self._fill_samples = 0
+
+    def put(self, item: Any, stats: StageStats) -> bool:
+        """
+        :param item: Элемент
+        :param stats: Статистика стадии, которая кладет элемент
+        :return: Удалось ли положить элемент (False, если конвейер остановлен)
+        """
+
+        start = time.perf_counter()
+
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        else:
+            return False
+
+        stats.wait_output += time.perf_counter() - start
+        self._fill_sum += self._queue.qsize()
+        self._fill_samples += 1
+
+        return True
+
+    def get(self, stats: StageStats) -> Any:
+        """
+        :param stats: Статистика стадии, которая забирает элемент
+        :return: Элемент очереди или `_END`, если конвейер остановлен
+        """
+
+        start = time.perf_counter()
+
+        while not self._stop_event.is_set():
+            try:
+                item = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            return _END
+
+        stats.wait_input += time.perf_counter() - start
+
+        return item
+
+    def get_nowait(self) -> Any:
+        """
+        :return: Элемент очереди или `None`, если очередь пуста
+        """
+
+        try:
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def occupancy(self) -> float:
+        """
+        :return: Средняя заполненность очереди от 0 до 1
+        """
+
+        if not self._fill_samples:
+            return 0.0
+
+        return round(self._fill_sum / self._fill_samples / self.maxsize, 3)
+
+
+class FramePipeline:
+    """
+    Конвейер обработки видео из трех стадий, соединенных ограниченными очередями:
+    декодирование (отдельный поток) -> инференс (текущий поток) -> отрисовка и кодирование (отдельный поток).
+    Пока модель обрабатывает одну пачку кадров, OpenCV параллельно декодирует следующие и кодирует предыдущие
+    (OpenCV и torch освобождают GIL на время тяжелых вычислений).
+    Кадры на выходе собираются строго в исходном порядке. Если задана функция `select`, модель запускается
+    только на отобранных кадрах, а остальные получают обнаружения последнего отобранного кадра.
+    """
+
+    def __init__(self,
+                 vidcap: cv2.VideoCapture,
+                 frame_read: bool,
+                 image: np.ndarray,
+                 detect: Callable[[list[np.ndarray]], list],
+                 consume: Callable[[int, np.ndarray, Any], NoReturn],
+                 batch_size: int = 1,
+                 queue_size: int = 32,
+                 select: Union[Callable[[int, np.ndarray], bool], None] = None,
+                 ):
+        """
+        :param vidcap: Открытое видео
+        :param frame_read: Удалось ли прочитать первый кадр
+        :param image: Первый кадр
+        :param detect: Функция инференса, принимает список кадров, возвращает список обнаружений для каждого кадра
+        :param consume: Функция, вызываемая для каждого кадра по порядку: (номер кадра, кадр, обнаружения).
+        Выполняется в потоке кодирования, поэтому в ней рисуются рамки и кадр записывается в видео
+        :param batch_size: Сколько кадров передается в модель за один прямой проход
+        :param queue_size: Размер каждой из очередей между стадиями (в кадрах)
+        :param select: Функция (номер кадра, кадр) -> нужно ли запускать модель на кадре, по умолчанию на каждом
+        """
+
+        self._vidcap = vidcap
+        self._frame_read = frame_read
+        self._image = image
+        self._detect = detect
+        self._consume = consume
+        self._batch_size = max(1, int(batch_size))
+        self._select = select
+
+        self._stop_event = threading.Event()
+        self._errors = []
+
+        queue_size = max(int(queue_size), self._batch_size)
+        self._decoded = BoundedQueue('decoded', queue_size, self._stop_event)
+        self._inferred = BoundedQueue('inferred', queue_size, self._stop_event)
+
+        self.stats = {name: StageStats(name) for name in ['decode', 'infer', 'encode']}
+
+    def _fail(self, e: BaseException) -> NoReturn:
+        """
+        :param e: Ошибка, возникшая в одной из стадий
+        :return: `NoReturn`
+        Останавливаем все стадии, ошибка будет выброшена в `run`
+        """
+
+        self._errors.append(e)
+        self._stop_event.set()
+
+    def _decode_stage(self) -> NoReturn:
+        stats = self.stats['decode']
+        frame_read, image, count = self._frame_read, self._image, 0
+
+        try:
+            while frame_read:
+                start = time.perf_counter()
+                is_inferred = self._select(count, image) if self._select else True
+                stats.busy += time.perf_counter() - start
+
+                if not self._decoded.put((count, image, is_inferred), stats):
+                    return
+
+                count += 1
+                start = time.perf_counter()
+                frame_read, image = self._vidcap.read()
+                stats.busy += time.perf_counter() - start
+                stats.items += 1
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._decoded.put(_END, stats)
+
+    def _infer_stage(self) -> NoReturn:
+        stats = self.stats['infer']
+        finished = False
+
+        while not finished and not self._stop_event.is_set():
+            item = self._decoded.get(stats)
+
+            if item is _END:
+                break
+
+            batch = [item]
+            inferred = int(item[2])
+
+            # Добираем пачку тем, что уже декодировано, не дожидаясь полного заполнения.
+            # Количество удерживаемых кадров ограничено размером очереди
+            while inferred < self._batch_size and len(batch) < self._decoded.maxsize:
+                item = self._decoded.get_nowait()
+
+                if item is None:
+                    break
+
+                if item is _END:
+                    finished = True
+                    break
+
+                batch.append(item)
+                inferred += int(item[2])
+
+            start = time.perf_counter()
+            detections = iter(self._detect([image for _, image, is_inferred in batch if is_inferred])
+                              if inferred else [])
+            stats.busy += time.perf_counter() - start
+            stats.items += inferred
+
+            for count, image, is_inferred in batch:
+                # `None` - обнаружения будут перенесены с предыдущего кадра в стадии кодирования
+                frame_detections = next(detections) if is_inferred else None
+
+                if not self._inferred.put((count, image, frame_detections), stats):
+                    return
+
+        self._inferred.put(_END, stats)
+
+    def _encode_stage(self) -> NoReturn:
+        stats = self.stats['encode']
+        reorder_buffer = []  # Куча (номер кадра, ...) для восстановления исходного порядка
+        next_count = 0
+        last_detections = []
+
+        try:
+            while True:
+                item = self._inferred.get(stats)
+
+                if item is _END:
+                    break
+
+                heapq.heappush(reorder_buffer, (item[0], id(item), item))
+
+                while reorder_buffer and reorder_buffer[0][0] == next_count:
+                    count, image, detections = heapq.heappop(reorder_buffer)[2]
+
+                    if detections is None:
+                        detections = last_detections
+                    else:
+                        last_detections = detections
+
+                    start = time.perf_counter()
+                    self._consume(count, image, detections)
+                    stats.busy += time.perf_counter() - start
+                    stats.items += 1
+
+                    next_count += 1
+        except Exception as e:
+            self._fail(e)
+
+    def run(self) -> dict:
+        """
+        :return: Статистика загрузки стадий и очередей, см. `FramePipeline.report`
+
+        Запускает конвейер и дожидается обработки всех кадров
+        """
+
+        start = time.perf_counter()
+
+        decoder = threading.Thread(target=self._decode_stage, name='pipeline-decode', daemon=True)
+        encoder = threading.Thread(target=self._encode_stage, name='pipeline-encode', daemon=True)
+        decoder.start()
+        encoder.start()
+
+        try:
+            self._infer_stage()
+        except Exception as e:
+            self._fail(e)
+
+        decoder.join()
+        encoder.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        report = self.report(time.perf_counter() - start)
+        console_logger.debug(f'Pipeline stats: {report}')
+
+        return report
+
+    def report(self, wall_time: float) -> dict:
+        """
+        :param wall_time: Общее время работы конвейера
+        :return: Загрузка каждой стадии, средняя заполненность очередей и самая загруженная стадия:
+        ```
+        {
+            "wall_time": 12.4,
+            "stages": {"decode": {"items": 300, "busy": 0.21, ...}, "infer": {...}, "encode": {...}},
+            "queues": {"decoded": 0.97, "inferred": 0.02},
+            "bottleneck": "infer"
+        }
+        ```
+        """
+
+        stages = {name: stats.json(wall_time) for name, stats in self.stats.items()}
+
+        return {
+            'wall_time': round(wall_time, 3),
+            'stages': stages,
+            'queues': {q.name: q.occupancy() for q in [self._decoded, self._inferred]},
+            'bottleneck': max(stages, key=lambda name: stages[name]['busy']),
+        }
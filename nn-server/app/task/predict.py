@@ -1,19 +1,26 @@
 try:
     from .preload_libs import *
+    from .render import render_video
 except ImportError:
     from preload_libs import *
+    from render import render_video
 
 
 class JobTracker:
-    def __init__(self, job: Job, num_files: int):
+    def __init__(self, job: Union[Job, None], num_files: int, on_progress: Union[Callable[[float], Any], None] = None):
         """
         :param job: `rq.Job`
         :param num_files: Количество обрабатываемых файлов
+        :param on_progress: Вызывается при обновлении прогресса (прогресс части задачи, см. `FanOut`)
         """
 
         self.job = job
         self.num_files = num_files
-        self._start_time = time.time()  # Запоминаем время начала задачи
+        self.on_progress = on_progress
+        # Записывает meta в Redis не чаще `PD_PROGRESS_INTERVAL` и публикует ее в канал задачи. Прогресс частей
+        # задачи (`FanOut`) не публикуется: общий прогресс публикует родительская задача
+        is_task = job is not None and 'task_id' in job.meta and 'parent_id' not in job.meta
+        self.publisher = ProgressPublisher(job, channel=Task.channel(job.meta['task_id']) if is_task else None)
 
     def set_num_files(self, num_files: int) -> NoReturn:
         self.num_files = num_files
@@ -23,35 +30,32 @@ class JobTracker:
         Обновляет meta данные прогресса, а также eta, которая от него зависит
         :param progress: Текущий прогресс обработки запроса
         :return: `NoReturn`
+
+        Вызывается на каждом кадре, но в Redis прогресс записывается с ограничением частоты (`ProgressPublisher`)
         """
 
-        self.set_meta(progress=progress)
-        self.calc_eta(progress=progress)
+        if self.on_progress is not None:
+            self.on_progress(progress)
 
-    def calc_eta(self, progress: float) -> NoReturn:
-        """
-        Функция рассчитывает оставшееся время обработки
-        :param progress: Текущий прогресс выполнения задачи
-        :return: `NoReturn`
-        """
+        # У нас нет задачи во время прямого тестирования predict.py
+        if os.getenv('TEST_PREDICT') == '1':
+            return
 
-        # Рассчитываем оставшееся время
-        elapsed_time = time.time() - self._start_time  # Время, прошедшее с начала обработки
-        if progress > 0:  # Избегаем деления на ноль
-            estimated_total_time = elapsed_time / (progress / 100)  # Оценка общего времени
-            eta = int(estimated_total_time - elapsed_time)  # Оставшееся время
-            console_logger.debug(f'eta={eta}')
-            self.set_meta(eta=eta)  # Обновляем метаданные с ETA
+        self.publisher.update(progress)
 
     def set_meta(self, **kwargs) -> NoReturn:
         """
         :param kwargs: Параметры для обновления meta в job
-        Возможные параметры: progress, eta, video_no, videos_no, stage
+        Возможные параметры: progress, eta, video_no, videos_no, stage, pipeline, frames_inferred, frames_reused,
+        preview, precision
 
         :return: `NoReturn`
+
+        Смена `stage` записывается сразу, остальные параметры - вместе со следующей записью прогресса
         """
 
-        params = ['progress', 'eta', 'video_no', 'videos_no', 'stage']
+        params = ['progress', 'eta', 'video_no', 'videos_no', 'stage', 'pipeline', 'frames_inferred', 'frames_reused',
+                  'preview', 'precision']
 
         # У нас нет задачи во время прямого тестирования predict.py
         if os.getenv('TEST_PREDICT') == '1':
@@ -59,12 +63,24 @@ class JobTracker:
 
         if self.job is not None:
             for key in kwargs:
-                if key in params:
-                    self.job.meta[key] = kwargs[key]
-                else:
+                if key not in params:
                     raise ValueError(f'Incorrect parameters, must be one of {params}')
 
-            self.job.save_meta()
+            self.publisher.set(**kwargs)
+
+    def start_task(self) -> NoReturn:
+        """
+        Устанавливает задаче статус run
+
+        :return: `NoReturn`
+        """
+
+        if os.getenv('TEST_PREDICT') == '1':
+            return
+
+        with app.app_context():
+            task = Task.find_by_id(self.job.meta['task_id'])
+            task.set_status('run')
 
     def finish_task(self,
                     output_files: Union[str, list, None] = None,
@@ -152,12 +168,29 @@ class VideoLoader:
 class VideoProcessor:
     """Класс для обработки видео и выполнения предсказаний."""
 
+    _EXECUTION_MODES = ['sequential', 'pipeline']
+    _RENDER_MODES = ['eager', 'lazy', 'idle']
+    _VIDEO_FORMATS = ['mp4', 'hls']
+
     def __init__(self,
                  files: List[str],
                  current_time_folders: List[str],
                  is_save_output: bool = True,
                  is_remove: bool = False,
                  sleep: int = 0,
+                 batch_size: int = 1,
+                 execution_mode: str = 'sequential',
+                 queue_size: int = 32,
+                 sample_stride: Union[int, None] = None,
+                 target_fps: Union[float, None] = None,
+                 frame_gate: Union[str, None] = None,
+                 gate_threshold: Union[float, None] = None,
+                 precision: str = 'fp32',
+                 render_mode: str = 'eager',
+                 top_k: int = 10,
+                 top_k_gap: float = 1.0,
+                 segment_seconds: Union[float, None] = None,
+                 video_format: str = 'mp4',
                  ):
         """
         :param files: Путь до видео, в котором будем искать болезни
@@ -165,6 +198,28 @@ class VideoProcessor:
         :param is_save_output: Сохранять ли видео с bbox и label болезней (если необходимо сохранить в облако, то сначала видео сохраняется локально, а затем загружается)
         :param is_remove: Удалять ли файл, по которому делали предсказание после предсказания
         :param sleep: Timeout (требуется только для теста)
+        :param batch_size: Сколько кадров передается в модель за один прямой проход
+        :param execution_mode: Режим выполнения: sequential - все этапы по очереди в одном потоке,
+        pipeline - декодирование, инференс и кодирование выполняются параллельно, см. `FramePipeline`
+        :param queue_size: Размер очередей между стадиями в режиме pipeline (в кадрах), ограничивает расход памяти.
+        В режиме sequential ограничивает количество кадров, накапливаемых до запуска модели
+        :param sample_stride: Модель запускается только на каждом `sample_stride` кадре, на пропущенные кадры
+        переносятся последние обнаружения, поэтому `num_detected` остается сопоставимым с обработкой всех кадров
+        :param target_fps: Сколько кадров в секунду обрабатывать моделью, шаг выборки вычисляется из fps видео
+        (игнорируется, если указан `sample_stride`)
+        :param frame_gate: Детектор изменений кадра перед запуском модели: diff - разница уменьшенных серых кадров,
+        phash - перцептивный хэш. Если кадр почти не изменился, переиспользуются обнаружения предыдущего кадра
+        :param gate_threshold: Порог изменения кадра (0..1) для `frame_gate`
+        :param precision: Точность модели: fp32 или int8 (квантованная модель, собирается `python -m task.quantize`)
+        :param render_mode: Когда отрисовывать видео с bbox (при `is_save_output`): eager - во время обработки,
+        lazy - при первом запросе видео (`RenderApi`), idle - в очереди `pd-render`, когда воркеры свободны.
+        Обнаружения всех кадров в любом случае сохраняются в `{n}_detections.npz`, по ним видео и отрисовывается
+        :param top_k: Сколько кадров с наибольшим количеством обнаружений сохранять (`source_of_infection`)
+        :param top_k_gap: Минимальное расстояние между сохраняемыми кадрами в секундах
+        :param segment_seconds: Видео длиннее `segment_seconds` делятся на сегменты, которые обрабатываются
+        параллельно на свободных воркерах, см. `process_segmented_video`. None - видео обрабатывается целиком
+        :param video_format: Формат видео с bbox при `render_mode` eager: mp4 или hls - плейлист с сегментами,
+        которые загружаются по мере обработки, поэтому видео можно смотреть до конца обработки (`HlsVideoWriter`)
         :return: `NoReturn`
 
         Используем для распознавания одного видео
@@ -186,11 +241,24 @@ class VideoProcessor:
                 "car": 1904,
                 "truck": 43
             },
+            "sample_stride": 1,
+            "precision": "fp32",
+            "frames_inferred": 1947,
+            "frames_reused": 0,
+            "detections": "S3/user_id/dd_mm_yy/time/0_detections.npz",
+            "timeline": "S3/user_id/dd_mm_yy/time/0_timeline.npy",
+            "timeline_classes": ["car", "truck"],
+            "render": "done",
+            "source": "test-videos/cars_test.mp4",
             "src": "https://downloader.disk.yandex.ru/disk/6d9e64e4ecd0511461c58cce5629c9905bbe7fffea723d53eacab41c6b4d842a/666dab6a/D8imih97WPavWgl8sJjnJNdJITA73Za1vuyl69h9XhzwtSoGS6t6HMlWb0KK1WRorD5Ek9MXhqvm2RKSlq2Fgg%3D%3D?uid=0&filename=cars.mp4&disposition=attachment&hash=KUQT1FlKV9L/1kZ%2BIMkY3s6AOjfsdCWiKeB8R3tfNfWfp2PtQWAosG/ljurs2k5nq/J6bpmRyOJonT3VoXnDag%3D%3D%3A&limit=0&content_type=video%2Fmp4&owner_uid=338375491&fsize=2618301&hid=3677194f6b9c093d7cd8a9e5fcee7247&media_type=video&tknv=v2",
             "dst": "C:\\Users\\pikro\\Kallosus\\NN server\\DATA\\output\\1\\15_06_24\\1718448777.6166196\\0_dst.avi"
         }
         ```
         """
+        # Параметры обработки, с которыми видео и сегменты обрабатываются в дочерних задачах (см. `FanOut`)
+        self.options = {key: value for key, value in locals().items()
+                        if key not in ['self', 'files', 'current_time_folders']}
+
         self.len_files = len(files)
 
         self.job = get_current_job()
@@ -201,13 +269,61 @@ class VideoProcessor:
         self.is_save_output = is_save_output
         self.is_remove = is_remove
         self.sleep = sleep
+        self.batch_size = max(1, int(batch_size))
+        self.queue_size = queue_size
+
+        if execution_mode not in self._EXECUTION_MODES:
+            raise ValueError(f'execution_mode must be one of {self._EXECUTION_MODES}')
+
+        self.execution_mode = execution_mode
+        self.sample_stride = sample_stride
+        self.target_fps = target_fps
+        self.frame_gate = frame_gate
+        self.gate_threshold = gate_threshold
+
+        if render_mode not in self._RENDER_MODES:
+            raise ValueError(f'render_mode must be one of {self._RENDER_MODES}')
+
+        self.render_mode = render_mode
+
+        if video_format not in self._VIDEO_FORMATS:
+            raise ValueError(f'video_format must be one of {self._VIDEO_FORMATS}')
+
+        self.video_format = video_format
+        self.recorder: Union[DetectionsRecorder, None] = None
+        self.predictor = get_predictor(precision)
+
+        # Если модель нужной точности не загрузилась (например, INT8 модель не собрана), используется FP32
+        self.precision = self.predictor.precision
+        self.job_tracker.set_meta(precision=self.precision)
+
+        if self.precision != precision:
+            console_logger.warning(f'`{precision}` model is not available, using `{self.precision}`')
+
+        self.frame_selector = FrameSelector()
+        # Кадры отбираются раньше, чем учитываются в `handle_frame` (пачки, `FramePipeline`), поэтому счетчики
+        # `frame_selector` запоминаются после отбора каждого кадра, а в чекпоинт попадают счетчики учтенного кадра
+        self.selector_snapshots = deque()
+        self.handled_selector_stats = self.frame_selector.json()
+        self.frames_inferred = 0  # Сколько кадров всех видео прошло через модель
+        self.frames_reused = 0  # Для скольких кадров всех видео переиспользованы обнаружения
         self.progress = 0  # Текущий прогресс
         self._progress = 0  # Накапливает прогресс
 
         self.res_json_files = []  # Список файлов json
         self.is_files_upload = {}  # Сохраняем сюда информацию о том, загружены ли все необходимые файлы
+        self.uploads: List[tuple[str, str, Future]] = []  # Фоновые загрузки (видео, ключ `is_files_upload`, Future)
         self.data = {}  # Данные для хранения предсказаний
-        self.max_detected = {}  # Хранит ключ - количество определенных объектов, в значении кол-во определенных классов, само изображение `np`, классы, time code
+        self.top_frames = TopKFrames(k=top_k, min_gap=top_k_gap)  # Кадры с максимальным количеством обнаружений
+        self.segment_seconds = segment_seconds
+        self.frame_offset = 0  # Номер первого кадра обрабатываемого сегмента видео (или кадра, с которого продолжаем)
+        self.resumed_frames = 0  # Сколько кадров текущего видео обработано до продолжения с чекпоинта
+        self.current_vid_no = 0
+        self.preview = ''  # Плейлист HLS обрабатываемого видео, опубликованный в meta (`HlsVideoWriter`)
+
+        # Дочерние задачи (части задачи) не сохраняют чекпоинт, их просто запускает заново `JobReaper`
+        is_checkpointed = self.job is not None and 'task_id' in self.job.meta and 'parent_id' not in self.job.meta
+        self.checkpoint = Checkpoint(self.job.meta['task_id'], app.redis) if is_checkpointed else None
 
         self.storage = Storage.get_storage()
 
@@ -225,24 +341,36 @@ class VideoProcessor:
         :return `NoReturn`
         """
 
-        if os.getenv('TEST_PREDICT') != '1':
-            with app.app_context():
-                task = Task.find_by_id(self.job.meta['task_id'])
-                task.set_status('run')
+        self.job_tracker.start_task()
+
+        # Задача могла быть прервана падением воркера, тогда продолжаем с последнего чекпоинта
+        resume = self.checkpoint.load() if self.checkpoint is not None else None
+        first_vid_no = 0
+
+        if resume is not None:
+            first_vid_no = resume['video_no']
+            self.res_json_files = resume['res_json_files']
+            self.is_files_upload = resume['is_files_upload']
+            self.frames_inferred = resume['frames_inferred']
+            self.frames_reused = resume['frames_reused']
+            console_logger.info(f'Resume task from video {first_vid_no}, frame {resume["next_frame"]}')
 
         try:
             self.job_tracker.update_progress(0)
 
             # Обрабатываем видео по 1
             for i, path in enumerate(self.files):
+                if i < first_vid_no:
+                    continue
+
                 self.job_tracker.set_meta(video_no=i + 1, videos_no=self.len_files, stage='video-processing')
 
-                self.process_single_video(current_vid_no=i,
-                                          path=path,
-                                          )
+                self.process_video(current_vid_no=i, path=path, resume=resume if i == first_vid_no else None)
 
                 self._progress += self.progress
+                self.save_checkpoint(video_no=i + 1, next_frame=0)
 
+            self.collect_uploads()
             self.job_tracker.finish_task(output_files=self.res_json_files, is_files_upload=self.is_files_upload)
             console_logger.debug(f'Is all files upload to S3 {self.is_files_upload}')
             console_logger.debug('Task completed')
@@ -252,60 +380,500 @@ class VideoProcessor:
         except InternalServerError as e:
             get_traceback.critical(f'{e}', print_full_exception=True)
             self.job_tracker.finish_task(error=True)
+        finally:
+            if self.checkpoint is not None:
+                self.checkpoint.clear()
+
+    def save_checkpoint(self, video_no: int, next_frame: int) -> NoReturn:
+        """
+        :param video_no: Номер видео, с которого продолжать задачу
+        :param next_frame: Номер кадра видео `video_no`, с которого продолжать, 0 - видео не начато
+        :return: `NoReturn`
+        """
+
+        if self.checkpoint is None:
+            return
+
+        # Чекпоинт не должен отмечать видео обработанным, пока его файлы загружаются: после падения воркера они
+        # были бы потеряны. Поэтому на границе видео чекпоинт пропускается, а во время обработки следующего видео
+        # загрузки (к этому времени обычно уже завершенные) дожидаются
+        if not self.collect_uploads(wait=bool(next_frame)):
+            return console_logger.debug(f'Checkpoint skipped: video {video_no} files are uploading')
+
+        state = {
+            'video_no': video_no,
+            'next_frame': next_frame,
+            'res_json_files': self.res_json_files,
+            'is_files_upload': self.is_files_upload,
+            'frames_inferred': self.frames_inferred,
+            'frames_reused': self.frames_reused,
+        }
+
+        if not next_frame:
+            return self.checkpoint.save(state)
+
+        state.update({
+            'detected': list(self.data['detected']),
+            'num_detected': self.data['num_detected'],
+            'video_frames_inferred': self.handled_selector_stats['frames_inferred'],
+            'video_frames_reused': self.handled_selector_stats['frames_reused'],
+        })
+
+        self.checkpoint.save(state, self.recorder, self.top_frames)
+        console_logger.debug(f'Checkpoint saved: video {video_no}, frame {next_frame}')
+
+    def restore_checkpoint(self, resume: dict) -> NoReturn:
+        """
+        :param resume: Чекпоинт (`Checkpoint.load`), сохраненный во время обработки текущего видео
+        :return: `NoReturn`
+        """
+
+        self.frame_offset = self.resumed_frames = resume['next_frame']
+        self.data['detected'].update(resume['detected'])
+        self.data['num_detected'] = resume['num_detected']
+        self.frame_selector.frames_inferred = resume['video_frames_inferred']
+        self.frame_selector.frames_reused = resume['video_frames_reused']
+
+        if resume['detections'] is not None:
+            self.recorder.extend(resume['detections'])
+
+        for time_code, labels, image in resume['top_frames']:
+            self.top_frames.offer_encoded(len(labels), image, labels, time_code)
+
+    def process_videos_parallel(self) -> NoReturn:
+        """
+        Обрабатывает видео задачи параллельно на нескольких воркерах.
+
+        Для каждого видео ставится дочерняя задача в `pd-task`, а текущая задача сама обрабатывает видео, которые еще
+        никто не взял (см. `FanOut`), поэтому при одном воркере видео обрабатываются по очереди, как в `process_videos`.
+        Когда все видео обработаны, результаты объединяются в порядке `files`, а задача завершается.
+
+        :return `NoReturn`
+        """
+
+        if self.job is None or self.len_files == 1:
+            return self.process_videos()
+
+        self.job_tracker.start_task()
+        fan_out = FanOut(self.job.get_id(), self.len_files, app.redis)
+        local_progress = {}  # Прогресс видео, обрабатываемых текущей задачей
+        last_update = 0
+
+        def update_progress(force: bool = False) -> NoReturn:
+            nonlocal last_update
+
+            # Прогресс дочерних задач читается из Redis, поэтому обновляем не чаще раза в секунду
+            if force or time.time() - last_update >= 1:
+                last_update = time.time()
+                self.job_tracker.update_progress(min(99.0, fan_out.progress(local_progress)))
+
+        def on_part_progress(video_no: int, progress: float) -> NoReturn:
+            local_progress[video_no] = progress
+            update_progress()
+
+        try:
+            self.job_tracker.update_progress(0)
+            self.job_tracker.set_meta(videos_no=self.len_files, stage='video-processing', pipeline='fan-out')
+            fan_out.enqueue(app.task_queue, 'task.predict.predict_video_part', {'task_id': self.job.meta['task_id']},
+                            self.files, self.current_time_folders, **self.options)
+
+            while (video_no := fan_out.claim_next(self.job.get_id())) is not None:
+                part = VideoProcessor(self.files, self.current_time_folders, **self.options)
+                result = part.process_part(video_no, on_progress=lambda p, i=video_no: on_part_progress(i, p))
+                fan_out.set_result(video_no, result)
+                local_progress.pop(video_no)
+                update_progress(force=True)
+
+            results = fan_out.wait(update_progress)
+
+            for video_no, path in enumerate(self.files):
+                result = results[video_no]
+
+                if result.get('error'):
+                    console_logger.error(f'Video {path} was not processed by child job')
+                    self.is_files_upload[path] = [{'res-file': False}]
+                    continue
+
+                self.res_json_files.extend(result['res_json_files'])
+                self.is_files_upload.update(result['is_files_upload'])
+                self.frames_inferred += result['frames_inferred']
+                self.frames_reused += result['frames_reused']
+
+            self.job_tracker.set_meta(video_no=self.len_files,
+                                      frames_inferred=self.frames_inferred,
+                                      frames_reused=self.frames_reused,
+                                      )
+            self.job_tracker.finish_task(output_files=self.res_json_files, is_files_upload=self.is_files_upload)
+            console_logger.debug(f'Is all files upload to S3 {self.is_files_upload}')
+            console_logger.debug('Task completed')
+        except FileNotFoundError as e:
+            get_traceback.error(f'{e} - Perhaps you need to run `CreateFoldersApi` first')
+            self.job_tracker.finish_task(error=True)
+        except InternalServerError as e:
+            get_traceback.critical(f'{e}', print_full_exception=True)
+            self.job_tracker.finish_task(error=True)
+        finally:
+            fan_out.cleanup()
+
+    def track_part(self, on_progress: Union[Callable[[float], Any], None] = None) -> NoReturn:
+        """
+        Прогресс считается для одной части задачи (видео или сегмента видео), а не для всей задачи
+
+        :param on_progress: Куда сообщать прогресс части (0-100), если не указано - в meta текущей задачи
+        :return: `NoReturn`
+        """
+
+        self.len_files = 1
+        self.checkpoint = None
+
+        if on_progress is not None:
+            self.job_tracker = JobTracker(None, 1, on_progress)
+        else:
+            self.job_tracker.set_num_files(1)
+
+    def process_video(self, current_vid_no: int, path: str, resume: Union[dict, None] = None) -> NoReturn:
+        """
+        Обрабатывает одно видео целиком или по сегментам, если задан `segment_seconds`.
+        :param current_vid_no: Номер текущего видео начиная с 0
+        :param path: Расположение видео (путь/url)
+        :param resume: Чекпоинт, с которого продолжать видео (при обработке по сегментам не нужен: уже обработанные
+        сегменты хранятся в `FanOut`)
+
+        :return `NoReturn`
+        """
+
+        if self.segment_seconds and self.job is not None:
+            self.process_segmented_video(current_vid_no, path)
+        else:
+            self.process_single_video(current_vid_no, path, resume)
+
+    def process_part(self, video_no: int, on_progress: Union[Callable[[float], Any], None] = None) -> dict:
+        """
+        Обрабатывает одно видео задачи как отдельную часть (см. `process_videos_parallel`).
+
+        :param video_no: Номер видео в `files`
+        :param on_progress: Куда сообщать прогресс видео (0-100), если не указано - в meta текущей задачи
+        :return: Результат обработки видео, объединяемый родительской задачей
+        """
+
+        self.track_part(on_progress)
+
+        self.process_video(current_vid_no=video_no, path=self.files[video_no])
+        self.collect_uploads()
+
+        return {
+            'res_json_files': self.res_json_files,
+            'is_files_upload': self.is_files_upload,
+            'frames_inferred': self.frames_inferred,
+            'frames_reused': self.frames_reused,
+        }
+
+    def process_segmented_video(self, current_vid_no: int, path: str) -> NoReturn:
+        """
+        Обрабатывает длинное видео по сегментам на нескольких воркерах (map-reduce).
+
+        Видео делится на сегменты по `segment_seconds`, для каждого сегмента ставится дочерняя задача в `pd-task`,
+        текущая задача сама обрабатывает еще не взятые сегменты (см. `FanOut`). Сегменты только ищут болезни
+        (`process_segment`), а результаты объединяются здесь: `num_detected`, `detected`, обнаружения всех кадров
+        и K лучших кадров из кадров, отобранных сегментами. Видео с bbox отрисовывается по объединенным
+        обнаружениям (`render_video`) согласно `render_mode`.
+        :param current_vid_no: Номер текущего видео начиная с 0
+        :param path: Расположение видео (путь/url)
+
+        :return `NoReturn`
+        """
+
+        url = self.get_video_url(path)
+        vidcap, _, _, length, fps, width, height = VideoLoader.read_video(url)
+        vidcap.release()
+
+        segments = split_segments(length, fps, self.segment_seconds)
+
+        if len(segments) == 1:
+            return self.process_single_video(current_vid_no, path)
+
+        # Последний сегмент читается до конца видео, т.к. `CAP_PROP_FRAME_COUNT` может быть неточным
+        segments[-1][1] = None
+
+        self.is_files_upload[path] = []
+        current_time_folder, dst_folder = self.get_folders(current_vid_no)
+        fan_out = FanOut(f'{self.job.get_id()}:{current_vid_no}', len(segments), app.redis)
+        local_progress = {}  # Прогресс сегментов, обрабатываемых текущей задачей
+        last_update = 0
+
+        def update_progress(force: bool = False) -> NoReturn:
+            nonlocal last_update
+
+            if force or time.time() - last_update >= 1:
+                last_update = time.time()
+                progress = fan_out.progress(local_progress) * PROGRESS_NN_PERCENT / 100 / self.len_files
+                self.job_tracker.update_progress(progress + self._progress)
+
+        def on_segment_progress(segment_no: int, progress: float) -> NoReturn:
+            local_progress[segment_no] = progress
+            update_progress()
+
+        try:
+            self.job_tracker.set_meta(stage='video-processing')
+            console_logger.debug(f'Process {url} by {len(segments)} segments')
+            fan_out.enqueue(app.task_queue, 'task.predict.predict_video_segment', {'task_id': self.job.meta['task_id']},
+                            self.files, self.current_time_folders, current_vid_no, segments, **self.options)
+
+            while (segment_no := fan_out.claim_next(self.job.get_id())) is not None:
+                part = VideoProcessor(self.files, self.current_time_folders, **self.options)
+                start, end = segments[segment_no]
+                result = part.process_segment(current_vid_no, start, end,
+                                              on_progress=lambda p, i=segment_no: on_segment_progress(i, p))
+                fan_out.set_result(segment_no, result)
+                local_progress.pop(segment_no)
+                update_progress(force=True)
+
+            results = fan_out.wait(update_progress)
+        finally:
+            fan_out.cleanup()
+
+        if any(result.get('error') for result in results.values()):
+            raise InternalServerError(f'Not all segments of {path} were processed')
+
+        self.job_tracker.set_meta(stage='segments-merging')
+        self.data = self.initialize_data(url, '')
+        self.data['source'] = path
+        self.data['sample_stride'] = results[0]['sample_stride']
+        self.recorder = DetectionsRecorder(fps, width, height, self.predictor.class_names_dict)
+        self.top_frames.clear()
+        temporary_files = []  # Файлы сегментов, которые не войдут в результат
+        is_images_upload = {}  # Загружено ли изображение сегмента
+
+        for segment_no in range(len(segments)):
+            result = results[segment_no]
+
+            self.data['detected'].update(result['detected'])
+            for c, num in result['num_detected'].items():
+                self.data['num_detected'][c] = self.data['num_detected'].get(c, 0) + num
+
+            self.recorder.extend(load_detections(Storage.read_bytes(result['detections'])))
+            temporary_files.append(result['detections'])
+
+            for time_code, labels, img_path, is_image_upload in result['top_frames']:
+                self.top_frames.offer_encoded(len(labels), img_path, labels, time_code)
+                is_images_upload[img_path] = is_image_upload
+                temporary_files.append(img_path)
+
+        self.data['frames_inferred'] = sum(result['frames_inferred'] for result in results.values())
+        self.data['frames_reused'] = sum(result['frames_reused'] for result in results.values())
+        self.frames_inferred += self.data['frames_inferred']
+        self.frames_reused += self.data['frames_reused']
+        self.job_tracker.set_meta(frames_inferred=self.frames_inferred, frames_reused=self.frames_reused)
+
+        self.upload_detections(dst_folder, current_time_folder, current_vid_no, path)
+
+        if self.is_save_output:
+            for i, (time_code, _, img_path) in enumerate(self.top_frames.items()):
+                self.data['source_of_infection'].append([img_path, time_code])
+                self.is_files_upload[path].append({f'image_{i + 1}': is_images_upload[img_path]})
+                temporary_files.remove(img_path)
+
+            self.data['render'] = 'pending'
+
+        Storage.rm_file(temporary_files)
+
+        if self.is_remove:
+            os.remove(path)
+            console_logger.debug(f'{path} removed')
+
+        self.data['detected'] = list(self.data['detected'])
+        info = self.upload_info(current_time_folder, path)
+
+        if self.is_save_output and os.getenv('TEST_PREDICT') != '1':
+            info.result()  # Отрисовка читает json видео
+
+            if self.render_mode == 'eager':
+                # Склеить сегменты с bbox без перекодирования нельзя, поэтому видео отрисовывается сразу целиком
+                self.job_tracker.set_meta(stage='video-loading')
+                self.is_files_upload[path].append({'video': bool(render_video(self.res_json_files[-1]))})
+            elif self.render_mode == 'idle':
+                with app.app_context():
+                    Task.launch_render(self.res_json_files[-1])
+
+    def process_segment(self,
+                        video_no: int,
+                        start: int,
+                        end: Union[int, None],
+                        on_progress: Union[Callable[[float], Any], None] = None,
+                        ) -> dict:
+        """
+        Ищет болезни на кадрах [start, end) видео (часть `process_segmented_video`).
+
+        Видео с bbox не кодируется: оно отрисовывается после объединения сегментов. Обнаружения сегмента
+        и его K лучших кадров сохраняются в хранилище и объединяются родительской задачей.
+        :param video_no: Номер видео в `files`
+        :param start: Первый кадр сегмента
+        :param end: Кадр после последнего кадра сегмента, None - до конца видео
+        :param on_progress: Куда сообщать прогресс сегмента (0-100), если не указано - в meta текущей задачи
+        :return: Результат обработки сегмента
+        """
+
+        self.track_part(on_progress)
+        self.render_mode = 'lazy'  # bbox рисуются только на кадрах, отобранных в K лучших
+        self.frame_offset = start
+
+        path = self.files[video_no]
+        current_time_folder, dst_folder = self.get_folders(video_no)
+        vidcap, _, _, length, fps, width, height = VideoLoader.read_video(self.get_video_url(path))
+        vidcap, frame_read, image = open_segment(vidcap, start, end)
+
+        self.data = self.initialize_data(path, '')
+        self.recorder = DetectionsRecorder(fps, width, height, self.predictor.class_names_dict)
+        self.frame_selector = FrameSelector.from_options(fps, self.sample_stride, self.target_fps,
+                                                         self.frame_gate, self.gate_threshold)
+        self.data['sample_stride'] = self.frame_selector.sample_stride
+        self.data['precision'] = self.precision
+        segment_length = max(1, (length if end is None else end) - start)
+
+        console_logger.debug(f'Start segment [{start}, {end}) of {path}...')
+        if self.execution_mode == 'pipeline':
+            self.detect_frames_pipelined(vidcap, frame_read, image, segment_length, fps, None)
+        else:
+            self.detect_frames(vidcap, frame_read, image, segment_length, fps, None)
+
+        vidcap.release()
+        self.update_selector_stats()
+
+        detections = self.recorder.save(os.path.join(dst_folder, f'{video_no}_detections_{start}.npz'))
+
+        if self.storage == 's3':
+            remote_detections = Storage.path_join(current_time_folder, os.path.basename(detections))
+
+            if not Storage.upload_large_file(src=detections, dst=remote_detections):
+                raise InternalServerError(f'{detections} is not uploaded to {remote_detections}')
+
+            os.remove(detections)
+            detections = remote_detections
+
+        top_frames = []
+        if self.is_save_output:
+            for i, (time_code, labels, image) in enumerate(self.top_frames.items()):
+                img_path = Storage.path_join(current_time_folder,
+                                             f'max_{start}_{i}_{time.time()}{self.top_frames.image_format}')
+
+                try:
+                    is_image_upload = Storage.write_bytes(img_path, image)
+                except Exception as e:
+                    get_traceback.error(f'{img_path} is not uploaded: {e}')
+                    is_image_upload = False
+
+                top_frames.append([time_code, labels, img_path, is_image_upload])
+
+        return {
+            'detected': list(self.data['detected']),
+            'num_detected': self.data['num_detected'],
+            'sample_stride': self.data['sample_stride'],
+            'frames_inferred': self.data['frames_inferred'],
+            'frames_reused': self.data['frames_reused'],
+            'detections': detections,
+            'top_frames': top_frames,
+        }
 
     def process_single_video(self,
                              current_vid_no: int,
                              path: str,
+                             resume: Union[dict, None] = None,
                              ) -> NoReturn:
         """
         Обрабатывает одно видео, делая предсказания и сохраняя результаты.
         :param current_vid_no: Номер текущего видео начиная с 0
         :param path: Расположение видео (путь/url)
+        :param resume: Чекпоинт, с которого продолжать видео после падения воркера
 
         :return `NoReturn`
         """
 
         self.is_files_upload[path] = []
+        self.top_frames.clear()
+        self.current_vid_no = current_vid_no
+        self.frame_offset = self.resumed_frames = 0
+        is_resumed = resume is not None and resume['next_frame'] > 0
+        render_mode = self.render_mode
 
         # Чтение видео
         url = self.get_video_url(path)
         console_logger.debug(f'Process: {url}')
         vidcap, frame_read, image, length, fps, width, height = VideoLoader.read_video(url)
 
-        # При сохранении локально преобразовывать пути к S3 типу не нужно
-        if self.storage == 'local':
-            current_time_folder = self.current_time_folders[current_vid_no]
-            dst_folder = current_time_folder
-        else:
-            current_time_folder = StorageApi.win_to_linux_path(self.current_time_folders[current_vid_no])
-            dst_folder = tmp_video_path
+        if is_resumed:
+            vidcap, frame_read, image = open_segment(vidcap, resume['next_frame'], None)
+
+            # Частично записанное видео с bbox не восстановить, поэтому видео отрисуем по обнаружениям после обработки
+            if self.render_mode == 'eager':
+                self.render_mode = 'lazy'
 
+        current_time_folder, dst_folder = self.get_folders(current_vid_no)
         console_logger.debug(f'Current time_folder: {current_time_folder}, dst_folder: {dst_folder}')
 
-        # Инициализация сохранения выходного видео
-        if self.is_save_output:
+        # Инициализация сохранения выходного видео (при отложенной отрисовке видео кодируется отдельной задачей)
+        if self.is_save_output and self.render_mode == 'eager':
             dst_vid_name = f'{current_vid_no}_dst.mp4'
-            dst = os.path.join(dst_folder, dst_vid_name)
-            # Установите функцию записи выходного видео с помощью кодека
-            fourcc = cv2.VideoWriter_fourcc(*'avc1')
-            out = cv2.VideoWriter(dst, fourcc, fps, (width, height))
+
+            if self.video_format == 'hls' and not HlsVideoWriter.is_available():
+                console_logger.warning('ffmpeg is not installed, video will be saved as mp4 instead of hls')
+
+            if self.video_format == 'hls' and HlsVideoWriter.is_available():
+                # Сегменты видео загружаются по мере обработки, плейлист можно смотреть сразу (`PreviewApi`)
+                out = HlsVideoWriter(Storage, current_time_folder, f'{current_vid_no}_dst', fps, width, height)
+                dst = out.playlist
+            elif self.storage == 's3' and StreamVideoWriter.is_available():
+                # Видео загружается в хранилище по частям во время обработки, без временного файла
+                dst = Storage.path_join(current_time_folder, dst_vid_name)
+                out = StreamVideoWriter(Storage.open_stream(dst), fps, width, height)
+            else:
+                dst = os.path.join(dst_folder, dst_vid_name)
+                # Установите функцию записи выходного видео с помощью кодека
+                fourcc = cv2.VideoWriter_fourcc(*'avc1')
+                out = cv2.VideoWriter(dst, fourcc, fps, (width, height))
         else:
             dst = ''
             out = ''
 
         # Инициализируем данные для хранения предсказаний
         self.data = self.initialize_data(url, dst)
+        self.data['source'] = path
+        self.recorder = DetectionsRecorder(fps, width, height, self.predictor.class_names_dict)
+
+        # Определяем, на каких кадрах запускать модель
+        self.frame_selector = FrameSelector.from_options(fps, self.sample_stride, self.target_fps,
+                                                         self.frame_gate, self.gate_threshold)
+        self.data['sample_stride'] = self.frame_selector.sample_stride
+        self.data['precision'] = self.precision
+
+        if is_resumed:
+            self.restore_checkpoint(resume)
 
         # Начинаем поиск болезней на видео
         console_logger.debug(f'Start, write to dst={dst}...')
-        self.detect_frames(vidcap, frame_read, image, length, fps, out)
+        if self.execution_mode == 'pipeline':
+            self.detect_frames_pipelined(vidcap, frame_read, image, length, fps, out)
+        else:
+            self.detect_frames(vidcap, frame_read, image, length, fps, out)
+
+        self.update_selector_stats()
+        self.upload_detections(dst_folder, current_time_folder, current_vid_no, path)
 
         # Сохраняем обработанное видео
         if self.is_save_output:
-            out.release()
-            console_logger.debug('Resources released')
+            if self.render_mode == 'eager':
+                if isinstance(out, (StreamVideoWriter, HlsVideoWriter)):
+                    self.job_tracker.set_meta(stage='video-loading')
+                    self.is_files_upload[path].append({'video': out.release()})
+                else:
+                    out.release()
+                    console_logger.debug('Resources released')
+
+                    self.upload_video(dst, current_time_folder, path)
+
+                self.data['render'] = 'done'
+            else:
+                self.data['render'] = 'pending'
 
-            self.upload_video(dst, current_time_folder, path)
             self.upload_images(current_time_folder, path)
 
         # Удаляем обрабатываемое видео
@@ -316,7 +884,33 @@ class VideoProcessor:
         self.data['detected'] = list(self.data['detected'])  # Преобразуем в список, иначе не сможем сохранить в бд
 
         # Загружаем json файл с информацией о видео
-        self.upload_info(current_time_folder, path)
+        info = self.upload_info(current_time_folder, path)
+
+        if self.is_save_output and os.getenv('TEST_PREDICT') != '1' and (
+                render_mode != self.render_mode or self.render_mode == 'idle'):
+            info.result()  # Отрисовка читает json видео
+
+            if render_mode != self.render_mode:
+                self.job_tracker.set_meta(stage='video-loading')
+                self.is_files_upload[path].append({'video': bool(render_video(self.res_json_files[-1]))})
+            elif self.render_mode == 'idle':
+                with app.app_context():
+                    Task.launch_render(self.res_json_files[-1])
+
+        self.render_mode = render_mode
+
+    def get_folders(self, current_vid_no: int) -> tuple[str, str]:
+        """
+        :param current_vid_no: Номер текущего видео начиная с 0
+        :return: Папка в хранилище, куда сохраняются результаты видео, и локальная папка для файлов перед загрузкой
+        """
+
+        # При сохранении локально преобразовывать пути к S3 типу не нужно
+        if self.storage == 'local':
+            current_time_folder = self.current_time_folders[current_vid_no]
+            return current_time_folder, current_time_folder
+
+        return StorageApi.win_to_linux_path(self.current_time_folders[current_vid_no]), tmp_video_path
 
     def get_video_url(self, path: str) -> str:
         """
@@ -361,7 +955,7 @@ class VideoProcessor:
                       image: ndarray,
                       length: int,
                       fps: float,
-                      out: Union[cv2.VideoWriter, None],
+                      out: Union[cv2.VideoWriter, StreamVideoWriter, HlsVideoWriter, None],
                       ) -> NoReturn:
         """Обработка фреймов видео и выполнение предсказаний.
         :param vidcap: Объект cv2.VideoCapture для захвата видео, позволяющий считывать кадры видеофайла.
@@ -374,61 +968,203 @@ class VideoProcessor:
         :return: `NoReturn`
         """
 
+        self.start_selection()
+
         count = 0  # Текущий кадр
+        read_count = 0  # Сколько кадров прочитано
+        frames = []  # Кадры, накопленные для пакетного предсказания, и нужно ли запускать на них модель
+        inferred = 0  # Сколько из накопленных кадров пойдет в модель
+        last_detections = []  # Обнаружения последнего кадра, прошедшего через модель
 
-        # Перебираем кадры и передаем каждый для прогнозирования
+        # Перебираем кадры и передаем их для прогнозирования пачками по `self.batch_size`
         while frame_read:
-            # Выполняем обнаружение объекта
-            output_file, _, labels = PREDICTOR.predict(image)
+            is_inferred = self.select_frame(read_count, image)
+            frames.append((image, is_inferred))
+            inferred += is_inferred
 
-            if labels:
-                self.data['detected'].update(labels)
+            # Читаем следующий кадр
+            frame_read, image = vidcap.read()
+            read_count += 1
 
-                # Считаем сколько каждых классов обнаружено
-                for c in labels:
-                    self.data['num_detected'][c] = self.data['num_detected'].get(c, 0) + 1
+            if inferred < self.batch_size and len(frames) < max(self.batch_size, self.queue_size) and frame_read:
+                continue
 
-                if (count + 1) % 2 != 0:  # Каждый нечетный кадр проверяем (через 1)
-                    self.update_max_detected(labels, output_file, count / fps)
+            # Выполняем обнаружение объектов сразу на всей пачке кадров
+            detections = iter(self.predictor.detect([frame for frame, is_inferred in frames if is_inferred]))
 
-                console_logger.debug(
-                    f'№{count + 1}/{length}: Target classes: {labels}, progress: {round(self.progress, 2)}%')
+            for frame, is_inferred in frames:
+                # На пропущенные кадры переносим обнаружения последнего обработанного моделью кадра
+                if is_inferred:
+                    last_detections = next(detections)
 
-            # Записываем кадр с предсказаниями в видео
-            if self.is_save_output:
-                out.write(output_file)
+                self.handled_selector_stats = self.selector_snapshots.popleft()
+                self.handle_frame(count, length, fps, frame, last_detections, out)
+                count += 1
 
-            # Читаем следующий кадр
-            frame_read, image = vidcap.read()
-            count += 1
-
-            progress = (count / length) * PROGRESS_NN_PERCENT / self.len_files + self._progress
-            self.job_tracker.update_progress(progress)
-
-            if self.sleep > 0:
-                time.sleep(self.sleep)
+            frames = []
+            inferred = 0
 
         self.progress = int(self.progress)  # Делаем 80% для обработки NN
         console_logger.debug(f'Кадров прочитано: {count}, progress={self.progress}')
 
-    def update_max_detected(self, labels: list, output_file: ndarray, time_code: float):
-        """Обновление словаря максимальных предсказаний.
-        :params labels:
-        :params output_file:
-        :params time_code:
+    def detect_frames_pipelined(self,
+                                vidcap: cv2.VideoCapture,
+                                frame_read: ndarray | ndarray | Any,
+                                image: ndarray,
+                                length: int,
+                                fps: float,
+                                out: Union[cv2.VideoWriter, None],
+                                ) -> NoReturn:
+        """
+        То же, что и `detect_frames`, но декодирование, инференс и отрисовка с кодированием выполняются
+        параллельно в `FramePipeline`. Загрузка стадий сохраняется в `job.meta['pipeline']`.
+        :param vidcap: Объект cv2.VideoCapture для захвата видео
+        :param frame_read: Удалось ли прочитать первый кадр
+        :param image: Первый кадр
+        :param length: Общее количество кадров в видеофайле
+        :param fps: Частота кадров видео
+        :param out: Объект cv2.VideoWriter для записи обработанных кадров в новый видеофайл
+
+        :return: `NoReturn`
+        """
+
+        self.start_selection()
+
+        def consume(count: int, frame: ndarray, detections: list) -> NoReturn:
+            self.handled_selector_stats = self.selector_snapshots.popleft()  # Кадры приходят в порядке отбора
+            self.handle_frame(count, length, fps, frame, detections, out)
+
+        pipeline = FramePipeline(vidcap, frame_read, image,
+                                 detect=self.predictor.detect,
+                                 consume=consume,
+                                 batch_size=self.batch_size,
+                                 queue_size=self.queue_size,
+                                 select=self.select_frame,
+                                 )
+        stats = pipeline.run()
+
+        self.job_tracker.set_meta(pipeline=stats)
+        self.progress = int(self.progress)
+        console_logger.debug(f'Кадров прочитано: {stats["stages"]["encode"]["items"]}, '
+                             f'bottleneck: {stats["bottleneck"]}, progress={self.progress}')
+
+    def start_selection(self) -> NoReturn:
+        """
+        Начинает отбор кадров видео (сегмента): счетчики `frame_selector` уже учтены, в том числе после
+        продолжения с чекпоинта
+        :return: `NoReturn`
+        """
+
+        self.selector_snapshots.clear()
+        self.handled_selector_stats = self.frame_selector.json()
+
+    def select_frame(self, count: int, image: ndarray) -> bool:
+        """
+        `FrameSelector.should_infer`, который запоминает счетчики `frame_selector` после отбора кадра
+        :param count: Номер кадра начиная с 0
+        :param image: Кадр
+        :return: Нужно ли запускать модель на кадре
+        """
+
+        is_inferred = self.frame_selector.should_infer(count, image)
+        self.selector_snapshots.append(self.frame_selector.json())
+
+        return is_inferred
+
+    def update_selector_stats(self) -> NoReturn:
+        """
+        Сохраняем статистику отбора кадров (сколько кадров прошло через модель, а сколько переиспользовано)
+        в json текущего видео и суммарно по всем видео в `job.meta`
+        :return: `NoReturn`
+        """
+
+        stats = self.frame_selector.json()
+        self.data.update(stats)
+
+        self.frames_inferred += stats['frames_inferred']
+        self.frames_reused += stats['frames_reused']
+        self.job_tracker.set_meta(frames_inferred=self.frames_inferred, frames_reused=self.frames_reused)
+
+        console_logger.debug(f'Frames inferred: {stats["frames_inferred"]}, reused: {stats["frames_reused"]}')
+
+    def handle_frame(self,
+                     count: int,
+                     length: int,
+                     fps: float,
+                     frame: ndarray,
+                     detections: list[list[float]],
+                     out: Union[cv2.VideoWriter, None],
+                     ) -> NoReturn:
         """
+        Учет результатов предсказания для одного кадра: статистика, очаги заражения, запись в видео и прогресс.
+        :param count: Номер кадра начиная с 0
+        :param length: Общее количество кадров в видеофайле
+        :param fps: Частота кадров видео
+        :param frame: Кадр
+        :param detections: Обнаружения кадра
+        :param out: Объект cv2.VideoWriter для записи обработанных кадров
 
-        n_max = 10
-        keys = self.max_detected.keys()
+        :return: `NoReturn`
+        """
 
-        if len(keys) < n_max:
-            self.max_detected[len(keys)] = (len(labels), output_file, labels, time_code)
+        frame_no = self.frame_offset + count  # Номер кадра от начала видео (при обработке сегмента)
+        self.recorder.add(frame_no, detections)
+
+        # При отложенной отрисовке bbox рисуются только на кадрах, сохраняемых как очаги заражения
+        if self.render_mode == 'eager':
+            output_file, _, labels = self.predictor.annotate(frame, detections)
         else:
-            # Заменяем минимальное кол-во определенных объектов на новое, большее
-            min_key = min(keys, key=lambda k: self.max_detected[k][0])
+            output_file, labels = frame, [self.predictor.class_names_dict[int(data[5])] for data in detections]
+
+        if labels:
+            self.data['detected'].update(labels)
+
+            # Считаем сколько каждых классов обнаружено
+            for c in labels:
+                self.data['num_detected'][c] = self.data['num_detected'].get(c, 0) + 1
+
+            if (frame_no + 1) % 2 != 0:  # Каждый нечетный кадр проверяем (через 1)
+                self.update_max_detected(labels, output_file, frame_no / fps,
+                                         detections if self.render_mode != 'eager' else None)
+
+            console_logger.debug(
+                f'№{frame_no + 1}/{self.frame_offset + length}: Target classes: {labels}, '
+                f'progress: {round(self.progress, 2)}%')
+
+        # Записываем кадр с предсказаниями в видео
+        if self.is_save_output and self.render_mode == 'eager':
+            out.write(output_file)
+
+            # Плейлист HLS появляется в хранилище после загрузки первого сегмента, тогда видео и можно смотреть
+            if isinstance(out, HlsVideoWriter) and out.is_started and self.preview != out.playlist:
+                self.preview = out.playlist
+                self.job_tracker.set_meta(preview=self.preview)
+
+        progress = ((count + 1 + self.resumed_frames) / length) * PROGRESS_NN_PERCENT / self.len_files + self._progress
+        self.job_tracker.update_progress(progress)
+
+        if self.checkpoint is not None and self.checkpoint.is_due():
+            self.save_checkpoint(video_no=self.current_vid_no, next_frame=frame_no + 1)
+
+        if self.sleep > 0:
+            time.sleep(self.sleep)
+
+    def update_max_detected(self,
+                            labels: list,
+                            output_file: ndarray,
+                            time_code: float,
+                            detections: Union[list[list[float]], None] = None,
+                            ):
+        """Обновление кадров с максимальным количеством обнаружений (`TopKFrames`).
+        :params labels: Метки обнаруженных на кадре классов
+        :params output_file: Кадр
+        :params time_code: Время кадра в секундах
+        :params detections: Обнаружения, если bbox на `output_file` еще не нарисованы
+        """
+
+        prepare = (lambda frame: self.predictor.annotate(frame, detections)[0]) if detections is not None else None
 
-            if len(labels) > self.max_detected[min_key][0]:
-                self.max_detected[min_key] = (len(labels), output_file, labels, time_code)
+        self.top_frames.offer(len(labels), output_file, labels, time_code, prepare)
 
     def upload_video(self, dst: str, current_time_folder: str, path: str) -> NoReturn:
         """
@@ -456,52 +1192,110 @@ class VideoProcessor:
             os.remove(dst)
             console_logger.debug(f'Resources uploaded {is_dst_upload}, {dst} removed')
 
-    def upload_images(self, current_time_folder: str, path: str) -> NoReturn:
+    def upload_detections(self, dst_folder: str, current_time_folder: str, current_vid_no: int, path: str) -> NoReturn:
         """
-        Загрузка изображений в хранилище.
+        Сохранение обнаружений всех кадров и timeline (`DetectionsRecorder`) в хранилище.
+        :param dst_folder: Локальная папка, в которой сохраняется файл перед загрузкой
         :param current_time_folder: Папка, в которую сохраняем выходное видео
+        :param current_vid_no: Номер текущего видео начиная с 0
         :param path: Путь до обрабатываемого видео, может быть как локальным, так и облачным
 
         :return: `NoReturn`
         """
 
-        self.job_tracker.set_meta(stage='images-loading')
-        len_images = len(self.max_detected.keys())
+        files = {
+            'detections': self.recorder.save(os.path.join(dst_folder, f'{current_vid_no}_detections.npz')),
+            'timeline': self.recorder.save_timeline(os.path.join(dst_folder, f'{current_vid_no}_timeline.npy')),
+        }
 
-        # Сохраняем изображения в папке пользователя в конкретный день (user_id, dd_mm_yy)
-        for i, (key, value) in enumerate(self.max_detected.items()):
-            img_path = Storage.path_join(current_time_folder, f"max_{i}_{time.time()}.png")
-            is_file_uploaded = Storage.imwrite(img_path, value[1])
-            self.data['source_of_infection'].append([img_path, value[3]])
-            self.is_files_upload[path].append({f'image_{i + 1}': is_file_uploaded})
+        for key, file in files.items():
+            if self.storage == 's3':
+                remote_file = Storage.path_join(current_time_folder, os.path.basename(file))
+                is_file_upload = Storage.upload_large_file(src=file, dst=remote_file)
+                os.remove(file)
+                file = remote_file
+            else:
+                is_file_upload = True
 
-            # Рассчитываем прогресс загрузки: (1/10) * 5 + 95
-            progress = (PROGRESS_LOAD_DST_PERCENT + PROGRESS_NN_PERCENT) / self.len_files + (
-                    (i + 1) / len_images) * PROGRESS_LOAD_IMAGES_PERCENT / self.len_files + self._progress
-            console_logger.debug(f'№{i + 1}/{len_images}: progress: {progress}')
-            self.job_tracker.update_progress(progress)
+            self.data[key] = file
+            self.is_files_upload[path].append({key: is_file_upload})
+            console_logger.debug(f'{key} saved to {file}: {is_file_upload}')
 
-            console_logger.debug(f'{img_path} write, progress={progress}')
+        self.data['timeline_classes'] = self.recorder.timeline_classes()
 
-    def upload_info(self, current_time_folder: str, path: str) -> NoReturn:
+    def upload_images(self, current_time_folder: str, path: str) -> NoReturn:
         """
-        Загрузка информации об обработанном файле на сервер в json формате.
+        Загрузка изображений в хранилище. Изображения загружаются в фоне (`StorageApi.submit`) параллельно
+        с обработкой следующего видео, результат загрузки записывается в `is_files_upload` в `collect_uploads`.
         :param current_time_folder: Папка, в которую сохраняем выходное видео
         :param path: Путь до обрабатываемого видео, может быть как локальным, так и облачным
 
         :return: `NoReturn`
         """
 
+        self.job_tracker.set_meta(stage='images-loading')
+
+        # Сохраняем изображения в папке пользователя в конкретный день (user_id, dd_mm_yy)
+        for i, (time_code, labels, image) in enumerate(self.top_frames.items()):
+            img_path = Storage.path_join(current_time_folder, f"max_{i}_{time.time()}{self.top_frames.image_format}")
+            self.uploads.append((path, f'image_{i + 1}', Storage.submit(Storage.write_bytes, img_path, image)))
+            self.data['source_of_infection'].append([img_path, time_code])
+            console_logger.debug(f'{img_path} submitted')
+
+        # Изображения загружаются в фоне, поэтому их часть прогресса засчитывается сразу
+        progress = (PROGRESS_LOAD_DST_PERCENT + PROGRESS_NN_PERCENT + PROGRESS_LOAD_IMAGES_PERCENT
+                    ) / self.len_files + self._progress
+        self.job_tracker.update_progress(progress)
+
+    def upload_info(self, current_time_folder: str, path: str) -> Future:
+        """
+        Загрузка информации об обработанном файле на сервер в json формате. Файл загружается в фоне,
+        как и изображения (`upload_images`), но путь до него известен сразу.
+        :param current_time_folder: Папка, в которую сохраняем выходное видео
+        :param path: Путь до обрабатываемого видео, может быть как локальным, так и облачным
+
+        :return: `Future` загрузки json, нужно дождаться перед чтением файла (например, при отрисовке видео)
+        """
+
         self.job_tracker.set_meta(stage='info-loading')
 
         if app.config['DEBUG'] and Storage.get_storage() == 'local':
             console_logger.warning(f'You in debug docker mode, files will be saved locally')
             os.makedirs(current_time_folder, exist_ok=True)
 
-        file = Storage.save_data_to_specific_folder(current_time_folder=current_time_folder, data=self.data)
-        self.is_files_upload[path].append({f'res-file': True if file else False})
+        # `self.data` больше не изменяется: для следующего видео создается новый словарь (`initialize_data`)
+        file = Storage.get_data_path(current_time_folder)
+        future = Storage.submit(Storage.save_json, file, self.data)
+        self.uploads.append((path, 'res-file', future))
         self.res_json_files.append(file)
 
+        return future
+
+    def collect_uploads(self, wait: bool = True) -> bool:
+        """
+        Записывает результаты фоновых загрузок (`uploads`) в `is_files_upload`.
+        :param wait: Дождаться незавершенных загрузок, иначе записываются только завершенные по порядку
+
+        :return: Все ли загрузки завершены
+        """
+
+        while self.uploads:
+            path, key, future = self.uploads[0]
+
+            if not wait and not future.done():
+                return False
+
+            try:
+                is_file_upload = bool(future.result())
+            except Exception as e:
+                get_traceback.error(f'{key} of {path} is not uploaded: {e}')
+                is_file_upload = False
+
+            self.is_files_upload[path].append({key: is_file_upload})
+            self.uploads.pop(0)
+
+        return True
+
 
 # Api для работы с очередью
 def predict_on_video(files: list,
@@ -509,6 +1303,20 @@ def predict_on_video(files: list,
                      save_output: bool = True,
                      is_remove=False,
                      sleep: int = 0,
+                     batch_size: int = 1,
+                     execution_mode: str = 'sequential',
+                     queue_size: int = 32,
+                     sample_stride: Union[int, None] = None,
+                     target_fps: Union[float, None] = None,
+                     frame_gate: Union[str, None] = None,
+                     gate_threshold: Union[float, None] = None,
+                     precision: str = 'fp32',
+                     render_mode: str = 'eager',
+                     top_k: int = 10,
+                     top_k_gap: float = 1.0,
+                     parallel: bool = False,
+                     segment_seconds: Union[float, None] = None,
+                     video_format: str = 'mp4',
                      *args,
                      **kwargs,
                      ) -> NoReturn:
@@ -518,11 +1326,124 @@ def predict_on_video(files: list,
     :param save_output: Сохранять ли видео с bbox и label болезней (если необходимо сохранить в облако, то сначала видео сохраняется локально, а затем загружается)
     :param is_remove: Удалять ли файл, по которому делали предсказание после предсказания
     :param sleep: Timeout (требуется только для теста)
+    :param batch_size: Сколько кадров передается в модель за один прямой проход (8/16 для CPU воркеров)
+    :param execution_mode: sequential/pipeline - см. `VideoProcessor`
+    :param queue_size: Размер очередей между стадиями в режиме pipeline
+    :param sample_stride: Запускать модель только на каждом `sample_stride` кадре
+    :param target_fps: Сколько кадров в секунду обрабатывать моделью (вместо `sample_stride`)
+    :param frame_gate: Детектор изменений кадра diff/phash, пропускающий почти одинаковые кадры
+    :param gate_threshold: Порог изменения кадра (0..1) для `frame_gate`
+    :param precision: Точность модели fp32/int8
+    :param render_mode: Когда отрисовывать видео с bbox eager/lazy/idle - см. `VideoProcessor`
+    :param top_k: Сколько кадров с наибольшим количеством обнаружений сохранять
+    :param top_k_gap: Минимальное расстояние между сохраняемыми кадрами в секундах
+    :param parallel: Обрабатывать видео параллельно на свободных воркерах - см. `VideoProcessor.process_videos_parallel`
+    :param segment_seconds: Делить видео длиннее `segment_seconds` на сегменты, обрабатываемые параллельно
+    :param video_format: Формат видео с bbox mp4/hls - см. `VideoProcessor`
     :return: `NoReturn`
     """
 
-    vid_processor = VideoProcessor(files, current_time_folders, save_output, is_remove, sleep)
-    vid_processor.process_videos()
+    options = {
+        'is_save_output': save_output,
+        'is_remove': is_remove,
+        'sleep': sleep,
+        'batch_size': batch_size,
+        'execution_mode': execution_mode,
+        'queue_size': queue_size,
+        'sample_stride': sample_stride,
+        'target_fps': target_fps,
+        'frame_gate': frame_gate,
+        'gate_threshold': gate_threshold,
+        'precision': precision,
+        'render_mode': render_mode,
+        'top_k': top_k,
+        'top_k_gap': top_k_gap,
+        'segment_seconds': segment_seconds,
+        'video_format': video_format,
+    }
+
+    vid_processor = VideoProcessor(files, current_time_folders, **options)
+
+    if parallel:
+        vid_processor.process_videos_parallel()
+    else:
+        vid_processor.process_videos()
+
+
+def is_task_stopped(task_id: int) -> bool:
+    """
+    :param task_id: id задачи `Task`
+    :return: Остановлена ли задача (`StopJobApi`), тогда ее дочерним задачам не нужно ничего обрабатывать
+    """
+
+    with app.app_context():
+        task = Task.find_by_id(task_id)
+
+        return task is None or task.status == 'stopped'
+
+
+def predict_video_segment(parent_id: str,
+                          segment_no: int,
+                          files: list,
+                          current_time_folders: list,
+                          video_no: int,
+                          segments: list,
+                          **options,
+                          ) -> NoReturn:
+    """
+    :param parent_id: id обработки видео по сегментам (`{job_id}:{video_no}`)
+    :param segment_no: Номер сегмента
+    :param files: Все видео родительской задачи
+    :param current_time_folders: Папки всех видео родительской задачи
+    :param video_no: Номер видео в `files`
+    :param segments: Сегменты видео [[первый кадр, кадр после последнего], ...]
+    :param options: Параметры `VideoProcessor`
+    :return: `NoReturn`
+
+    Дочерняя задача `VideoProcessor.process_segmented_video`, если сегмент уже взяла другая задача или задача
+    остановлена, ничего не делает
+    """
+
+    if is_task_stopped(get_current_job().meta['task_id']):
+        console_logger.debug(f'Task of {parent_id} is stopped, segment {segment_no} skipped')
+        return
+
+    fan_out = FanOut(parent_id, len(segments), app.redis)
+
+    if not fan_out.claim(segment_no, get_current_job().get_id()):
+        console_logger.debug(f'Segment {segment_no} of {parent_id} already claimed')
+        return
+
+    start, end = segments[segment_no]
+    vid_processor = VideoProcessor(files, current_time_folders, **options)
+    fan_out.set_result(segment_no, vid_processor.process_segment(video_no, start, end))
+
+
+def predict_video_part(parent_id: str, video_no: int, files: list, current_time_folders: list, **options) -> NoReturn:
+    """
+    :param parent_id: id задачи, видео которой обрабатываются параллельно
+    :param video_no: Номер видео в `files`
+    :param files: Все видео родительской задачи
+    :param current_time_folders: Папки всех видео родительской задачи
+    :param options: Параметры `VideoProcessor`
+    :return: `NoReturn`
+
+    Дочерняя задача `VideoProcessor.process_videos_parallel`, если видео уже взяла другая задача или задача
+    остановлена, ничего не делает
+    """
+
+    if is_task_stopped(get_current_job().meta['task_id']):
+        console_logger.debug(f'Task of {parent_id} is stopped, video {video_no} skipped')
+        return
+
+    fan_out = FanOut(parent_id, len(files), app.redis)
+
+    if not fan_out.claim(video_no, get_current_job().get_id()):
+        console_logger.debug(f'Video {video_no} of {parent_id} already claimed')
+        return
+
+    vid_processor = VideoProcessor(files, current_time_folders, **options)
+    fan_out.set_result(video_no, vid_processor.process_part(video_no))
 
 
 if __name__ == '__main__':
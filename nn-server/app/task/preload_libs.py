@@ -1,6 +1,8 @@
 import os
 import time
-from typing import Any, List, NoReturn, Union
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, List, NoReturn, Union
 
 import cv2
 import env_register  # noqa
@@ -16,7 +18,16 @@ from rq.job import Job
 from storage.S3 import StorageApi
 from utils.loader import VideoImageLoader
 
-from task.disiases_detection import PREDICTOR
+from task.checkpoint import Checkpoint
+from task.detections import DetectionsRecorder, iter_frame_detections, load_detections
+from task.disiases_detection import PREDICTOR, get_predictor
+from task.fan_out import FanOut
+from task.frame_selector import FrameSelector
+from task.pipeline import FramePipeline
+from task.progress import ProgressPublisher
+from task.segments import open_segment, split_segments
+from task.top_k import TopKFrames
+from task.video_writer import HlsVideoWriter, StreamVideoWriter
 
 console_logger = Logger(__file__)
 get_traceback = GetTraceback(__file__)
@@ -27,7 +38,7 @@ console_logger.debug(f'FileDownloader initialized')
 load_dotenv(tests_env_file)
 console_logger.debug(f'env loaded')
 
-app = KallosusNNApplication().create_app()
+app = KallosusNNApplication().create_app(is_worker=True)
 PREDICTOR.load()
 
 Storage = StorageApi()
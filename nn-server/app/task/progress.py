@@ -0,0 +1,145 @@
+import json
+import math
+import os
+import time
+from typing import NoReturn, Union
+
+from rq.job import Job
+
+
+class ProgressPublisher:
+    """
+    Публикация прогресса задачи в `job.meta` с ограничением частоты записей в Redis.
+
+    Прогресс обновляется на каждом кадре, но в Redis записывается, только если с прошлой записи прошло
+    не меньше `interval` секунд и прогресс изменился хотя бы на `min_delta`. Все накопленные поля
+    (progress, eta, stage, ...) записываются одним `save_meta`. Смена этапа (`stage`) и завершение (100%)
+    записываются сразу.
+
+    Если задан `channel`, каждая запись также публикуется в канал Redis pub/sub задачи, откуда ее получает
+    `StatusStreamApi`, поэтому клиенту не нужно опрашивать статус.
+
+    ETA считается по скорости обработки (процентов в секунду), сглаженной экспоненциальным скользящим средним
+    с постоянной времени `eta_window`, а не линейной экстраполяцией от начала задачи, поэтому медленное
+    начало (загрузка видео, прогрев модели) не искажает оценку до конца обработки.
+    """
+
+    def __init__(self,
+                 job: Union[Job, None],
+                 interval: float = float(os.getenv('PD_PROGRESS_INTERVAL', 1.0)),
+                 min_delta: float = float(os.getenv('PD_PROGRESS_MIN_DELTA', 0.5)),
+                 eta_window: float = 10.0,
+                 channel: Union[str, None] = None,
+                 ):
+        """
+        :param job: `rq.Job`, None - прогресс никуда не записывается
+        :param interval: Минимальный интервал между записями в секундах
+        :param min_delta: Минимальное изменение прогресса для записи
+        :param eta_window: Постоянная времени сглаживания скорости обработки в секундах
+        :param channel: Канал Redis pub/sub задачи (`Task.channel`), None - записи не публикуются
+        """
+
+        self.job = job
+        self.interval = interval
+        self.min_delta = min_delta
+        self.eta_window = eta_window
+        self.channel = channel
+
+        self.writes = 0  # Сколько раз meta записана в Redis
+        self._pending = {}  # Поля meta, еще не записанные в Redis
+        self._last_flush = 0.0
+        self._published_progress = None
+
+        self._start_time = time.time()
+        self._last_time = self._start_time
+        self._last_progress = 0.0
+        self._rate = None  # Сглаженная скорость обработки в процентах в секунду
+
+    def update(self, progress: float) -> NoReturn:
+        """
+        :param progress: Текущий прогресс (0-100)
+        :return: `NoReturn`
+        """
+
+        self._pending['progress'] = progress
+        eta = self.estimate_eta(progress)
+
+        if eta is not None:
+            self._pending['eta'] = eta
+
+        if self._is_due(progress):
+            self.flush()
+
+    def set(self, **kwargs) -> NoReturn:
+        """
+        :param kwargs: Поля meta
+        :return: `NoReturn`
+
+        Смена этапа записывается сразу, остальные поля - вместе со следующей записью прогресса
+        """
+
+        self._pending.update(kwargs)
+
+        if 'stage' in kwargs:
+            self.flush()
+
+    def estimate_eta(self, progress: float) -> Union[int, None]:
+        """
+        :param progress: Текущий прогресс (0-100)
+        :return: Оставшееся время в секундах, None - оценки еще нет
+        """
+
+        now = time.time()
+        dt = now - self._last_time
+        delta = progress - self._last_progress
+
+        if dt > 0 and delta > 0:
+            rate = delta / dt
+            # Вес нового измерения зависит от прошедшего времени, поэтому частота вызовов не влияет на сглаживание
+            alpha = 1 - math.exp(-dt / self.eta_window)
+            self._rate = rate if self._rate is None else alpha * rate + (1 - alpha) * self._rate
+            self._last_time, self._last_progress = now, progress
+
+        if not self._rate:
+            return None
+
+        return int(max(0.0, 100 - progress) / self._rate)
+
+    def _is_due(self, progress: float) -> bool:
+        """
+        :param progress: Текущий прогресс (0-100)
+        :return: Нужно ли записать прогресс сейчас
+        """
+
+        if progress >= 100 or self._published_progress is None:
+            return True
+
+        return (time.time() - self._last_flush >= self.interval
+                and abs(progress - self._published_progress) >= self.min_delta)
+
+    def flush(self) -> NoReturn:
+        """
+        Записывает все накопленные поля meta в Redis одной операцией
+
+        :return: `NoReturn`
+        """
+
+        if not self._pending:
+            return
+
+        if self.job is not None:
+            self.job.meta.update(self._pending)
+
+            # meta и событие для `StatusStreamApi` отправляются одним запросом (как `job.save_meta()` + publish)
+            pipeline = self.job.connection.pipeline(transaction=False)
+            pipeline.hset(self.job.key, 'meta', self.job.serializer.dumps(self.job.meta))
+
+            if self.channel is not None:
+                pipeline.publish(self.channel, json.dumps(self._pending))
+
+            pipeline.execute()
+            self.writes += 1
+
+        self._published_progress = self._pending.get('progress', self._published_progress)
+        self._last_flush = time.time()
+        self._pending = {}
@@ -0,0 +1,284 @@
+"""
+Сборка INT8 варианта модели для CPU воркеров (post-training static quantization onnxruntime).
+
+Модель калибруется на кадрах видео из `DATA/videos`, после чего на отдельной части кадров сравнивается с FP32:
+совпадение обнаружений по каждому классу и задержка на кадр. Отчет сохраняется рядом с моделью
+в `pd_yolov9e_int8_report.json`, чтобы решить, стоит ли ускорение возможной потери точности.
+
+Запуск из папки `app`:
+```
+python -m task.quantize --frames 200
+```
+"""
+import argparse
+import json
+import os
+import time
+from typing import Iterator, NoReturn
+
+import cv2
+import numpy as np
+from kallosus_packages.over_logging import Logger
+
+from path_definitions import current_path
+from task.backends import BACKENDS
+from task.disiases_detection import DiseasesDetection
+
+console_logger = Logger(__file__)
+
+videos_folder = os.path.join(os.path.dirname(current_path), 'DATA', 'videos')
+video_formats = ('.mp4', '.avi')
+
+
+def box_iou(box_a: list[float], box_b: list[float]) -> float:
+    """
+    :param box_a: [xmin, ymin, xmax, ymax, ...]
+    :param box_b: [xmin, ymin, xmax, ymax, ...]
+    :return: Intersection over union двух рамок
+    """
+
+    x_min, y_min = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x_max, y_max = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    intersection = max(0.0, x_max - x_min) * max(0.0, y_max - y_min)
+    union = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]) + (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]) - intersection
+
+    return intersection / union if union > 0 else 0.0
+
+
+def sample_frames(folder: str = videos_folder, num_frames: int = 200) -> list[np.ndarray]:
+    """
+    :param folder: Папка с видео
+    :param num_frames: Сколько кадров взять суммарно со всех видео
+    :return: Кадры, равномерно выбранные по всей длине каждого видео
+    """
+
+    videos = [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(video_formats)]
+
+    if not videos:
+        raise FileNotFoundError(f'No videos {video_formats} in {folder}')
+
+    frames = []
+    per_video = max(1, num_frames // len(videos))
+
+    for video in videos:
+        vidcap = cv2.VideoCapture(video)
+        length = int(vidcap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        for frame_no in np.linspace(0, max(length - 1, 0), per_video, dtype=int):
+            vidcap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_no))
+            frame_read, frame = vidcap.read()
+
+            if frame_read:
+                frames.append(frame)
+
+        vidcap.release()
+
+    console_logger.info(f'{len(frames)} frames sampled from {len(videos)} videos')
+
+    return frames
+
+
+def letterbox(image: np.ndarray, size: int = 640) -> np.ndarray:
+    """
+    :param image: Кадр BGR
+    :param size: Размер входа модели
+    :return: Тензор 1x3xSxS float32, подготовленный так же, как в `ultralytics` (letterbox, RGB, 0..1)
+    """
+
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+
+    resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_height) // 2, (size - new_width) // 2
+    canvas[top:top + new_height, left:left + new_width] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255
+
+    return np.ascontiguousarray(tensor[None])
+
+
+class FramesCalibrationReader:
+    """
+    Источник данных калибровки для `onnxruntime.quantization.quantize_static`
+    """
+
+    def __init__(self, frames: list[np.ndarray], input_name: str):
+        """
+        :param frames: Кадры для калибровки
+        :param input_name: Имя входа ONNX модели
+        """
+
+        self._input_name = input_name
+        self._data: Iterator[np.ndarray] = iter([letterbox(frame) for frame in frames])
+
+    def get_next(self) -> dict | None:
+        tensor = next(self._data, None)
+
+        return {self._input_name: tensor} if tensor is not None else None
+
+
+def quantize(pt_path: str, frames: list[np.ndarray]) -> str:
+    """
+    :param pt_path: Путь до `.pt` модели
+    :param frames: Кадры для калибровки
+    :return: Путь до INT8 модели
+    """
+
+    import onnxruntime
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+
+    fp32_path = BACKENDS['onnx'].ensure_exported(pt_path)
+    int8_path = BACKENDS['onnx_int8'].artifact_path(pt_path)
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    console_logger.info(f'Calibrating {fp32_path} on {len(frames)} frames...')
+    quantize_static(fp32_path,
+                    int8_path,
+                    FramesCalibrationReader(frames, input_name),
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    )
+    console_logger.info(f'INT8 model saved: {int8_path}')
+
+    return int8_path
+
+
+def measure(predictor: DiseasesDetection, frames: list[np.ndarray]) -> tuple[list[list[list[float]]], list[float]]:
+    """
+    :param predictor: Модель
+    :param frames: Кадры
+    :return: Обнаружения и задержка (мс) для каждого кадра
+    """
+
+    predictor.detect([frames[0].copy()])  # Прогрев
+
+    detections, latencies = [], []
+
+    for frame in frames:
+        start = time.perf_counter()
+        detections.append(predictor.detect([frame.copy()])[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return detections, latencies
+
+
+def compare(fp32: list[list[list[float]]],
+            int8: list[list[list[float]]],
+            class_names: dict,
+            min_iou: float = 0.5,
+            ) -> dict:
+    """
+    :param fp32: Обнаружения FP32 модели для каждого кадра
+    :param int8: Обнаружения INT8 модели для каждого кадра
+    :param class_names: Названия классов по индексам
+    :param min_iou: Минимальный IoU, при котором обнаружения считаются совпадающими
+    :return: Для каждого класса: количество обнаружений FP32/INT8, совпавших, recall и precision INT8 относительно FP32
+    """
+
+    per_class = {}
+
+    for fp32_frame, int8_frame in zip(fp32, int8):
+        unmatched = list(int8_frame)
+
+        for box in fp32_frame:
+            stats = per_class.setdefault(int(box[5]), {'fp32': 0, 'int8': 0, 'matched': 0})
+            stats['fp32'] += 1
+
+            for candidate in unmatched:
+                if int(candidate[5]) == int(box[5]) and box_iou(box, candidate) >= min_iou:
+                    stats['matched'] += 1
+                    unmatched.remove(candidate)
+                    break
+
+        for box in int8_frame:
+            per_class.setdefault(int(box[5]), {'fp32': 0, 'int8': 0, 'matched': 0})['int8'] += 1
+
+    report = {}
+
+    for class_id, stats in sorted(per_class.items()):
+        report[class_names.get(class_id, str(class_id))] = {
+            **stats,
+            'recall': round(stats['matched'] / stats['fp32'], 3) if stats['fp32'] else None,
+            'precision': round(stats['matched'] / stats['int8'], 3) if stats['int8'] else None,
+        }
+
+    return report
+
+
+def latency_stats(latencies: list[float]) -> dict:
+    """
+    :param latencies: Задержки в мс
+    :return: Среднее, p50, p95
+    """
+
+    return {
+        'mean_ms': round(float(np.mean(latencies)), 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def build(num_frames: int = 200) -> dict:
+    """
+    :param num_frames: Сколько кадров использовать (половина на калибровку, половина на сравнение)
+    :return: Отчет сравнения INT8 и FP32
+
+    Собирает INT8 модель и сохраняет отчет рядом с ней
+    """
+
+    fp32_predictor = DiseasesDetection(backend='onnx')
+    pt_path = fp32_predictor.get_model()
+
+    frames = sample_frames(num_frames=num_frames)
+    calibration_frames, evaluation_frames = frames[::2], frames[1::2]
+
+    int8_path = quantize(pt_path, calibration_frames)
+    int8_predictor = DiseasesDetection(precision='int8')
+
+    # При ошибке загрузки модель молча переключается на torch, а сравнивать нужно именно onnx модели
+    for predictor, backend in [(fp32_predictor, 'onnx'), (int8_predictor, 'onnx_int8')]:
+        predictor.load()
+        if predictor.backend.name != backend:
+            raise RuntimeError(f'`{backend}` model failed to load')
+
+    fp32_detections, fp32_latencies = measure(fp32_predictor, evaluation_frames)
+    int8_detections, int8_latencies = measure(int8_predictor, evaluation_frames)
+
+    fp32_latency, int8_latency = latency_stats(fp32_latencies), latency_stats(int8_latencies)
+
+    report = {
+        'model': int8_path,
+        'calibration_frames': len(calibration_frames),
+        'evaluation_frames': len(evaluation_frames),
+        'latency': {
+            'fp32': fp32_latency,
+            'int8': int8_latency,
+            'speedup': round(fp32_latency['mean_ms'] / int8_latency['mean_ms'], 2),
+        },
+        'classes': compare(fp32_detections, int8_detections, fp32_predictor.class_names_dict),
+    }
+
+    report_path = os.path.splitext(int8_path)[0] + '_report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+    console_logger.info(f'Report saved: {report_path}')
+
+    return report
+
+
+def main() -> NoReturn:
+    parser = argparse.ArgumentParser(description='Build INT8 quantized detector and compare it with FP32')
+    parser.add_argument('--frames', type=int, default=200, help='Number of frames sampled from DATA/videos')
+    args = parser.parse_args()
+
+    print(json.dumps(build(args.frames), ensure_ascii=False, indent=4))
+
+
+if __name__ == '__main__':
+    main()
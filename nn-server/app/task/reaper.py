@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from typing import NoReturn
+
+from flask import Flask
+from kallosus_packages.over_logging import GetTraceback, Logger
+from rq import Queue, Worker
+from rq.registry import StartedJobRegistry
+
+from database.models import Task
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+
+class JobReaper:
+    """
+    Возвращает в очередь задачи, воркер которых упал.
+
+    Задачи запускаются без таймаута (`job_timeout=-1`), поэтому RQ сам не переносит их из `StartedJobRegistry`
+    в упавшие, а `Task` остается в статусе run. Задача считается брошенной, если она в `StartedJobRegistry`,
+    но ее не выполняет ни один живой воркер (ключ воркера в Redis пропадает, когда прекращается heartbeat).
+    Брошенная задача ставится в начало очереди с тем же id и meta, поэтому `VideoProcessor` продолжает ее
+    с последнего чекпоинта (`Checkpoint`), а дочерние задачи снова захватывают свои части (`FanOut`).
+
+    Проверка выполняется в фоновом потоке каждого процесса API, блокировка в Redis не дает нескольким процессам
+    вернуть одну задачу дважды.
+    """
+
+    _LOCK_KEY = 'pd-reaper:lock'
+
+    def __init__(self, app: Flask, interval: float = float(os.getenv('PD_REAPER_INTERVAL', 60))):
+        """
+        :param app: Приложение с `redis`, `task_queue` и `render_queue`
+        :param interval: Как часто проверять задачи в секундах
+        """
+
+        self.app = app
+        self.interval = interval
+
+    def start(self) -> NoReturn:
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> NoReturn:
+        while True:
+            time.sleep(self.interval)
+
+            try:
+                requeued = self.reap()
+
+                if requeued:
+                    console_logger.warning(f'Orphaned jobs requeued: {requeued}')
+            except Exception as e:
+                get_traceback.error(f'{e}')
+
+    def reap(self) -> list[str]:
+        """
+        :return: id задач, возвращенных в очередь
+        """
+
+        if not self.app.redis.set(self._LOCK_KEY, 1, nx=True, ex=max(1, int(self.interval))):
+            return []
+
+        requeued = self.requeue_orphaned_jobs([self.app.task_queue, self.app.render_queue])
+        self.update_tasks(requeued)
+
+        return requeued
+
+    @staticmethod
+    def requeue_orphaned_jobs(queues: list[Queue]) -> list[str]:
+        """
+        :param queues: Очереди, задачи которых проверяются
+        :return: id задач, возвращенных в очередь
+        """
+
+        requeued = []
+
+        for queue in queues:
+            registry = StartedJobRegistry(queue=queue)
+            # Сначала читаем задачи, а затем воркеры: задача, взятая воркером позже, в этот список не попадет
+            job_ids = registry.get_job_ids()
+            live_job_ids = {worker.get_current_job_id() for worker in Worker.all(connection=queue.connection)}
+
+            for job_id in job_ids:
+                if job_id in live_job_ids:
+                    continue
+
+                job = queue.fetch_job(job_id)
+
+                # Задача могла завершиться, пока мы проверяли воркеры
+                if job is not None and job.get_status() != 'started':
+                    continue
+
+                registry.remove(job_id)
+
+                if job is not None:
+                    queue.enqueue_job(job, at_front=True)
+                    requeued.append(job_id)
+
+        return requeued
+
+    def update_tasks(self, requeued: list[str]) -> NoReturn:
+        """
+        :param requeued: id задач, возвращенных в очередь
+        :return: `NoReturn`
+
+        Возвращенные задачи снова в статусе queue, а задачи в run, которые нельзя продолжить, завершаются с ошибкой
+        """
+
+        with self.app.app_context():
+            for task in Task.find_by_status('run'):
+                if task.job_id in requeued:
+                    task.set_status('queue')
+                    continue
+
+                job = task.get_rq_job()
+
+                # Задачу нельзя продолжить: ее нет в Redis или она упала с ошибкой
+                if job is None or job.is_failed:
+                    get_traceback.error(f'Task {task.id} has no job to resume, job: {task.job_id}')
+                    task.finish_task([], None, error=True)
@@ -0,0 +1,70 @@
+try:
+    from .preload_libs import *
+except ImportError:
+    from preload_libs import *
+
+
+def render_video(res_file: str) -> str:
+    """
+    :param res_file: Путь до json с результатами обработки видео (`Task.done_res_files`)
+    :return: Путь до видео с bbox и label болезней в хранилище
+
+    Отрисовывает видео с bbox по сохраненным обнаружениям (`data['detections']`) без повторного запуска модели.
+    Выполняется в очереди `pd-render`, которую воркеры берут только когда очередь `pd-task` пуста.
+    Путь до видео записывается в `dst` json файла, поэтому видео отрисовывается один раз.
+    """
+
+    data = Storage.read_json(res_file)
+
+    if data.get('dst'):
+        console_logger.debug(f'{res_file} already rendered: {data["dst"]}')
+        return data['dst']
+
+    detections = load_detections(Storage.read_bytes(data['detections']))
+
+    url = Storage.get_download_link(data['source']) if Storage.get_storage() == 's3' else data['source']
+    vidcap, frame_read, image, length, fps, width, height = VideoLoader.read_video(url)
+
+    dst_vid_name = os.path.basename(data['detections']).replace('_detections.npz', '_dst.mp4')
+    current_time_folder = os.path.dirname(res_file)
+    is_streamed = Storage.get_storage() == 's3' and StreamVideoWriter.is_available()
+
+    if is_streamed:
+        # Видео загружается в хранилище по частям во время отрисовки, без временного файла
+        dst = Storage.path_join(current_time_folder, dst_vid_name)
+        out = StreamVideoWriter(Storage.open_stream(dst), float(detections['fps']), width, height)
+    else:
+        dst_folder = current_time_folder if Storage.get_storage() == 'local' else tmp_video_path
+        dst = os.path.join(dst_folder, dst_vid_name)
+        out = cv2.VideoWriter(dst, cv2.VideoWriter_fourcc(*'avc1'), float(detections['fps']), (width, height))
+
+    console_logger.debug(f'Render {data["source"]} to {dst}...')
+    for frame_detections in iter_frame_detections(detections):
+        if not frame_read:
+            break
+
+        out.write(PREDICTOR.annotate(image, frame_detections)[0])
+        frame_read, image = vidcap.read()
+
+    is_released = out.release()
+    vidcap.release()
+
+    if is_streamed:
+        if not is_released:
+            raise InternalServerError(f'{dst} is not streamed')
+    elif Storage.get_storage() == 's3':
+        remote_dst = Storage.path_join(current_time_folder, dst_vid_name)
+
+        if not Storage.upload_large_file(src=dst, dst=remote_dst):
+            raise InternalServerError(f'{dst} is not uploaded to {remote_dst}')
+
+        os.remove(dst)
+        dst = remote_dst
+
+    data['dst'] = dst
+    data['render'] = 'done'
+    Storage.save_json(res_file, data)
+    console_logger.debug(f'{res_file} rendered: {dst}')
+
+    return dst
+
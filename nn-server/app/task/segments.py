@@ -0,0 +1,72 @@
+import math
+from typing import Any, NoReturn, Union
+
+import cv2
+
+
+def split_segments(length: int, fps: float, segment_seconds: float) -> list[list[int]]:
+    """
+    :param length: Количество кадров видео
+    :param fps: Частота кадров видео
+    :param segment_seconds: Длительность сегмента в секундах
+    :return: Сегменты [[первый кадр, кадр после последнего], ...]
+
+    Последний сегмент короче половины `segment_seconds` присоединяется к предыдущему
+    """
+
+    segment_frames = max(1, round(segment_seconds * fps))
+    num_segments = max(1, math.ceil(length / segment_frames))
+
+    if num_segments > 1 and length - (num_segments - 1) * segment_frames < segment_frames / 2:
+        num_segments -= 1
+
+    bounds = [i * segment_frames for i in range(num_segments)] + [length]
+
+    return [[start, end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class SegmentCapture:
+    """
+    `cv2.VideoCapture`, который отдает только кадры одного сегмента: после `num_frames` кадров `read`
+    возвращает `(False, None)`, как в конце видео. Поэтому `detect_frames` и `FramePipeline` обрабатывают
+    сегмент без изменений.
+    """
+
+    def __init__(self, vidcap: cv2.VideoCapture, num_frames: Union[int, None]):
+        """
+        :param vidcap: Открытое видео, уже перемотанное на начало сегмента
+        :param num_frames: Сколько кадров еще можно прочитать, None - до конца видео
+        """
+
+        self.vidcap = vidcap
+        self.num_frames = num_frames
+
+    def read(self) -> tuple[bool, Any]:
+        if self.num_frames is not None:
+            if self.num_frames <= 0:
+                return False, None
+
+            self.num_frames -= 1
+
+        return self.vidcap.read()
+
+    def release(self) -> NoReturn:
+        self.vidcap.release()
+
+
+def open_segment(vidcap: cv2.VideoCapture, start: int, end: Union[int, None]) -> tuple[SegmentCapture, bool, Any]:
+    """
+    :param vidcap: Открытое видео
+    :param start: Первый кадр сегмента
+    :param end: Кадр после последнего кадра сегмента, None - до конца видео
+    :return: Видео сегмента, удалось ли прочитать первый кадр сегмента, первый кадр сегмента
+
+    Перемотка по номеру кадра (`CAP_PROP_POS_FRAMES`): декодер начинает с ближайшего ключевого кадра,
+    поэтому первым возвращается именно кадр `start`
+    """
+
+    vidcap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frame_read, image = vidcap.read()
+    capture = SegmentCapture(vidcap, None if end is None else end - start - 1)
+
+    return capture, frame_read, image
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+from typing import Any, Callable, NoReturn, Union
+
+import cv2
+import numpy as np
+
+
+class TopKFrames:
+    """
+    K кадров видео с наибольшим количеством обнаружений (очаги заражения).
+
+    Кандидаты хранятся в min-heap по количеству обнаружений, поэтому проверка нового кадра - O(1), а замена - O(log K).
+    Кадры хранятся сжатыми (JPEG/WebP, при необходимости уменьшенными), а не декодированными массивами.
+    Временное подавление немаксимумов (`min_gap`) не дает выбрать K кадров одной и той же секунды видео:
+    из близких по времени кадров остается кадр с большим количеством обнаружений.
+    """
+
+    def __init__(self,
+                 k: int = 10,
+                 min_gap: float = 1.0,
+                 image_format: str = '.jpg',
+                 quality: int = 90,
+                 max_side: Union[int, None] = 1920,
+                 ):
+        """
+        :param k: Сколько кадров хранить
+        :param min_gap: Минимальное расстояние между выбранными кадрами в секундах, 0 - без подавления
+        :param image_format: Формат сжатия .jpg/.webp
+        :param quality: Качество сжатия 0..100
+        :param max_side: Кадры, у которых большая сторона больше `max_side`, уменьшаются, None - не уменьшать
+        """
+
+        self.k = k
+        self.min_gap = min_gap
+        self.image_format = image_format
+        self.max_side = max_side
+
+        quality_flag = cv2.IMWRITE_WEBP_QUALITY if image_format == '.webp' else cv2.IMWRITE_JPEG_QUALITY
+        self._encode_params = [quality_flag, quality]
+
+        # (score, порядковый номер, time_code, labels, сжатый кадр), порядковый номер разрешает равенство score
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def offer(self,
+              score: int,
+              frame: np.ndarray,
+              labels: list[str],
+              time_code: float,
+              prepare: Union[Callable[[np.ndarray], np.ndarray], None] = None,
+              ) -> bool:
+        """
+        :param score: Количество обнаружений на кадре
+        :param frame: Кадр
+        :param labels: Метки обнаруженных классов
+        :param time_code: Время кадра в секундах
+        :param prepare: Вызывается для принятого кадра перед сжатием (например, отрисовка bbox)
+        :return: Принят ли кадр
+
+        Кадр сжимается, только если он попадает в K лучших
+        """
+
+        return self._push(score, time_code, labels, lambda: self._encode(prepare(frame) if prepare else frame))
+
+    def offer_encoded(self, score: int, image: Any, labels: list[str], time_code: float) -> bool:
+        """
+        :param score: Количество обнаружений на кадре
+        :param image: Уже сжатый кадр или путь до него (выбор K лучших из кадров, отобранных по частям видео)
+        :param labels: Метки обнаруженных классов
+        :param time_code: Время кадра в секундах
+        :return: Принят ли кадр
+        """
+
+        return self._push(score, time_code, labels, lambda: image)
+
+    def _push(self, score: int, time_code: float, labels: list[str], get_image: Callable[[], Any]) -> bool:
+        """
+        :param score: Количество обнаружений на кадре
+        :param time_code: Время кадра в секундах
+        :param labels: Метки обнаруженных классов
+        :param get_image: Возвращает сохраняемый кадр, вызывается, только если кадр принят
+        :return: Принят ли кадр
+        """
+
+        # Кадр не лучше худшего из K - он не может вытеснить и соседний по времени кадр, у которого score не меньше
+        if len(self._heap) >= self.k and score <= self._heap[0][0]:
+            return False
+
+        # Выбранные кадры, ближе `min_gap` по времени, заменяются новым кадром, только если он лучше каждого из них
+        neighbours = [item for item in self._heap if abs(item[2] - time_code) < self.min_gap]
+
+        if neighbours and score <= max(item[0] for item in neighbours):
+            return False
+
+        item = (score, next(self._counter), time_code, labels, get_image())
+
+        if neighbours:
+            self._heap = [i for i in self._heap if abs(i[2] - time_code) >= self.min_gap]
+            heapq.heapify(self._heap)
+
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+
+        return True
+
+    def _encode(self, frame: np.ndarray) -> bytes:
+        """
+        :param frame: Кадр
+        :return: Сжатый (и при необходимости уменьшенный) кадр
+        """
+
+        height, width = frame.shape[:2]
+
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        return cv2.imencode(self.image_format, frame, self._encode_params)[1].tobytes()
+
+    def items(self) -> list[tuple[float, list[str], bytes]]:
+        """
+        :return: Выбранные кадры по возрастанию времени: (time_code, labels, сжатый кадр)
+        """
+
+        return [(time_code, labels, image) for _, _, time_code, labels, image in sorted(self._heap, key=lambda x: x[2])]
+
+    def clear(self) -> NoReturn:
+        self._heap.clear()
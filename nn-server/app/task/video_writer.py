@@ -0,0 +1,305 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from typing import NoReturn, Union
+
+from kallosus_packages.over_logging import GetTraceback, Logger
+from numpy import ndarray
+
+from path_definitions import tmp_video_path
+from storage.stream import MultipartStream
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+
+class StreamVideoWriter:
+    """
+    Замена `cv2.VideoWriter`, которая кодирует кадры процессом ffmpeg и сразу загружает закодированное видео
+    в хранилище (`MultipartStream`) без временного файла.
+
+    ffmpeg пишет fragmented MP4 в stdout: обычный MP4 записывает индекс (`moov`) в конце файла и требует
+    перемотки, а fragmented MP4 пишется последовательно. Части видео загружаются, пока модель обрабатывает
+    следующие кадры, поэтому после обработки остается дождаться только последней части, а на диске видео
+    не занимает места.
+    """
+
+    _CHUNK_SIZE = 1024 ** 2  # Сколько байт читать из stdout ffmpeg за раз
+
+    def __init__(self, stream: MultipartStream, fps: float, width: int, height: int):
+        """
+        :param stream: Куда загружается видео (`StorageApi.open_stream`)
+        :param fps: Частота кадров
+        :param width: Ширина кадра
+        :param height: Высота кадра
+        """
+
+        self.stream = stream
+        self.error: Union[Exception, None] = None
+
+        self._log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [
+                shutil.which('ffmpeg'), '-loglevel', 'error', '-y',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+                '-an', '-c:v', 'libx264', '-preset', os.getenv('PD_STREAM_PRESET', 'veryfast'), '-pix_fmt', 'yuv420p',
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',  # yuv420p требует четные размеры кадра
+                '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+                '-f', 'mp4', 'pipe:1',
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._log,
+        )
+
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        :return: Можно ли загружать видео потоком: установлен ffmpeg и потоковая загрузка не выключена
+        `PD_STREAM_UPLOAD=0`
+        """
+
+        return os.getenv('PD_STREAM_UPLOAD', '1') == '1' and shutil.which('ffmpeg') is not None
+
+    def write(self, frame: ndarray) -> NoReturn:
+        """
+        :param frame: Кадр BGR размера `width`x`height`
+        :return: `NoReturn`
+        """
+
+        if self.error is not None:
+            return
+
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, OSError) as e:  # ffmpeg завершился с ошибкой
+            self.error = e
+
+    def _read(self) -> NoReturn:
+        # stdout читается до конца даже после ошибки загрузки, иначе ffmpeg заблокируется на записи в полный pipe
+        while chunk := self.process.stdout.read(self._CHUNK_SIZE):
+            if self.error is not None:
+                continue
+
+            try:
+                self.stream.write(chunk)
+            except Exception as e:
+                self.error = e
+
+    def release(self) -> bool:
+        """
+        Дожидается кодирования последних кадров и завершает загрузку
+
+        :return: Загружено ли видео
+        """
+
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError) as e:
+            self.error = self.error or e
+
+        return_code = self.process.wait()
+        self._reader.join()
+        self.process.stdout.close()
+
+        if return_code != 0 or self.error is not None:
+            self._log.seek(0)
+            console_logger.error(f'Video is not streamed to {self.stream.dst}: ffmpeg exit code {return_code}, '
+                                 f'{self.error}, {self._log.read().decode(errors="replace").strip()}')
+            self._log.close()
+            self.stream.abort()
+
+            return False
+
+        self._log.close()
+
+        return self.stream.close()
+
+
+class HlsVideoWriter:
+    """
+    Замена `cv2.VideoWriter`, которая записывает видео как HLS: ffmpeg режет закодированное видео на сегменты
+    fragmented MP4 по `segment_seconds` и обновляет плейлист, а каждый готовый сегмент сразу загружается в хранилище.
+
+    Сегменты загружаются раньше плейлиста, поэтому плейлист в хранилище ссылается только на загруженные сегменты,
+    и видео можно смотреть, пока обработка продолжается (`PreviewApi`). Плейлист имеет тип EVENT: сегменты
+    только добавляются, а после последнего кадра в него записывается `#EXT-X-ENDLIST`.
+    Загруженный сегмент удаляется с диска и больше не загружается, незагруженный - загружается при следующей
+    синхронизации, поэтому ошибка загрузки одного сегмента не требует загружать видео заново.
+    """
+
+    def __init__(self,
+                 storage,
+                 current_time_folder: str,
+                 name: str,
+                 fps: float,
+                 width: int,
+                 height: int,
+                 segment_seconds: float = float(os.getenv('PD_HLS_SEGMENT_SECONDS', 4)),
+                 sync_interval: float = 1.0,
+                 ):
+        """
+        :param storage: `StorageApi`, в который загружается видео
+        :param current_time_folder: Папка в хранилище, куда загружаются плейлист и сегменты
+        :param name: Имя плейлиста без расширения, сегменты называются `{name}_00000.m4s`, ...
+        :param fps: Частота кадров
+        :param width: Ширина кадра
+        :param height: Высота кадра
+        :param segment_seconds: Длительность сегмента в секундах
+        :param sync_interval: Как часто проверять готовые сегменты в секундах
+        """
+
+        self.storage = storage
+        self.current_time_folder = current_time_folder
+        self.playlist = storage.path_join(current_time_folder, f'{name}.m3u8')
+        self.error: Union[Exception, None] = None
+
+        self._folder = tempfile.mkdtemp(prefix='hls_', dir=tmp_video_path)
+        self._local_playlist = os.path.join(self._folder, f'{name}.m3u8')
+        self._uploaded = set()  # Сегменты, уже загруженные в хранилище
+        self._synced_playlist = None  # Последний загруженный плейлист
+
+        self._log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            [
+                shutil.which('ffmpeg'), '-loglevel', 'error', '-y',
+                '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+                '-an', '-c:v', 'libx264', '-preset', os.getenv('PD_STREAM_PRESET', 'veryfast'), '-pix_fmt', 'yuv420p',
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',  # yuv420p требует четные размеры кадра
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',  # Сегменты начинаются с ключевого кадра
+                '-f', 'hls', '-hls_time', str(segment_seconds), '-hls_playlist_type', 'event',
+                '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', f'{name}_init.mp4',
+                '-hls_segment_filename', os.path.join(self._folder, f'{name}_%05d.m4s'),
+                '-hls_flags', 'independent_segments+temp_file',
+                self._local_playlist,
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._log,
+        )
+
+        self._stop = threading.Event()
+        self._syncer = threading.Thread(target=self._run, args=(sync_interval,), daemon=True)
+        self._syncer.start()
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        :return: Установлен ли ffmpeg
+        """
+
+        return shutil.which('ffmpeg') is not None
+
+    @property
+    def is_started(self) -> bool:
+        """
+        :return: Загружен ли плейлист хотя бы с одним сегментом, т.е. можно ли начинать просмотр
+        """
+
+        return self._synced_playlist is not None
+
+    def write(self, frame: ndarray) -> NoReturn:
+        """
+        :param frame: Кадр BGR размера `width`x`height`
+        :return: `NoReturn`
+        """
+
+        if self.error is not None:
+            return
+
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, OSError) as e:  # ffmpeg завершился с ошибкой
+            self.error = e
+
+    def _run(self, sync_interval: float) -> NoReturn:
+        while not self._stop.wait(sync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                get_traceback.error(f'{e}')
+
+    def sync(self) -> bool:
+        """
+        Загружает новые сегменты, а затем плейлист, если он изменился
+
+        :return: Загружен ли текущий плейлист со всеми сегментами
+        """
+
+        try:
+            with open(self._local_playlist, encoding='utf-8') as f:
+                playlist = f.read()
+        except FileNotFoundError:  # Первый сегмент еще не готов
+            return True
+
+        if playlist == self._synced_playlist:
+            return True
+
+        files = re.findall(r'#EXT-X-MAP:URI="([^"]+)"', playlist)
+        files += [line for line in playlist.splitlines() if line and not line.startswith('#')]
+
+        for file in files:
+            if file in self._uploaded:
+                continue
+
+            local_file = os.path.join(self._folder, file)
+
+            with open(local_file, 'rb') as f:
+                data = f.read()
+
+            if not self.storage.write_bytes(self.storage.path_join(self.current_time_folder, file), data):
+                return False
+
+            self._uploaded.add(file)
+            os.remove(local_file)
+
+        if not self.storage.write_bytes(self.playlist, playlist.encode('utf-8')):
+            return False
+
+        self._synced_playlist = playlist
+        console_logger.debug(f'{self.playlist} synced: {len(self._uploaded)} files')
+
+        return True
+
+    def release(self) -> bool:
+        """
+        Дожидается кодирования последних кадров и загружает оставшиеся сегменты и законченный плейлист
+
+        :return: Загружено ли видео
+        """
+
+        try:
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError) as e:
+            self.error = self.error or e
+
+        return_code = self.process.wait()
+        self._stop.set()
+        self._syncer.join()
+
+        is_synced = False
+        for _ in range(3):
+            try:
+                is_synced = self.sync()
+            except Exception as e:
+                get_traceback.error(f'{e}')
+
+            if is_synced:
+                break
+
+        if return_code != 0 or self.error is not None or not is_synced:
+            self._log.seek(0)
+            console_logger.error(f'Video is not streamed to {self.playlist}: ffmpeg exit code {return_code}, '
+                                 f'{self.error}, synced: {is_synced}, '
+                                 f'{self._log.read().decode(errors="replace").strip()}')
+
+        self._log.close()
+        shutil.rmtree(self._folder, ignore_errors=True)
+
+        return return_code == 0 and self.error is None and is_synced
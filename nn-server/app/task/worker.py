@@ -11,12 +11,13 @@ except ImportError:
 
 console_logger.info('Worker libs preload')
 
-queue_name = sys.argv[2] or ['default']
+# Очереди через запятую в порядке приоритета: `pd-task,pd-render` - отрисовка видео только при отсутствии задач
+queue_names = sys.argv[2].split(',') if sys.argv[2] else ['default']
 redis_url = sys.argv[4]
-console_logger.debug(f'qs: {queue_name}, redis_url: {redis_url}')
+console_logger.debug(f'qs: {queue_names}, redis_url: {redis_url}')
 
 redis_url = redis_url
 redis_connection = redis.from_url(redis_url)
 
-worker = Worker([queue_name], connection=redis_connection)
+worker = Worker(queue_names, connection=redis_connection)
 worker.work()
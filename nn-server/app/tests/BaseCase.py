@@ -14,6 +14,7 @@ from storage import local_test_s3_path, remote_test_s3_path
 import shutil
 from typing import Union
 from storage.S3 import StorageApi
+from utils.auth import USERS_CACHE
 
 if os.environ['DATA_STORAGE'] != 's3':
     raise EnvironmentError('DATA_STORAGE must be s3')
@@ -87,6 +88,8 @@ class BaseCase(unittest.TestCase):
                 db.session.commit()
                 console_logger.debug('Users removed')
 
+            USERS_CACHE.clear()  # Пользователи удалены запросом к БД, без сообщения в `User.USERS_CHANNEL`
+
             self.test_user = User(email='test@gmail.com',
                                   password='TEST',
                                   company='Test corp'
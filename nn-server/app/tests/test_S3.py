@@ -23,6 +23,51 @@ class TestS3(BaseCase):
         self.assertEqual(True, is_save)
         self.assertEqual(True, if_exists)
 
+    def test_paths_exist(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем пакетную проверку путей: файлы одной папки (листинг), отдельные файлы и папки (`head_object`)
+        """
+
+        # Given
+        files = [f'test-data/paths_exist_{i}.json' for i in range(3)]
+        for file in files[:2]:
+            Storage.save_json(file, {'key': 1})
+
+        paths = files + ['test-data/', 'test-videos/cars_test.mp4', 'test-videos/not_exists.mp4']
+
+        # When
+        exists = Storage.paths_exist(paths)
+        Storage.rm_file(files[:2])
+
+        # Then
+        self.assertEqual(paths, list(exists))
+        self.assertEqual(Storage.path_exists('test-data/'), exists['test-data/'])
+        self.assertEqual([True, True, False], [exists[file] for file in files])
+        self.assertEqual(True, exists['test-videos/cars_test.mp4'])
+        self.assertEqual(False, exists['test-videos/not_exists.mp4'])
+
+    def test_submit_uploads(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем фоновую загрузку: записи выполняются параллельно, результат и ошибки доступны через `Future`
+        """
+
+        # Given
+        files = [f'test-data/submit_{i}.json' for i in range(3)]
+
+        # When
+        futures = [Storage.submit(Storage.save_json, file, {'key': i}) for i, file in enumerate(files)]
+        failed = Storage.submit(Storage.read_json, 'test-data/not_exists.json')
+        results = [future.result() for future in futures]
+        data = [Storage.read_json(file) for file in files]
+        Storage.rm_file(files)
+
+        # Then
+        self.assertEqual([True, True, True], results)
+        self.assertEqual([{'key': i} for i in range(3)], data)
+        self.assertIsNotNone(failed.exception())
+
     def test_successfully_rm_json_file(self) -> NoReturn:
         file = 'test-data/test.json'
         is_rm = Storage.rm_file([file])
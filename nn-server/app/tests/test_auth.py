@@ -0,0 +1,94 @@
+import time
+from typing import NoReturn
+
+from flask_jwt_extended import create_access_token
+
+from database.models import User
+from resources.errors import UserDoesNotExists
+from tests.BaseCase import BaseCase
+from utils.auth import TTLCache, USERS_CACHE, UsersCacheInvalidator, authenticate
+
+
+class TestTTLCache(BaseCase):
+    def test_lru_eviction(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        При переполнении удаляется самая давно использованная запись
+        """
+
+        # Given
+        cache = TTLCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # When
+        cache.get('a')
+        cache.set('c', 3)
+
+        # Then
+        self.assertEqual(1, cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(3, cache.get('c'))
+        self.assertEqual(2, len(cache))
+
+    def test_expired(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Запись устаревает через `ttl` секунд
+        """
+
+        # Given
+        cache = TTLCache(ttl=0.05)
+        cache.set('a', 1)
+
+        # When
+        time.sleep(0.1)
+
+        # Then
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(0, len(cache))
+
+
+class TestAuthenticate(BaseCase):
+    def test_user_cached(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        После первой проверки пользователь берется из кэша, сообщение об изменении сбрасывает запись
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        # When
+        user_id = authenticate(access_token)
+
+        # Then
+        self.assertEqual(str(self.test_user_id), user_id)
+        self.assertEqual('user', USERS_CACHE.get(user_id))
+
+        # When
+        UsersCacheInvalidator(self.app).invalidate(str(self.test_user_id).encode())
+
+        # Then
+        self.assertIsNone(USERS_CACHE.get(user_id))
+
+    def test_deleted_user(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Удаленный пользователь не проходит проверку, как только запись в кэше сброшена
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+            authenticate(access_token)
+
+            User.find_by_id(self.test_user_id).delete_from_db()
+
+        # When
+        UsersCacheInvalidator(self.app).invalidate(str(self.test_user_id))
+
+        # Then
+        with self.assertRaises(UserDoesNotExists):
+            authenticate(access_token)
@@ -0,0 +1,160 @@
+import os
+from typing import NoReturn
+from unittest.mock import patch
+
+import cv2
+from kallosus_packages.over_logging import Logger
+
+from task import disiases_detection
+from task.backends import BACKENDS, ModelBackend
+from task.disiases_detection import DiseasesDetection
+from task.quantize import box_iou
+from tests.BaseCase import BaseCase, Storage
+
+console_logger = Logger(__file__)
+
+
+class BrokenBackend(ModelBackend):
+    """
+    Backend, модель которого не загружается
+    """
+
+    def load(self, pt_path: str):
+        raise RuntimeError('Export is not supported')
+
+
+class TestBackends(BaseCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Берем несколько кадров тестового видео
+        cls.frames = []
+        cap = cv2.VideoCapture(Storage.get_download_link(cls.test_s3_video))
+
+        while len(cls.frames) < 8:
+            frame_read, frame = cap.read()
+            if not frame_read:
+                break
+            cls.frames.append(frame)
+
+        cap.release()
+
+        cls.reference = DiseasesDetection(backend='torch').detect([frame.copy() for frame in cls.frames])
+
+    def _assert_parity(self, backend: str, min_agreement: float = 0.9, min_iou: float = 0.8) -> NoReturn:
+        """
+        :param backend: Название проверяемого backend
+        :param min_agreement: Минимальная доля обнаружений torch, найденных проверяемым backend
+        :param min_iou: Минимальный IoU, при котором обнаружения считаются совпадающими
+        :return: `NoReturn`
+        """
+
+        if not BACKENDS[backend].is_available():
+            self.skipTest(f'`{backend}` runtime is not installed')
+
+        detections = DiseasesDetection(backend=backend).detect([frame.copy() for frame in self.frames])
+
+        matched, total = 0, 0
+        for reference_frame, frame in zip(self.reference, detections):
+            for reference_box in reference_frame:
+                total += 1
+                matched += any(int(box[5]) == int(reference_box[5]) and box_iou(box, reference_box) >= min_iou
+                               for box in frame)
+
+        agreement = matched / total if total else 1.0
+        console_logger.info(f'{backend}: {matched}/{total} detections match torch')
+
+        self.assertEqual(len(self.frames), len(detections))
+        self.assertGreaterEqual(agreement, min_agreement)
+
+    def test_onnx_parity(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Обнаружения onnxruntime совпадают с PyTorch
+        """
+
+        self._assert_parity('onnx')
+
+    def test_openvino_parity(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Обнаружения OpenVINO совпадают с PyTorch
+        """
+
+        self._assert_parity('openvino')
+
+    def test_batch_matches_single_frame(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Пакетный инференс дает те же классы, что и покадровый
+        """
+
+        predictor = DiseasesDetection(backend='torch')
+        single = [predictor.detect([frame.copy()])[0] for frame in self.frames]
+
+        for batch_frame, single_frame in zip(self.reference, single):
+            self.assertEqual(sorted(int(box[5]) for box in batch_frame), sorted(int(box[5]) for box in single_frame))
+
+    def test_int8_parity(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        INT8 модель (если собрана `task.quantize`) находит большую часть обнаружений FP32
+        """
+
+        if not os.path.exists(BACKENDS['onnx_int8'].artifact_path(DiseasesDetection().get_model())):
+            self.skipTest('INT8 model is not built, run `python -m task.quantize`')
+
+        self._assert_parity('onnx_int8', min_agreement=0.8, min_iou=0.5)
+
+    def test_incorrect_precision(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Неизвестная точность - `ValueError`
+        """
+
+        with self.assertRaises(ValueError):
+            DiseasesDetection(precision='fp16')
+
+    def test_incorrect_backend(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Неизвестный backend - `ValueError`
+        """
+
+        with self.assertRaises(ValueError):
+            DiseasesDetection(backend='fake')
+
+    def test_backend_artifact_cached_next_to_model(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Экспортированная модель лежит рядом с `.pt`
+        """
+
+        pt_path = DiseasesDetection().get_model()
+
+        self.assertEqual(pt_path, BACKENDS['torch'].artifact_path(pt_path))
+        self.assertEqual(pt_path[:-len('.pt')] + '.onnx', BACKENDS['onnx'].artifact_path(pt_path))
+        self.assertTrue(all(BACKENDS[name].artifact_path(pt_path).startswith(pt_path[:-len('.pt')])
+                            for name in BACKENDS))
+
+    def test_fallback_to_torch(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если модель backend не загружается, используется torch, а замена пишется в лог как предупреждение
+        """
+
+        # Given
+        with patch.dict(BACKENDS, {'broken': BrokenBackend('broken', export_format='onnx', artifact_suffix='.onnx')}):
+            predictor = DiseasesDetection(backend='broken')
+
+        # When
+        with patch.object(disiases_detection.console_logger, 'warning') as warning:
+            predictor.load()
+
+        # Then
+        self.assertEqual('torch', predictor.backend.name)
+        self.assertEqual('broken', predictor.fallback_from)
+        self.assertEqual(1, warning.call_count)
+        self.assertIn('broken', warning.call_args[0][0])
+        self.assertEqual(len(self.frames), len(predictor.detect([frame.copy() for frame in self.frames])))
@@ -0,0 +1,128 @@
+import json
+import pickle
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import NoReturn, Union
+
+from migrations.backfill import LIST_COLUMNS, backfill, count_pending
+from tests.BaseCase import BaseCase
+
+
+class FakeTaskTable:
+    """
+    Таблица `task` до переключения на JSONB: выполняет запросы `migrations.backfill` над строками в памяти
+    """
+
+    def __init__(self, statuses: list[str]):
+        """
+        :param statuses: Статусы задач, `id` задач начинаются с 1
+        """
+
+        self.rows = {task_id: {'status': status,
+                               **{column: pickle.dumps([f'{column}_{task_id}']) for column in LIST_COLUMNS},
+                               'is_files_upload': json.dumps({'file': task_id}),
+                               'queue_files_jsonb': None,
+                               }
+                     for task_id, status in enumerate(statuses, start=1)}
+        self.selects = []  # (after_id, id строк) каждого SELECT порции
+        self.fail_on_update = None  # Номер UPDATE, на котором перенос прерывается
+        self.updates = 0
+
+    def execute(self, query, params: Union[dict, list[dict], None] = None) -> SimpleNamespace:
+        sql = str(query)
+
+        if sql.startswith('SELECT count(*)'):
+            return SimpleNamespace(scalar=lambda: sum(row['queue_files_jsonb'] is None for row in self.rows.values()))
+
+        if sql.startswith('SELECT'):
+            rows = [SimpleNamespace(id=task_id, **row) for task_id, row in sorted(self.rows.items())
+                    if task_id > params['after_id']
+                    and (row['queue_files_jsonb'] is None or row['status'] in params.get('active', []))]
+            rows = rows[:params['chunk_size']]
+            self.selects.append((params['after_id'], [row.id for row in rows]))
+
+            return SimpleNamespace(fetchall=lambda: rows)
+
+        self.updates += 1
+        if self.updates == self.fail_on_update:
+            raise ConnectionError('Connection lost')
+
+        for update in params:
+            row = self.rows[update['id']]
+            for column in LIST_COLUMNS + ['is_files_upload']:
+                row[f'{column}_jsonb'] = update[column]
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+
+class TestBackfill(BaseCase):
+    def test_chunks(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Строки переносятся порциями по `id`, последняя порция неполная
+        """
+
+        # Given
+        table = FakeTaskTable(['done'] * 7)
+
+        # When
+        after_ids = list(backfill(table.begin, chunk_size=3))
+
+        # Then
+        self.assertEqual([3, 6, 7], after_ids)
+        self.assertEqual([(0, [1, 2, 3]), (3, [4, 5, 6]), (6, [7]), (7, [])], table.selects)
+        self.assertEqual(0, count_pending(table))
+        self.assertEqual(json.dumps(['queue_files_7']), table.rows[7]['queue_files_jsonb'])
+        self.assertEqual(json.dumps({'file': 7}), table.rows[7]['is_files_upload_jsonb'])
+
+    def test_resume_after_id(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Прерванный перенос сохраняет перенесенные порции и продолжается с `after_id` последней из них
+        """
+
+        # Given
+        table = FakeTaskTable(['done'] * 7)
+        table.fail_on_update = 2
+        after_ids = []
+
+        with self.assertRaises(ConnectionError):
+            for after_id in backfill(table.begin, chunk_size=3):
+                after_ids.append(after_id)
+
+        self.assertEqual([3], after_ids)
+        self.assertEqual(4, count_pending(table))
+
+        # When
+        table.selects = []
+        after_ids = list(backfill(table.begin, chunk_size=3, after_id=after_ids[-1]))
+
+        # Then
+        self.assertEqual([6, 7], after_ids)
+        self.assertEqual([(3, [4, 5, 6]), (6, [7]), (7, [])], table.selects)
+        self.assertEqual(0, count_pending(table))
+
+    def test_restart_skips_backfilled_rows(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Повторный запуск с начала переносит только новые строки, а с `refresh_active` - и задачи в queue/run
+        """
+
+        # Given
+        table = FakeTaskTable(['done', 'run', 'done', 'queue'])
+        list(backfill(table.begin, chunk_size=2))
+        table.rows[5] = FakeTaskTable(['done'] * 5).rows[5]  # Задача, созданная во время переноса
+
+        # When
+        table.selects = []
+        list(backfill(table.begin, chunk_size=2))
+        restarted = table.selects
+
+        table.selects = []
+        list(backfill(table.begin, chunk_size=2, refresh_active=True))
+
+        # Then
+        self.assertEqual([(0, [5]), (5, [])], restarted)
+        self.assertEqual([(0, [2, 4]), (4, [])], table.selects)
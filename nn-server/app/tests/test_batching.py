@@ -0,0 +1,177 @@
+import os
+from types import SimpleNamespace
+from typing import NoReturn
+
+import cv2
+import numpy as np
+
+from path_definitions import tmp_path
+from task.disiases_detection import DiseasesDetection
+from task.frame_selector import FrameSelector
+from task.predict import VideoProcessor
+from tests.BaseCase import BaseCase
+
+NUM_FRAMES = 10
+
+
+class StubModel:
+    """
+    Модель, обнаружения которой зависят только от кадра: класс равен яркости кадра / 8,
+    второе обнаружение ниже порога и должно быть отфильтровано
+    """
+
+    def __init__(self):
+        self.batches = []  # Размеры пачек, переданных в `predict`
+
+    def predict(self, images: list[np.ndarray], conf: float, verbose: bool) -> list:
+        self.batches.append(len(images))
+
+        return [SimpleNamespace(boxes=SimpleNamespace(data=np.array([[1, 2, 30, 40, 0.9, round(image.mean() / 8)],
+                                                                     [5, 5, 10, 10, 0.1, 0]])))
+                for image in images]
+
+
+def stub_predictor() -> DiseasesDetection:
+    """
+    :return: `DiseasesDetection` со `StubModel` вместо загруженной модели
+    """
+
+    predictor = DiseasesDetection()
+    predictor.model = StubModel()
+    predictor.class_names_dict = {class_id: f'class_{class_id}' for class_id in range(NUM_FRAMES)}
+
+    return predictor
+
+
+def make_frame(frame_no: int) -> np.ndarray:
+    """
+    :param frame_no: Номер кадра
+    :return: Кадр, яркость которого равна номеру * 8
+    """
+
+    return np.full((64, 64, 3), frame_no * 8, dtype=np.uint8)
+
+
+class TestPredictBatch(BaseCase):
+    def test_batch_matches_single_frames(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        `predict_batch` дает для каждого кадра те же обнаружения и ту же разметку, что и `predict` по одному кадру,
+        а модель вызывается один раз на всю пачку
+        """
+
+        # Given
+        predictor = stub_predictor()
+        frames = [make_frame(frame_no) for frame_no in range(NUM_FRAMES)]
+
+        # When
+        batch = predictor.predict_batch([frame.copy() for frame in frames])
+        single = [predictor.predict(frame.copy()) for frame in frames]
+
+        # Then
+        self.assertEqual([NUM_FRAMES] + [1] * NUM_FRAMES, predictor.model.batches)
+
+        for (batch_image, batch_indices, batch_labels), (image, indices, labels) in zip(batch, single):
+            self.assertEqual(indices, batch_indices)
+            self.assertEqual(labels, batch_labels)
+            self.assertTrue(np.array_equal(image, batch_image))
+
+
+class TestDetectFrames(BaseCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.video_path = os.path.join(tmp_path, 'test_batching.avi')
+        out = cv2.VideoWriter(cls.video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 64))
+        for frame_no in range(NUM_FRAMES):
+            out.write(make_frame(frame_no))
+        out.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.video_path)
+
+        super().tearDownClass()
+
+    def _detect_frames(self, batch_size: int, execution_mode: str) -> tuple[list[int], list[tuple[int, list[int]]]]:
+        """
+        :param batch_size: Размер пачки кадров
+        :param execution_mode: sequential/pipeline
+        :return: Размеры пачек, переданных в модель, и (номер кадра, классы обнаружений) каждого обработанного кадра
+        """
+
+        processor = VideoProcessor([], [], batch_size=batch_size, execution_mode=execution_mode)
+        processor.predictor = stub_predictor()
+
+        handled = []
+        processor.handle_frame = lambda count, length, fps, frame, detections, out: handled.append(
+            (count, [int(box[5]) for box in detections]))
+
+        vidcap = cv2.VideoCapture(self.video_path)
+        frame_read, image = vidcap.read()
+        detect_frames = processor.detect_frames if execution_mode == 'sequential' else processor.detect_frames_pipelined
+        detect_frames(vidcap, frame_read, image, NUM_FRAMES, 10, None)
+        vidcap.release()
+
+        return processor.predictor.model.batches, handled
+
+    def test_last_partial_batch(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если количество кадров не делится на размер пачки, последние кадры обрабатываются неполной пачкой,
+        результаты совпадают с покадровой обработкой
+        """
+
+        # When
+        _, single = self._detect_frames(batch_size=1, execution_mode='sequential')
+        batches, batched = self._detect_frames(batch_size=4, execution_mode='sequential')
+
+        # Then
+        self.assertEqual([4, 4, 2], batches)
+        self.assertEqual([(frame_no, [frame_no]) for frame_no in range(NUM_FRAMES)], single)
+        self.assertEqual(single, batched)
+
+    def test_pipeline_matches_sequential(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        В режиме pipeline кадры обрабатываются с теми же обнаружениями, включая неполную последнюю пачку
+        """
+
+        # When
+        _, sequential = self._detect_frames(batch_size=4, execution_mode='sequential')
+        batches, pipelined = self._detect_frames(batch_size=4, execution_mode='pipeline')
+
+        # Then
+        self.assertEqual(NUM_FRAMES, sum(batches))
+        self.assertEqual(sequential, pipelined)
+
+    def test_checkpoint_selector_stats(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Кадры отбираются раньше, чем учитываются, но для чекпоинта кадра счетчики отбора кадров включают только
+        кадры до него включительно
+        """
+
+        for execution_mode in ['sequential', 'pipeline']:
+            with self.subTest(execution_mode=execution_mode):
+                # Given
+                processor = VideoProcessor([], [], batch_size=4, execution_mode=execution_mode)
+                processor.predictor = stub_predictor()
+                processor.frame_selector = FrameSelector(sample_stride=2)
+
+                handled = []
+                processor.handle_frame = lambda count, length, fps, frame, detections, out: handled.append(
+                    dict(processor.handled_selector_stats))
+
+                # When
+                vidcap = cv2.VideoCapture(self.video_path)
+                frame_read, image = vidcap.read()
+                detect_frames = (processor.detect_frames if execution_mode == 'sequential'
+                                 else processor.detect_frames_pipelined)
+                detect_frames(vidcap, frame_read, image, NUM_FRAMES, 10, None)
+                vidcap.release()
+
+                # Then
+                self.assertEqual([{'frames_inferred': count // 2 + 1, 'frames_reused': (count + 1) // 2}
+                                  for count in range(NUM_FRAMES)], handled)
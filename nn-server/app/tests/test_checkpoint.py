@@ -0,0 +1,87 @@
+from typing import NoReturn
+
+import numpy as np
+from rq import Queue
+from rq.registry import StartedJobRegistry
+
+from task.checkpoint import Checkpoint
+from task.detections import DetectionsRecorder
+from task.fan_out import FanOut
+from task.reaper import JobReaper
+from task.top_k import TopKFrames
+from tests.BaseCase import BaseCase
+
+
+class TestCheckpoint(BaseCase):
+    def test_save_and_load(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Чекпоинт восстанавливает номер кадра, обнаружения и K лучших кадров
+        """
+
+        # Given
+        checkpoint = Checkpoint(task_id=-1, connection=self.app.redis, interval=0)
+        recorder = DetectionsRecorder(fps=10, width=64, height=64, class_names={0: 'healthy', 1: 'rust'})
+        top_frames = TopKFrames(k=2, min_gap=0)
+
+        for frame_no in range(20):
+            recorder.add(frame_no, [[0, 0, 10, 10, 0.5, 1]])
+            top_frames.offer(frame_no % 3, np.zeros((64, 64, 3), dtype=np.uint8), ['rust'] * (frame_no % 3),
+                             frame_no / 10)
+
+        # When
+        checkpoint.save({'video_no': 0, 'next_frame': 20}, recorder, top_frames)
+        resume = checkpoint.load()
+        checkpoint.clear()
+
+        # Then
+        self.assertEqual(20, resume['next_frame'])
+        self.assertEqual(list(range(20)), resume['detections']['frame'].tolist())
+        self.assertEqual([(t, labels, image) for t, labels, image in top_frames.items()], resume['top_frames'])
+        self.assertIsNone(checkpoint.load())
+
+    def test_resumed_job_reclaims_parts(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Задача, повторно запущенная с тем же id, снова получает свои необработанные части
+        """
+
+        # Given
+        fan_out = FanOut('test-resume', 2, self.app.redis)
+        self.assertEqual(0, fan_out.claim_next('parent'))
+
+        # When
+        part_no = fan_out.claim_next('parent')
+        fan_out.set_result(0, {})
+        next_part_no = fan_out.claim_next('parent')
+        fan_out.cleanup()
+
+        # Then
+        self.assertEqual(0, part_no)
+        self.assertEqual(1, next_part_no)
+
+
+class TestJobReaper(BaseCase):
+    def test_requeue_orphaned_job(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Задача, начатая воркером, которого больше нет, возвращается в начало очереди
+        """
+
+        # Given: отдельная очередь, чтобы задачу не взял тестовый воркер
+        queue = Queue('pd-test-reaper', connection=self.app.redis)
+        job = queue.enqueue('task.predict.predict_on_video', [], [], meta={'task_id': -1})
+        queue.remove(job)
+        registry = StartedJobRegistry(queue=queue)
+        registry.add(job, -1)
+        job.set_status('started')
+
+        # When
+        requeued = JobReaper.requeue_orphaned_jobs([queue])
+
+        # Then
+        self.assertEqual([job.get_id()], requeued)
+        self.assertEqual([job.get_id()], queue.get_job_ids())
+        self.assertEqual([], registry.get_job_ids())
+
+        queue.empty()
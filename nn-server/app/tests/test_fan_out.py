@@ -0,0 +1,77 @@
+from typing import NoReturn
+
+from rq import Queue
+
+from task.fan_out import FanOut
+from tests.BaseCase import BaseCase
+
+
+class TestFanOut(BaseCase):
+    def setUp(self) -> NoReturn:
+        self.fan_out = FanOut('test-parent', 3, self.app.redis)
+
+    def tearDown(self) -> NoReturn:
+        self.fan_out.cleanup()
+
+    def test_part_claimed_once(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Часть может взять только одна задача, родительская задача берет оставшиеся части по порядку
+        (следующую - после обработки предыдущей)
+        """
+
+        # Given
+        self.assertTrue(self.fan_out.claim(1, 'child-1'))
+
+        # When
+        claimed_twice = self.fan_out.claim(1, 'parent')
+        parent_parts = []
+
+        while (part_no := self.fan_out.claim_next('parent')) is not None:
+            parent_parts.append(part_no)
+            self.fan_out.set_result(part_no, {})
+
+        # Then
+        self.assertFalse(claimed_twice)
+        self.assertEqual([0, 2], parent_parts)
+
+    def test_results_and_progress(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Результаты частей собираются по номерам, прогресс считается по всем частям
+        """
+
+        # Given
+        self.fan_out.set_result(0, {'res_json_files': ['0.json']})
+        self.fan_out.set_result(2, {'res_json_files': ['2.json']})
+
+        # When
+        progress = self.fan_out.progress({1: 40})
+        self.fan_out.set_result(1, {'res_json_files': ['1.json']})
+        results = self.fan_out.wait(lambda: None)
+
+        # Then
+        self.assertEqual(80, progress)
+        self.assertEqual(['0.json', '1.json', '2.json'], [results[i]['res_json_files'][0] for i in range(3)])
+
+    def test_stop_children(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        При остановке задачи отменяются дочерние задачи частей и дочерние задачи сегментов этих частей
+        """
+
+        # Given: отдельная очередь, чтобы задачи не взял тестовый воркер
+        queue = Queue('pd-test-stop', connection=self.app.redis)
+        parts = self.fan_out.enqueue(queue, 'task.predict.predict_video_part', {'task_id': -1}, [], [])
+        segments_fan_out = FanOut(f'{parts[0].get_id()}:0', 2, self.app.redis)
+        segments = segments_fan_out.enqueue(queue, 'task.predict.predict_video_segment', {'task_id': -1}, [], [])
+
+        # When
+        stopped = FanOut.stop_children('test-parent', self.app.redis)
+
+        # Then
+        self.assertEqual({job.get_id() for job in parts + segments}, set(stopped))
+        self.assertTrue(all(job.get_status(refresh=True) == 'canceled' for job in parts + segments))
+
+        segments_fan_out.cleanup()
+        queue.empty()
@@ -0,0 +1,137 @@
+from typing import NoReturn
+
+import numpy as np
+
+from task.frame_selector import FrameSelector
+from tests.BaseCase import BaseCase
+
+
+def make_frame(brightness: int) -> np.ndarray:
+    """
+    :param brightness: Яркость кадра
+    :return: Однотонный кадр BGR
+    """
+
+    return np.full((72, 128, 3), brightness, dtype=np.uint8)
+
+
+def select(selector: FrameSelector, frames: list[np.ndarray]) -> list[bool]:
+    """
+    :param selector: `FrameSelector`
+    :param frames: Кадры видео по порядку
+    :return: Для каждого кадра, запускается ли на нем модель
+    """
+
+    return [selector.should_infer(count, frame) for count, frame in enumerate(frames)]
+
+
+def carry_forward(is_inferred: list[bool]) -> list[int]:
+    """
+    :param is_inferred: Запускается ли модель на каждом кадре
+    :return: Для каждого кадра номер кадра, чьи обнаружения используются (как в `VideoProcessor.detect_frames`)
+    """
+
+    sources = []
+    for count, is_frame_inferred in enumerate(is_inferred):
+        sources.append(count if is_frame_inferred else sources[-1])
+
+    return sources
+
+
+class TestFrameSelector(BaseCase):
+    def test_stride_carry_forward(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Модель запускается на каждом `sample_stride` кадре, пропущенные кадры получают обнаружения
+        последнего обработанного кадра
+        """
+
+        # Given
+        selector = FrameSelector(sample_stride=3)
+
+        # When
+        is_inferred = select(selector, [make_frame(count) for count in range(10)])
+
+        # Then
+        self.assertEqual([count % 3 == 0 for count in range(10)], is_inferred)
+        self.assertEqual([0, 0, 0, 3, 3, 3, 6, 6, 6, 9], carry_forward(is_inferred))
+
+    def test_counts(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        `frames_inferred` + `frames_reused` равно количеству кадров
+        """
+
+        # Given
+        selector = FrameSelector(sample_stride=4)
+
+        # When
+        is_inferred = select(selector, [make_frame(count) for count in range(23)])
+
+        # Then
+        self.assertEqual({'frames_inferred': 6, 'frames_reused': 17}, selector.json())
+        self.assertEqual(sum(is_inferred), selector.frames_inferred)
+        self.assertEqual(23, selector.frames_inferred + selector.frames_reused)
+
+    def test_stride_from_target_fps(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Шаг выборки вычисляется из `target_fps`, а `sample_stride` имеет приоритет
+        """
+
+        self.assertEqual(5, FrameSelector.from_options(fps=25, target_fps=5).sample_stride)
+        self.assertEqual(2, FrameSelector.from_options(fps=25, sample_stride=2, target_fps=5).sample_stride)
+        self.assertEqual(1, FrameSelector.from_options(fps=0, target_fps=5).sample_stride)
+
+    def test_diff_gate_reuses_static_frames(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Детектор diff переиспользует обнаружения на почти не изменившихся кадрах и запускает модель при смене сцены
+        """
+
+        # Given: 5 одинаковых кадров, смена сцены, еще 4 кадра новой сцены с небольшим шумом
+        selector = FrameSelector(frame_gate='diff')
+        frames = [make_frame(50)] * 5 + [make_frame(200)] + [make_frame(200 + count % 2) for count in range(4)]
+
+        # When
+        is_inferred = select(selector, frames)
+
+        # Then
+        self.assertEqual([True] + [False] * 4 + [True] + [False] * 4, is_inferred)
+        self.assertEqual([0, 0, 0, 0, 0, 5, 5, 5, 5, 5], carry_forward(is_inferred))
+        self.assertEqual(10, selector.frames_inferred + selector.frames_reused)
+
+    def test_phash_gate_reuses_static_frames(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Детектор phash переиспользует обнаружения на том же кадре и запускает модель на другом изображении
+        """
+
+        # Given: кадр, тот же кадр, он же чуть ярче, затем другой кадр
+        scene = np.random.default_rng(0).integers(0, 250, (72, 128, 3), dtype=np.uint8)
+        other_scene = np.random.default_rng(1).integers(0, 250, (72, 128, 3), dtype=np.uint8)
+        frames = [scene, scene, scene + 5, other_scene]
+        selector = FrameSelector(frame_gate='phash')
+
+        # When
+        is_inferred = select(selector, frames)
+
+        # Then
+        self.assertEqual([True, False, False, True], is_inferred)
+
+    def test_max_reused_forces_refresh(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        На статичном видео модель принудительно запускается раз в `max_reused` кадров (5 секунд видео)
+        """
+
+        # Given
+        selector = FrameSelector.from_options(fps=2, frame_gate='diff')
+
+        # When
+        is_inferred = select(selector, [make_frame(100)] * 25)
+
+        # Then
+        self.assertEqual(10, selector.max_reused)
+        self.assertEqual([0, 11, 22], [count for count, is_frame_inferred in enumerate(is_inferred)
+                                       if is_frame_inferred])
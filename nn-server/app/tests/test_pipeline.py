@@ -0,0 +1,209 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NoReturn
+
+import cv2
+import numpy as np
+
+from path_definitions import tmp_path
+from task.pipeline import FramePipeline
+from tests.BaseCase import BaseCase
+
+NUM_FRAMES = 30
+
+
+def frame_no(image: np.ndarray) -> int:
+    """
+    :param image: Кадр тестового видео
+    :return: Номер кадра (яркость кадра равна номеру * 8)
+    """
+
+    return int(round(image.mean() / 8))
+
+
+def detect(images: list[np.ndarray]) -> list[list[list[float]]]:
+    """
+    :param images: Кадры
+    :return: Одно обнаружение на кадр, класс обнаружения равен номеру кадра
+    """
+
+    return [[[0, 0, 10, 10, 0.9, frame_no(image)]] for image in images]
+
+
+class BrokenCapture:
+    """
+    `cv2.VideoCapture`, который падает после нескольких кадров
+    """
+
+    def __init__(self, frames: int):
+        """
+        :param frames: Сколько кадров прочитать до ошибки
+        """
+
+        self.frames = frames
+
+    def read(self) -> tuple[bool, np.ndarray]:
+        if self.frames == 0:
+            raise RuntimeError('Decode error')
+
+        self.frames -= 1
+
+        return True, np.zeros((64, 64, 3), dtype=np.uint8)
+
+
+class TestFramePipeline(BaseCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Яркость кадра равна его номеру
+        cls.video_path = os.path.join(tmp_path, 'test_pipeline.avi')
+        out = cv2.VideoWriter(cls.video_path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 64))
+        for count in range(NUM_FRAMES):
+            out.write(np.full((64, 64, 3), count * 8, dtype=np.uint8))
+        out.release()
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.video_path)
+
+        super().tearDownClass()
+
+    def _pipeline(self, consume, **kwargs) -> FramePipeline:
+        vidcap = cv2.VideoCapture(self.video_path)
+        self.addCleanup(vidcap.release)
+        frame_read, image = vidcap.read()
+
+        return FramePipeline(vidcap, frame_read, image, consume=consume, **{'detect': detect, **kwargs})
+
+    @staticmethod
+    def _run(pipeline: FramePipeline, timeout: float = 30) -> dict:
+        """
+        :param pipeline: Конвейер
+        :param timeout: Сколько ждать завершения конвейера, `TimeoutError` - конвейер завис
+        :return: Статистика конвейера, ошибка стадии пробрасывается
+        """
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(pipeline.run).result(timeout=timeout)
+
+    def test_frames_in_order(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Кадры передаются в `consume` по порядку, каждый со своими обнаружениями, и при неполной последней пачке
+        """
+
+        # Given
+        consumed = []
+        pipeline = self._pipeline(lambda count, image, detections: consumed.append((count, frame_no(image),
+                                                                                    detections[0][5])),
+                                  batch_size=4,
+                                  queue_size=4,
+                                  )
+
+        # When
+        stats = self._run(pipeline)
+
+        # Then
+        self.assertEqual([(count, count, count) for count in range(NUM_FRAMES)], consumed)
+        self.assertEqual(NUM_FRAMES, stats['stages']['infer']['items'])
+        self.assertEqual(NUM_FRAMES, stats['stages']['encode']['items'])
+
+    def test_skipped_frames_reuse_detections(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Кадры, не отобранные `select`, получают обнаружения последнего отобранного кадра
+        """
+
+        # Given
+        consumed = []
+        pipeline = self._pipeline(lambda count, image, detections: consumed.append(detections[0][5]),
+                                  batch_size=2,
+                                  select=lambda count, image: count % 3 == 0,
+                                  )
+
+        # When
+        stats = self._run(pipeline)
+
+        # Then
+        self.assertEqual([count - count % 3 for count in range(NUM_FRAMES)], consumed)
+        self.assertEqual(NUM_FRAMES // 3, stats['stages']['infer']['items'])
+
+    def test_backpressure(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        При медленном кодировании декодирование не уходит вперед больше, чем вмещают очереди
+        """
+
+        # Given
+        queue_size = 2
+        ahead = []
+        pipeline = None
+
+        def consume(count: int, image: np.ndarray, detections: list) -> NoReturn:
+            time.sleep(0.01)
+            ahead.append(pipeline.stats['decode'].items - count)
+
+        pipeline = self._pipeline(consume, batch_size=1, queue_size=queue_size)
+
+        # When
+        self._run(pipeline)
+
+        # Then: кадры в двух очередях, по кадру в каждой стадии и кадр, который декодер пытается положить
+        self.assertLessEqual(max(ahead), 2 * queue_size + 3)
+
+    def test_encode_error(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Ошибка записи кадра останавливает все стадии и пробрасывается из `run`
+        """
+
+        # Given
+        def consume(count: int, image: np.ndarray, detections: list) -> NoReturn:
+            if count == 5:
+                raise IOError('Writer error')
+
+        pipeline = self._pipeline(consume, queue_size=2)
+
+        # When, Then
+        with self.assertRaisesRegex(IOError, 'Writer error'):
+            self._run(pipeline)
+
+    def test_infer_error(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Ошибка модели пробрасывается из `run`
+        """
+
+        # Given
+        def broken_detect(images: list[np.ndarray]) -> list:
+            raise RuntimeError('Inference error')
+
+        pipeline = self._pipeline(lambda count, image, detections: None, detect=broken_detect, queue_size=2)
+
+        # When, Then
+        with self.assertRaisesRegex(RuntimeError, 'Inference error'):
+            self._run(pipeline)
+
+    def test_decode_error(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Ошибка чтения кадра пробрасывается из `run`, уже прочитанные кадры обработаны по порядку
+        """
+
+        # Given
+        consumed = []
+        vidcap = BrokenCapture(frames=5)
+        _, image = vidcap.read()
+        pipeline = FramePipeline(vidcap, True, image,
+                                 detect=detect,
+                                 consume=lambda count, image, detections: consumed.append(count),
+                                 queue_size=2,
+                                 )
+
+        # When, Then
+        with self.assertRaisesRegex(RuntimeError, 'Decode error'):
+            self._run(pipeline)
+
+        self.assertEqual(list(range(len(consumed))), consumed)
@@ -141,6 +141,137 @@ class TestPredict(BaseCase):
         self.assertEqual('The argument is specified incorrectly', response.json['message'])
         self.assertEqual(400, response.status_code)
 
+    def test_with_incorrect_sample_stride(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если `sample_stride` не положительное целое число, то будет ошибка `ArgumentError`
+        """
+        # Given
+        payload = json.dumps(
+            {
+                "access_token": "token",
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": ["Some folder"],
+                                },
+                "sample_stride": 0,
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_incorrect_frame_gate(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если `frame_gate` не один из diff/phash, то будет ошибка `ArgumentError`
+        """
+        # Given
+        payload = json.dumps(
+            {
+                "access_token": "token",
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": ["Some folder"],
+                                },
+                "frame_gate": "fake",
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_incorrect_gate_threshold(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если `gate_threshold` больше 1 (изменение кадра нормировано от 0 до 1), то будет ошибка `ArgumentError`
+        """
+        # Given
+        payload = json.dumps(
+            {
+                "access_token": "token",
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": ["Some folder"],
+                                },
+                "frame_gate": "diff",
+                "gate_threshold": 5,
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_incorrect_precision(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если `precision` не один из fp32/int8, то будет ошибка `ArgumentError`
+        """
+        # Given
+        payload = json.dumps(
+            {
+                "access_token": "token",
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": ["Some folder"],
+                                },
+                "precision": "fp16",
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_incorrect_parallel(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если `parallel` не bool, то будет ошибка `ArgumentError`
+        """
+        # Given
+        payload = json.dumps(
+            {
+                "access_token": "token",
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": ["Some folder"],
+                                },
+                "parallel": "yes",
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
     def test_with_exceeded_bucket(self) -> NoReturn:
         """
         :return: `NoReturn`
@@ -204,6 +335,38 @@ class TestPredict(BaseCase):
         self.assertEqual('File/path', response.json['file'])
         self.assertEqual(404, response.status_code)
 
+    def test_with_one_of_files_not_exist(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем ошибку `FileExistError`, когда не существует только один из нескольких файлов
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        missing_file = Storage.path_join(Storage.get_user_folder(self.test_user_id), 'not_exists.mp4')
+
+        payload = json.dumps(
+            {
+                "access_token": access_token,
+                "queue_files": {"src": [self.test_s3_video, missing_file],
+                                "dst": ["Some folder", "Some folder"],
+                                },
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('File does not exist', response.json['message'])
+        self.assertEqual(missing_file, response.json['file'])
+        self.assertEqual(404, response.status_code)
+
     def test_with_missing_access_token(self) -> NoReturn:
         """
         :return: `NoReturn`
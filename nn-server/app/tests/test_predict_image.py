@@ -0,0 +1,156 @@
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NoReturn
+from unittest.mock import patch
+
+import cv2
+from flask_jwt_extended import create_access_token
+from kallosus_packages.over_logging import Logger
+
+from api import __version__
+from resources.errors import PredictionTimeoutError, ServerBusyError
+from task import image_server
+from task.image_server import ImagePredictor
+from tests.BaseCase import BaseCase, Storage
+
+console_logger = Logger(__file__)
+
+
+class TestPredictImage(BaseCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # Первый кадр тестового видео в качестве изображения
+        cap = cv2.VideoCapture(Storage.get_download_link(cls.test_s3_video))
+        _, frame = cap.read()
+        cap.release()
+
+        cls.test_image = cv2.imencode('.jpg', frame)[1].tobytes()
+
+        cls.app.image_predictor.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.image_predictor.shutdown()
+
+        super().tearDownClass()
+
+    def _post_image(self, access_token: str):
+        return self.test_client.post(f'/api/pd/v{__version__}/predict_image',
+                                     content_type='multipart/form-data',
+                                     data={'access_token': access_token,
+                                           'image': (io.BytesIO(self.test_image), 'leaf.jpg'),
+                                           },
+                                     )
+
+    def test_successfully_execution(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем успешный запрос с загруженным изображением
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        # When
+        response = self._post_image(access_token)
+
+        # Then
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Prediction done', response.json['message'])
+        self.assertIsInstance(response.json['detections'], list)
+        self.assertIsNone(response.json['image'])
+        self.assertLess(response.json['latency_ms'], self.app.image_predictor.timeout * 1000)
+
+    def test_without_args(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Без `src` и `image` будет ошибка `SomeRequestArgumentsMissing`
+        """
+
+        # Given
+        payload = json.dumps({"access_token": "token"})
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict_image',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('Some arguments in request are missing', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_video_src(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Видео в `src` - ошибка `ArgumentError`, видео обрабатывается через `/predict`
+        """
+
+        # Given
+        payload = json.dumps({"access_token": "token", "src": self.test_s3_video})
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict_image',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_max_concurrency_reached(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если все слоты заняты, запрос сразу получает ошибку `ServerBusyError`
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        slots = self.app.image_predictor._slots
+        self.app.image_predictor._slots = threading.Semaphore(0)
+
+        # When
+        try:
+            response = self._post_image(access_token)
+        finally:
+            self.app.image_predictor._slots = slots
+
+        # Then
+        self.assertEqual('Too many concurrent requests', response.json['message'])
+        self.assertEqual(429, response.status_code)
+
+
+class TestImagePredictor(BaseCase):
+    def test_slot_held_until_prediction_finished(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        После `PredictionTimeoutError` место занято, пока процесс не закончит запрос, поэтому новые запросы
+        не накапливаются сверх `max_concurrency`
+        """
+
+        # Given: пул потоков вместо процессов с моделью, запрос выполняется, пока не установлен `finish`
+        predictor = ImagePredictor(workers=1, max_concurrency=1, timeout=0.05)
+        predictor._executor = ThreadPoolExecutor(max_workers=1)
+        finish = threading.Event()
+
+        # When
+        with patch.object(image_server, '_predict_image', lambda *args: finish.wait() and {}):
+            with self.assertRaises(PredictionTimeoutError):
+                predictor.predict(image_bytes=b'image')
+
+            with self.assertRaises(ServerBusyError):
+                predictor.predict(image_bytes=b'image')
+
+            finish.set()
+            predictor._executor.shutdown(wait=True)
+
+        # Then
+        self.assertTrue(predictor._slots.acquire(blocking=False))
@@ -0,0 +1,86 @@
+from typing import NoReturn
+from urllib.parse import urlencode
+
+from flask_jwt_extended import create_access_token
+
+from api import __version__
+from storage.S3 import StorageApi
+from tests.BaseCase import BaseCase
+
+Storage = StorageApi()
+
+PLAYLIST = """#EXTM3U
+#EXT-X-VERSION:7
+#EXT-X-TARGETDURATION:4
+#EXT-X-PLAYLIST-TYPE:EVENT
+#EXT-X-MAP:URI="0_dst_init.mp4"
+#EXTINF:4.000000,
+0_dst_00000.m4s
+#EXTINF:4.000000,
+0_dst_00001.m4s
+"""
+
+
+class TestPreview(BaseCase):
+    def _get_preview(self, path: str):
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        return self.test_client.get(f'/api/pd/v{__version__}/preview?'
+                                    + urlencode({'access_token': access_token, 'path': path}))
+
+    def test_signed_playlist(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Сегменты и init-сегмент плейлиста заменяются ссылками на скачивание
+        """
+
+        # Given
+        folder = Storage.path_join(Storage.get_user_folder(self.test_user_id), 'preview')
+        playlist = Storage.path_join(folder, '0_dst.m3u8')
+        Storage.write_bytes(playlist, PLAYLIST.encode('utf-8'))
+
+        # When
+        response = self._get_preview(playlist)
+        Storage.rm_file([playlist])
+
+        # Then
+        lines = response.get_data(as_text=True).splitlines()
+        segments = [line for line in lines if line and not line.startswith('#')]
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/vnd.apple.mpegurl', response.mimetype)
+        self.assertEqual(2, len(segments))
+        self.assertIn(Storage.path_join(folder, '0_dst_00000.m4s'), segments[0])
+        self.assertIn('Signature', segments[0])
+        self.assertIn(Storage.path_join(folder, '0_dst_init.mp4'), [line for line in lines if 'EXT-X-MAP' in line][0])
+
+    def test_playlist_of_other_user(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Плейлист не из папки пользователя не отдается
+        """
+
+        # Given
+        playlist = Storage.path_join(Storage.get_user_folder(self.test_user_id + 1), 'preview', '0_dst.m3u8')
+
+        # When
+        response = self._get_preview(playlist)
+
+        # Then
+        self.assertEqual(400, response.status_code)
+
+    def test_playlist_does_not_exist(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Пока первый сегмент не загружен, плейлиста еще нет
+        """
+
+        # Given
+        playlist = Storage.path_join(Storage.get_user_folder(self.test_user_id), 'preview', 'not_exists.m3u8')
+
+        # When
+        response = self._get_preview(playlist)
+
+        # Then
+        self.assertEqual(404, response.status_code)
@@ -0,0 +1,127 @@
+import json
+import time
+from typing import NoReturn
+
+from task.progress import ProgressPublisher
+from tests.BaseCase import BaseCase
+
+
+class MetaJob:
+    """Задача RQ, которая считает записи meta"""
+
+    key = 'rq:job:test'
+    serializer = json
+
+    def __init__(self):
+        self.meta = {}
+        self.saved = []
+        self.published = []
+        self.round_trips = 0
+        self.connection = self  # Вместо Redis: `pipeline` запоминает записи meta и события
+
+    def pipeline(self, transaction: bool = True) -> 'MetaPipeline':
+        return MetaPipeline(self)
+
+
+class MetaPipeline:
+    """Pipeline Redis, команды которого выполняются в `MetaJob` только при `execute`"""
+
+    def __init__(self, job: MetaJob):
+        self.job = job
+        self.commands = []
+
+    def hset(self, key: str, field: str, value: str) -> NoReturn:
+        self.commands.append(lambda: self.job.saved.append(json.loads(value)))
+
+    def publish(self, channel: str, message: str) -> NoReturn:
+        self.commands.append(lambda: self.job.published.append((channel, json.loads(message))))
+
+    def execute(self) -> NoReturn:
+        self.job.round_trips += 1
+        for command in self.commands:
+            command()
+
+
+class TestProgressPublisher(BaseCase):
+    def test_throttled_writes(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Прогресс каждого кадра не записывается в Redis, но последнее значение и смена этапа записываются сразу
+        """
+
+        # Given
+        job = MetaJob()
+        publisher = ProgressPublisher(job, interval=60, min_delta=1)
+
+        # When: 1000 кадров
+        for frame_no in range(1000):
+            publisher.update(frame_no / 1000 * 80)
+
+        publisher.set(stage='video-loading', frames_inferred=1000)
+        publisher.update(100)
+
+        # Then
+        self.assertLessEqual(len(job.saved), 3)
+        self.assertEqual('video-loading', job.saved[-2]['stage'])
+        self.assertEqual(1000, job.saved[-2]['frames_inferred'])
+        self.assertEqual(100, job.saved[-1]['progress'])
+
+    def test_publish_to_channel(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Каждая запись meta публикуется в канал задачи, событие содержит только изменившиеся поля
+        """
+
+        # Given
+        job = MetaJob()
+        publisher = ProgressPublisher(job, interval=60, min_delta=1, channel='pd-task:1')
+
+        # When
+        publisher.update(10)
+        publisher.update(20)
+        publisher.set(stage='video-loading')
+
+        # Then: meta и событие записываются одним запросом
+        self.assertEqual(len(job.saved), len(job.published))
+        self.assertEqual(len(job.saved), job.round_trips)
+        self.assertEqual('pd-task:1', job.published[0][0])
+        self.assertEqual(10, job.published[0][1]['progress'])
+        self.assertNotIn('stage', job.published[0][1])
+        self.assertEqual('video-loading', job.published[-1][1]['stage'])
+        self.assertEqual(20, job.published[-1][1]['progress'])
+
+    def test_without_channel(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Прогресс части задачи (`FanOut`) записывается в meta, но не публикуется
+        """
+
+        # Given
+        job = MetaJob()
+        publisher = ProgressPublisher(job)
+
+        # When
+        publisher.update(100)
+
+        # Then
+        self.assertEqual(1, len(job.saved))
+        self.assertEqual([], job.published)
+
+    def test_eta_follows_current_rate(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        ETA считается по сглаженной текущей скорости, а не по средней скорости с начала задачи
+        """
+
+        # Given: задача долго стояла на 0% (загрузка видео), затем идет 10% в секунду
+        publisher = ProgressPublisher(None, eta_window=0.01)
+        publisher._start_time = publisher._last_time = time.time() - 100
+
+        # When
+        publisher.update(1)
+        for progress in range(2, 11):
+            publisher._last_time -= 0.1  # Между кадрами прошло 0.1 секунды
+            eta = publisher.estimate_eta(progress)
+
+        # Then: линейная экстраполяция дала бы ~900 секунд
+        self.assertAlmostEqual(9, eta, delta=1)
@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import NoReturn
+from unittest.mock import patch
+
+import numpy as np
+
+from task import quantize
+from task.backends import BACKENDS
+from task import disiases_detection
+from task.disiases_detection import DiseasesDetection, get_predictor
+from tests.BaseCase import BaseCase
+
+
+class StubDetection:
+    """
+    `DiseasesDetection` без модели: INT8 модель находит только первое обнаружение FP32 модели
+    """
+
+    pt_path = ''
+    int8_backend = 'onnx_int8'  # Backend, который получает INT8 модель после загрузки
+
+    def __init__(self, backend: str = 'torch', precision: str = 'fp32'):
+        self.precision = precision
+        self.backend = SimpleNamespace(name=backend if precision == 'fp32' else StubDetection.int8_backend)
+        self.class_names_dict = {0: 'healthy', 1: 'rust'}
+
+    def get_model(self) -> str:
+        return self.pt_path
+
+    def load(self) -> NoReturn:
+        pass
+
+    def detect(self, images: list[np.ndarray]) -> list[list[list[float]]]:
+        time.sleep(0.002)  # Задержка нужна для отчета об ускорении
+        boxes = [[0, 0, 10, 10, 0.9, 1], [20, 20, 40, 40, 0.8, 0]]
+
+        return [boxes if self.precision == 'fp32' else boxes[:1] for _ in images]
+
+
+class TestQuantize(BaseCase):
+    def setUp(self) -> NoReturn:
+        self.folder = tempfile.mkdtemp()
+        StubDetection.pt_path = os.path.join(self.folder, 'model.pt')
+        StubDetection.int8_backend = 'onnx_int8'
+
+        frames = [np.zeros((64, 64, 3), dtype=np.uint8)] * 8
+        int8_path = BACKENDS['onnx_int8'].artifact_path(StubDetection.pt_path)
+
+        for patcher in [patch.object(quantize, 'DiseasesDetection', StubDetection),
+                        patch.object(quantize, 'sample_frames', lambda num_frames: frames[:num_frames]),
+                        patch.object(quantize, 'quantize', lambda pt_path, calibration_frames: int8_path),
+                        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> NoReturn:
+        for file in os.listdir(self.folder):
+            os.remove(os.path.join(self.folder, file))
+
+        os.rmdir(self.folder)
+
+    def test_report_saved(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Отчет сравнения INT8 и FP32 сохраняется рядом с моделью в `*_int8_report.json`
+        """
+
+        # When
+        report = quantize.build(num_frames=8)
+
+        # Then
+        report_path = os.path.join(self.folder, 'model_int8_report.json')
+
+        with open(report_path, encoding='utf-8') as f:
+            saved = json.load(f)
+
+        self.assertEqual(report, saved)
+        self.assertEqual(4, saved['calibration_frames'])
+        self.assertEqual(4, saved['evaluation_frames'])
+        self.assertEqual({'fp32': 4, 'int8': 4, 'matched': 4, 'recall': 1.0, 'precision': 1.0},
+                         saved['classes']['rust'])
+        self.assertEqual({'fp32': 4, 'int8': 0, 'matched': 0, 'recall': 0.0, 'precision': None},
+                         saved['classes']['healthy'])
+        self.assertEqual({'fp32', 'int8', 'speedup'}, set(saved['latency']))
+
+    def test_int8_not_loaded(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если INT8 модель не загрузилась и заменена torch моделью, отчет не сохраняется
+        """
+
+        # Given
+        StubDetection.int8_backend = 'torch'
+
+        # When, Then
+        with self.assertRaises(RuntimeError):
+            quantize.build(num_frames=8)
+
+        self.assertEqual([], os.listdir(self.folder))
+
+
+class TestPrecisionFallback(BaseCase):
+    def test_int8_model_not_built(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если INT8 модель не собрана, используется FP32 модель и это видно по `precision`
+        """
+
+        # Given
+        predictor = DiseasesDetection(precision='int8')
+        not_built = os.path.join(tempfile.gettempdir(), 'not_built_int8.onnx')
+
+        # When
+        with patch.object(BACKENDS['onnx_int8'], 'artifact_path', return_value=not_built):
+            predictor.load()
+
+        # Then
+        self.assertEqual('fp32', predictor.precision)
+        self.assertEqual('torch', predictor.backend.name)
+        self.assertEqual('onnx_int8', predictor.fallback_from)
+
+    def test_fallback_predictor_not_duplicated(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если INT8 модель не собрана, для int8 используется уже загруженная fp32 модель, а не ее вторая копия
+        """
+
+        # Given
+        not_built = os.path.join(tempfile.gettempdir(), 'not_built_int8.onnx')
+        fp32_predictor = DiseasesDetection()
+
+        # When
+        with patch.object(BACKENDS['onnx_int8'], 'artifact_path', return_value=not_built):
+            with patch.dict(disiases_detection._PREDICTORS, {'fp32': fp32_predictor}, clear=True):
+                predictor = get_predictor('int8')
+                cached = get_predictor('int8')
+
+        # Then
+        self.assertIs(fp32_predictor, predictor)
+        self.assertIs(fp32_predictor, cached)
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+from typing import NoReturn
+
+from flask_jwt_extended import create_access_token
+from kallosus_packages.over_logging import Logger
+
+from api import __version__
+from path_definitions import tmp_path
+from task.detections import DetectionsRecorder, iter_frame_detections, load_detections
+from tests.BaseCase import BaseCase
+
+"""
+Для отрисовки воркер должен слушать обе очереди:
+rq worker pd-task pd-render
+"""
+
+console_logger = Logger(__file__)
+
+
+class TestRender(BaseCase):
+    def _wait_task(self, status_payload: str) -> NoReturn:
+        while True:
+            time.sleep(1.5)
+
+            status_resp = self.test_client.post(f'/api/pd/v{__version__}/status',
+                                                headers={"Content-Type": "application/json"},
+                                                data=status_payload,
+                                                )
+            progress = status_resp.json['progress']
+            console_logger.debug(f'progress = {progress}%')
+            if progress >= 100 and status_resp.json["status"] in ['complete', 'error']:
+                console_logger.debug('Job done')
+                break
+
+    def test_successfully_lazy_render(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Видео с bbox не кодируется при обработке, а отрисовывается при первом запросе
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        payload = json.dumps(
+            {
+                "access_token": access_token,
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": [f'{self.test_dst}/{self.test_user_id}/'],
+                                },
+                "render_mode": "lazy",
+            }
+        )
+
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        task_id = response.json['task_id']
+        status_payload = json.dumps({"access_token": access_token, "task_id": task_id})
+        render_payload = json.dumps({"access_token": access_token, "task_id": task_id, "video_no": 0})
+
+        self._wait_task(status_payload)
+
+        # When
+        render_response = self.test_client.post(f'/api/pd/v{__version__}/render',
+                                                headers={"Content-Type": "application/json"},
+                                                data=render_payload,
+                                                )
+
+        while render_response.status_code == 202:
+            time.sleep(1.5)
+            render_response = self.test_client.post(f'/api/pd/v{__version__}/render',
+                                                    headers={"Content-Type": "application/json"},
+                                                    data=render_payload,
+                                                    )
+
+        is_rm = self._clear_s3_folder()
+
+        # Then
+        self.assertEqual(200, render_response.status_code)
+        self.assertEqual('done', render_response.json['status'])
+        self.assertTrue(render_response.json['dst'])
+        self.assertEqual(True, is_rm)
+
+    def test_with_not_complete_task(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Видео незавершенной задачи нельзя отрисовать - ошибка `ArgumentError`
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        payload = json.dumps({"access_token": access_token, "task_id": self.clear_task_id})
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/render',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_without_args(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Без `task_id` будет ошибка `SomeRequestArgumentsMissing`
+        """
+
+        # Given
+        payload = json.dumps({"access_token": "token"})
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/render',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual('Some arguments in request are missing', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_detections_roundtrip(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Обнаружения, сохраненные `DetectionsRecorder`, восстанавливаются по кадрам
+        """
+
+        # Given
+        frames = [[[10, 20, 110, 220, 0.75, 1], [5, 5, 50, 50, 0.5, 0]], [], [[1, 2, 3, 4, 0.25, 1]]]
+        recorder = DetectionsRecorder(fps=25, width=640, height=480, class_names={0: 'healthy', 1: 'rust'})
+
+        for frame_no, detections in enumerate(frames):
+            recorder.add(frame_no, detections)
+
+        path = recorder.save(os.path.join(tmp_path, 'test_detections.npz'))
+
+        # When
+        with open(path, 'rb') as f:
+            restored = list(iter_frame_detections(load_detections(f.read())))
+
+        os.remove(path)
+
+        # Then
+        self.assertEqual(frames, restored)
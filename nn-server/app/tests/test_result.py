@@ -315,6 +315,75 @@ class TestResult(BaseCase):
         self.assertEqual(True, is_rm)
         self.assertEqual(200, result_response.status_code)
 
+    def test_successfully_get_results_by_pages(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем постраничное получение задач пользователя: страницы не пересекаются и идут от новых к старым
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        cursor = None
+        pages = []
+
+        # When
+        while True:
+            payload = {"access_token": access_token, "limit": 1, "fields": ["files", "status"]}
+
+            if cursor is not None:
+                payload['cursor'] = cursor
+
+            response = self.test_client.post(f'/api/pd/v{__version__}/result',
+                                             headers={"Content-Type": "application/json"},
+                                             data=json.dumps(payload),
+                                             )
+            self.assertEqual(200, response.status_code)
+
+            pages.append(response.json['tasks'])
+            cursor = response.json['next_cursor']
+
+            if cursor is None:
+                break
+
+        tasks = [task for page in pages for task in page]
+        task_ids = [task['id'] for task in tasks]
+
+        # Then
+        self.assertTrue(all(len(page) <= 1 for page in pages))
+        self.assertEqual(len(task_ids), len(set(task_ids)))
+        self.assertIn(self.clear_task_id, task_ids)
+        self.assertIn(self.test_task_id, task_ids)
+        self.assertEqual(sorted(tasks, key=lambda task: (task['created_at'], task['id']), reverse=True), tasks)
+        self.assertEqual({'id', 'created_at', 'files', 'status'}, set(tasks[0]))
+
+    def test_get_results_with_incorrect_page_arguments(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем ошибку `ArgumentError` для некорректных `limit`, `cursor` и `fields`
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        payloads = [
+            {"access_token": access_token, "limit": 0},
+            {"access_token": access_token, "limit": 10, "cursor": "Fake"},
+            {"access_token": access_token, "limit": 10, "fields": ["password"]},
+        ]
+
+        for payload in payloads:
+            # When
+            response = self.test_client.post(f'/api/pd/v{__version__}/result',
+                                             headers={"Content-Type": "application/json"},
+                                             data=json.dumps(payload),
+                                             )
+
+            # Then
+            self.assertEqual(403, response.status_code)
+
     def test_with_not_exists_user_id(self) -> NoReturn:
         """
         :return: `NoReturn`
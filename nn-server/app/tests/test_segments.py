@@ -0,0 +1,86 @@
+import io
+import os
+from typing import NoReturn
+
+import cv2
+import numpy as np
+
+from path_definitions import tmp_path
+from task.detections import DetectionsRecorder, load_detections
+from task.segments import open_segment, split_segments
+from task.top_k import TopKFrames
+from tests.BaseCase import BaseCase
+
+
+class TestSegments(BaseCase):
+    def test_split_segments(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Сегменты покрывают все кадры, короткий хвост присоединяется к предыдущему сегменту
+        """
+
+        # When
+        segments = split_segments(length=25 * 130, fps=25, segment_seconds=60)
+
+        # Then
+        self.assertEqual([[0, 1500], [1500, 3250]], segments)
+        self.assertEqual([[0, 100]], split_segments(length=100, fps=25, segment_seconds=60))
+
+    def test_open_segment(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Из сегмента читаются ровно его кадры, начиная с первого кадра сегмента
+        """
+
+        # Given: яркость кадра равна его номеру
+        path = os.path.join(tmp_path, 'test_segments.avi')
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 64))
+        for frame_no in range(30):
+            out.write(np.full((64, 64, 3), frame_no * 8, dtype=np.uint8))
+        out.release()
+
+        # When
+        vidcap, frame_read, image = open_segment(cv2.VideoCapture(path), 10, 20)
+        frames = []
+        while frame_read:
+            frames.append(int(round(image.mean() / 8)))
+            frame_read, image = vidcap.read()
+
+        vidcap.release()
+        os.remove(path)
+
+        # Then
+        self.assertEqual(list(range(10, 20)), frames)
+
+    def test_merge_segments(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Объединенные обнаружения сегментов совпадают с обнаружениями всего видео,
+        K лучших кадров выбираются из кадров, отобранных сегментами
+        """
+
+        # Given
+        class_names = {0: 'healthy', 1: 'rust'}
+        full = DetectionsRecorder(fps=10, width=64, height=64, class_names=class_names)
+        segments = [DetectionsRecorder(fps=10, width=64, height=64, class_names=class_names) for _ in range(2)]
+
+        for frame_no in range(40):
+            detections = [[0, 0, 10, 10, 0.5, frame_no % 2]] * (frame_no % 3)
+            full.add(frame_no, detections)
+            segments[frame_no // 20].add(frame_no, detections)
+
+        # When
+        merged = DetectionsRecorder(fps=10, width=64, height=64, class_names=class_names)
+        for segment in segments:
+            data = io.BytesIO()
+            segment.save(data)
+            merged.extend(load_detections(data.getvalue()))
+
+        top_frames = TopKFrames(k=2, min_gap=0)
+        for score, time_code in [(1, 0.5), (3, 1.0), (2, 2.5), (4, 3.0)]:
+            top_frames.offer_encoded(score, f'max_{time_code}.jpg', ['rust'] * score, time_code)
+
+        # Then
+        self.assertEqual(full.counts_per_second().tolist(), merged.counts_per_second().tolist())
+        self.assertEqual(40, merged.length)
+        self.assertEqual(['max_1.0.jpg', 'max_3.0.jpg'], [image for _, _, image in top_frames.items()])
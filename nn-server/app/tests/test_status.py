@@ -378,3 +378,159 @@ class TestStatus(BaseCase):
         # Then
         self.assertEqual('The method is not allowed for the requested URL.', response.json['message'])
         self.assertEqual(405, response.status_code)
+
+    def test_successfully_stream_status(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем поток статуса: первое событие - текущий статус, поток закрывается после завершения задачи
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        payload = json.dumps(
+            {
+                "access_token": access_token,
+                "queue_files": {"src": [self.test_s3_video],
+                                "dst": [f'{self.test_dst}/{self.test_user_id}/'],
+                                },
+            }
+        )
+
+        response = self.test_client.post(f'/api/pd/v{__version__}/predict',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+        task_id = response.json['task_id']
+
+        # When
+        stream_response = self.test_client.get(f'/api/pd/v{__version__}/status/stream',
+                                               query_string={'access_token': access_token, 'task_id': task_id},
+                                               )
+        events = [json.loads(event[len('data: '):])
+                  for event in stream_response.get_data(as_text=True).split('\n\n')
+                  if event.startswith('data: ')]
+
+        console_logger.debug(f'Status events: {len(events)}')
+
+        is_rm = self._clear_s3_folder()
+
+        # Then
+        self.assertEqual(200, stream_response.status_code)
+        self.assertIn('text/event-stream', stream_response.content_type)
+        self.assertIn('progress', events[0])
+        self.assertIn('stage', events[0])
+        self.assertIn(events[-1]['status'], ['complete', 'error'])
+        self.assertEqual(True, is_rm)
+
+    def test_stream_without_task_id(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем ошибку `SomeRequestArgumentsMissing` для потока статуса
+        """
+
+        # When
+        response = self.test_client.get(f'/api/pd/v{__version__}/status/stream',
+                                        query_string={'access_token': 'Fake'},
+                                        )
+
+        # Then
+        self.assertEqual('Some arguments in request are missing', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_stream_with_fake_access_token(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем ошибку `BadTokenError` для потока статуса
+        """
+
+        # When
+        response = self.test_client.get(f'/api/pd/v{__version__}/status/stream',
+                                        query_string={'access_token': 'Fake', 'task_id': 1},
+                                        )
+
+        # Then
+        self.assertEqual('Invalid token', response.json['message'])
+        self.assertEqual(403, response.status_code)
+
+    def test_successfully_get_batch_status(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем статус нескольких задач одним запросом, задачи не пользователя попадают в `not_found`
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        payload = json.dumps(
+            {
+                "access_token": access_token,
+                "task_ids": [self.clear_task_id, self.test_task_id, 10000],
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/status/batch',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({str(self.clear_task_id), str(self.test_task_id)}, set(response.json['tasks']))
+        self.assertEqual([10000], response.json['not_found'])
+
+        for status in response.json['tasks'].values():
+            self.assertEqual({'progress', 'status', 'eta', 'video_no', 'videos_no', 'stage', 'preview',
+                              'precision'}, set(status))
+
+    def test_batch_with_incorrect_task_ids(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем ошибку `ArgumentError`, если `task_ids` - не список целых чисел
+        """
+
+        # Given
+        with self.app.app_context():
+            access_token = create_access_token(identity=str(self.test_user_id))
+
+        payload = json.dumps(
+            {
+                "access_token": access_token,
+                "task_ids": ['1', 2],
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/status/batch',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual(403, response.status_code)
+
+    def test_batch_without_task_ids(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Проверяем ошибку `SomeRequestArgumentsMissing` для статуса нескольких задач
+        """
+
+        # Given
+        payload = json.dumps(
+            {
+                "access_token": "Fake",
+            }
+        )
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/status/batch',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual('Some arguments in request are missing', response.json['message'])
+        self.assertEqual(400, response.status_code)
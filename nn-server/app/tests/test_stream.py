@@ -0,0 +1,164 @@
+import threading
+import unittest
+from typing import NoReturn
+
+import numpy as np
+
+from storage.stream import MultipartStream
+from storage.transfer import MB
+from task.video_writer import HlsVideoWriter, StreamVideoWriter
+from tests.BaseCase import BaseCase
+
+
+class FakeS3:
+    """
+    Мультипарт-загрузки S3 в памяти
+    """
+
+    def __init__(self, fail_part: int = 0):
+        """
+        :param fail_part: Номер части, загрузка которой завершается ошибкой, 0 - без ошибок
+        """
+
+        self.fail_part = fail_part
+        self.parts = {}
+        self.objects = {}
+        self.aborted = False
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, Bucket: str, Key: str, **kwargs) -> dict:
+        return {'UploadId': 'upload'}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> dict:
+        if PartNumber == self.fail_part:
+            raise ConnectionError(f'Part {PartNumber} is not uploaded')
+
+        with self._lock:
+            self.parts[PartNumber] = Body
+
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict) -> NoReturn:
+        self.objects[Key] = b''.join(self.parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> NoReturn:
+        self.aborted = True
+
+
+class TestMultipartStream(BaseCase):
+    def test_parts_sent_while_writing(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Заполненные части отправляются во время записи, последняя часть (меньше 5 Мб) - при закрытии
+        """
+
+        # Given
+        s3 = FakeS3()
+        stream = MultipartStream(s3, 'bucket', 'video.mp4', part_size=5 * MB, max_concurrency=2)
+        data = np.random.bytes(12 * MB)
+
+        # When
+        for i in range(0, len(data), MB // 3):
+            stream.write(data[i:i + MB // 3])
+
+        parts_before_close = len(stream._parts)
+        is_uploaded = stream.close()
+
+        # Then
+        self.assertEqual(True, is_uploaded)
+        self.assertEqual(2, parts_before_close)
+        self.assertEqual([5 * MB, 5 * MB, 2 * MB], [len(s3.parts[number]) for number in sorted(s3.parts)])
+        self.assertEqual(data, s3.objects['video.mp4'])
+
+    def test_failed_part_aborts_upload(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если часть не загружена, объект не создается, а загрузка отменяется
+        """
+
+        # Given
+        s3 = FakeS3(fail_part=2)
+        stream = MultipartStream(s3, 'bucket', 'video.mp4', part_size=5 * MB)
+
+        # When
+        stream.write(bytes(11 * MB))
+        is_uploaded = stream.close()
+
+        # Then
+        self.assertEqual(False, is_uploaded)
+        self.assertEqual(True, s3.aborted)
+        self.assertNotIn('video.mp4', s3.objects)
+
+    @unittest.skipUnless(StreamVideoWriter.is_available(), 'ffmpeg is not installed')
+    def test_stream_video(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Кадры кодируются ffmpeg в fragmented MP4 и загружаются без временного файла
+        """
+
+        # Given
+        s3 = FakeS3()
+        out = StreamVideoWriter(MultipartStream(s3, 'bucket', 'video.mp4'), 25, 64, 48)
+
+        # When
+        for frame_no in range(50):
+            out.write(np.full((48, 64, 3), frame_no * 5, dtype=np.uint8))
+
+        is_uploaded = out.release()
+
+        # Then
+        self.assertEqual(True, is_uploaded)
+        self.assertEqual(b'ftyp', s3.objects['video.mp4'][4:8])
+        self.assertIn(b'moof', s3.objects['video.mp4'])
+
+
+class FakeStorage:
+    """
+    Хранилище в памяти с порядком записи файлов
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.writes = []
+
+    @staticmethod
+    def path_join(*args) -> str:
+        return '/'.join(args)
+
+    def write_bytes(self, path: str, data: bytes) -> bool:
+        self.files[path] = data
+        self.writes.append(path)
+
+        return True
+
+
+class TestHlsVideoWriter(BaseCase):
+    @unittest.skipUnless(HlsVideoWriter.is_available(), 'ffmpeg is not installed')
+    def test_segments_uploaded_before_playlist(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Каждый сегмент загружается раньше плейлиста, который на него ссылается, законченный плейлист
+        содержит `#EXT-X-ENDLIST`
+        """
+
+        # Given
+        storage = FakeStorage()
+        out = HlsVideoWriter(storage, 'folder', '0_dst', 25, 64, 48, segment_seconds=1, sync_interval=0.1)
+
+        # When
+        for frame_no in range(75):
+            out.write(np.full((48, 64, 3), frame_no * 3, dtype=np.uint8))
+
+        is_uploaded = out.release()
+
+        # Then
+        playlist = storage.files['folder/0_dst.m3u8'].decode()
+        segments = [f'folder/{line}' for line in playlist.splitlines() if line and not line.startswith('#')]
+
+        self.assertEqual(True, is_uploaded)
+        self.assertIn('#EXT-X-ENDLIST', playlist)
+        self.assertEqual(3, len(segments))
+        self.assertIn('folder/0_dst_init.mp4', storage.files)
+
+        for segment in segments:
+            self.assertLess(storage.writes.index(segment), storage.writes.index('folder/0_dst.m3u8'))
@@ -0,0 +1,85 @@
+import json
+import os
+from typing import NoReturn
+
+from kallosus_packages.over_logging import Logger
+
+from api import __version__
+from path_definitions import tmp_path
+from task.detections import DetectionsRecorder, downsample, read_timeline
+from tests.BaseCase import BaseCase
+
+console_logger = Logger(__file__)
+
+
+class TestTimeline(BaseCase):
+    def test_without_args(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Без `task_id` будет ошибка `SomeRequestArgumentsMissing`
+        """
+
+        # Given
+        payload = json.dumps({"access_token": "token"})
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/timeline',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual('Some arguments in request are missing', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_with_incorrect_interval(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Если `end` не больше `start`, то будет ошибка `ArgumentError`
+        """
+
+        # Given
+        payload = json.dumps({"access_token": "token", "task_id": 1, "start": 10, "end": 5})
+
+        # When
+        response = self.test_client.post(f'/api/pd/v{__version__}/timeline',
+                                         headers={"Content-Type": "application/json"},
+                                         data=payload,
+                                         )
+
+        # Then
+        self.assertEqual('The argument is specified incorrectly', response.json['message'])
+        self.assertEqual(400, response.status_code)
+
+    def test_read_timeline_range(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Интервал timeline читается без загрузки всего файла и совпадает с полным timeline
+        """
+
+        # Given
+        fps = 10
+        recorder = DetectionsRecorder(fps=fps, width=640, height=480, class_names={0: 'healthy', 1: 'rust'})
+
+        for frame_no in range(fps * 60):
+            recorder.add(frame_no, [[0, 0, 10, 10, 0.9, frame_no // fps % 2]] if frame_no % 2 else [])
+
+        path = recorder.save_timeline(os.path.join(tmp_path, 'test_timeline.npy'))
+        full = recorder.counts_per_second()
+        read_bytes = []
+
+        def read_range(offset: int, size: int) -> bytes:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                read_bytes.append(size)
+                return f.read(size)
+
+        # When
+        counts = read_timeline(read_range, 10, 20)
+        file_size = os.path.getsize(path)
+        os.remove(path)
+
+        # Then
+        self.assertEqual(full[10:20].tolist(), counts.tolist())
+        self.assertLess(sum(read_bytes), file_size)
+        self.assertEqual([[2.5, 2.5]], downsample(full[10:12], 2).tolist())
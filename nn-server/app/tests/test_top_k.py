@@ -0,0 +1,63 @@
+from typing import NoReturn
+
+import cv2
+import numpy as np
+
+from task.top_k import TopKFrames
+from tests.BaseCase import BaseCase
+
+
+class TestTopKFrames(BaseCase):
+    frame = np.zeros((2160, 3840, 3), dtype=np.uint8)
+
+    def test_keeps_k_best(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Остаются K кадров с наибольшим количеством обнаружений
+        """
+
+        # Given
+        top_frames = TopKFrames(k=3, min_gap=0)
+
+        # When
+        for second, score in enumerate([1, 5, 2, 7, 3, 3]):
+            top_frames.offer(score, self.frame, ['rust'] * score, float(second))
+
+        # Then
+        self.assertEqual([1.0, 3.0, 4.0], [time_code for time_code, _, _ in top_frames.items()])
+
+    def test_temporal_suppression(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Из кадров ближе `min_gap` остается лучший
+        """
+
+        # Given
+        top_frames = TopKFrames(k=10, min_gap=1.0)
+
+        # When: 5 секунд видео 25 fps
+        for frame_no in range(125):
+            top_frames.offer(frame_no % 7 + 1, self.frame, ['rust'], frame_no / 25)
+
+        time_codes = [time_code for time_code, _, _ in top_frames.items()]
+
+        # Then
+        self.assertLessEqual(len(time_codes), 5)
+        self.assertTrue(all(b - a >= 1.0 for a, b in zip(time_codes, time_codes[1:])))
+
+    def test_frames_are_compressed(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Кадры хранятся сжатыми и уменьшенными
+        """
+
+        # Given
+        top_frames = TopKFrames(k=1, max_side=1920)
+
+        # When
+        top_frames.offer(1, self.frame, ['rust'], 0.0)
+        _, _, image = top_frames.items()[0]
+
+        # Then
+        self.assertLess(len(image), self.frame.nbytes // 100)
+        self.assertEqual(1920, max(cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR).shape))
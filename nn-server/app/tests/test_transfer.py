@@ -0,0 +1,75 @@
+from typing import NoReturn
+
+from storage.transfer import MAX_PARTS, MB, MIN_PART_SIZE, TransferPlanner
+from tests.BaseCase import BaseCase
+
+
+class TestTransferPlanner(BaseCase):
+    def test_small_file_single_request(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Файл меньше части загружается одним запросом в один поток
+        """
+
+        # Given
+        planner = TransferPlanner(min_part_size=8 * MB, max_concurrency=10)
+
+        # When
+        config = planner.plan(3 * MB)
+
+        # Then
+        self.assertEqual(8 * MB, config.multipart_threshold)
+        self.assertEqual(1, config.max_concurrency)
+
+    def test_part_limits(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Части не меньше 5 Мб, а их количество не больше 10 000 даже для очень больших файлов
+        """
+
+        # Given
+        planner = TransferPlanner(min_part_size=1024, max_concurrency=10)
+        size = 100 * 1024 * MB
+
+        # When
+        config = planner.plan(size)
+
+        # Then
+        self.assertEqual(MIN_PART_SIZE, planner.part_size(6 * MB))
+        self.assertLessEqual(size / config.multipart_chunksize, MAX_PARTS)
+        self.assertEqual(0, config.multipart_chunksize % MB)
+        self.assertEqual(10, config.max_concurrency)
+
+    def test_part_size_follows_throughput(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        После измерения скорости часть загружается примерно `part_seconds`, но файл делится на все потоки
+        """
+
+        # Given
+        planner = TransferPlanner(min_part_size=8 * MB, max_concurrency=4, part_seconds=2)
+        config = planner.plan(400 * MB)
+
+        # When: 400 Мб за 10 секунд в 4 потока - 10 Мб/с на поток
+        planner.record(400 * MB, 10, config)
+
+        # Then
+        self.assertAlmostEqual(10 * MB, planner.throughput)
+        self.assertEqual(20 * MB, planner.part_size(400 * MB))
+        self.assertEqual(10 * MB, planner.part_size(40 * MB))
+        self.assertEqual(8 * MB, planner.part_size(16 * MB))
+
+    def test_small_uploads_not_recorded(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Время маленьких загрузок определяется задержкой запроса и не влияет на оценку скорости
+        """
+
+        # Given
+        planner = TransferPlanner()
+
+        # When
+        planner.record(MB, 1, planner.plan(MB))
+
+        # Then
+        self.assertIsNone(planner.throughput)
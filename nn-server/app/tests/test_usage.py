@@ -0,0 +1,97 @@
+from typing import NoReturn
+
+from storage import remote_main_s3_path, remote_test_s3_path
+from storage.usage import UsageLedger
+from tests.BaseCase import BaseCase
+
+
+class LedgerForTest(UsageLedger):
+    """Учет в отдельных ключах, чтобы не менять учет хранилища"""
+
+    _SIZES_KEY = 'pd-test-usage:sizes'
+    _TOTAL_KEY = 'pd-test-usage:total'
+    _USERS_KEY = 'pd-test-usage:users'
+
+
+class TestUsageLedger(BaseCase):
+    def setUp(self):
+        super().setUp()
+
+        self.ledger = LedgerForTest(self.app.redis)
+        self.app.redis.delete(self.ledger._SIZES_KEY, self.ledger._TOTAL_KEY, self.ledger._USERS_KEY)
+
+    def tearDown(self):
+        self.app.redis.delete(self.ledger._SIZES_KEY, self.ledger._TOTAL_KEY, self.ledger._USERS_KEY)
+
+    def test_put_and_delete(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Запись, перезапись и удаление файла изменяют общий размер и размер пользователя на точную разницу
+        """
+
+        # Given
+        video = f'{remote_test_s3_path}/7/01_01_25/1.0/video.mp4'
+        image = f'{remote_test_s3_path}/7/01_01_25/1.0/image.png'
+        self.ledger.reconcile({})
+
+        # When
+        self.ledger.record_put(video, 1000)
+        self.ledger.record_put(image, 200)
+        self.ledger.record_put(video, 700)  # Файл перезаписан
+
+        # Then
+        self.assertEqual(900, self.ledger.total())
+        self.assertEqual(900, self.ledger.user_usage(7))
+
+        # When
+        self.ledger.record_delete([video, f'{remote_test_s3_path}/7/not_recorded.json'])
+
+        # Then
+        self.assertEqual(200, self.ledger.total())
+        self.assertEqual(200, self.ledger.user_usage(7))
+
+    def test_reconcile(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Сверка заменяет учет размерами из листинга хранилища
+        """
+
+        # Given
+        self.ledger.record_put(f'{remote_main_s3_path}/1/stale.json', 10 ** 6)
+
+        # When
+        total = self.ledger.reconcile({f'{remote_main_s3_path}/1/a.json': 100,
+                                       f'{remote_main_s3_path}/2/b.json': 50,
+                                       'test/other.mp4': 25,
+                                       })
+
+        # Then
+        self.assertEqual(175, total)
+        self.assertEqual(175, self.ledger.total())
+        self.assertEqual(100, self.ledger.user_usage(1))
+        self.assertEqual(50, self.ledger.user_usage(2))
+
+    def test_user_id(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Пользователь определяется по первой папке после корня хранилища
+        """
+
+        self.assertEqual('12', UsageLedger.get_user_id(f'{remote_main_s3_path}/12/01_01_25/1.0/a.json'))
+        self.assertEqual('3', UsageLedger.get_user_id(f'{remote_test_s3_path}/3/'))
+        self.assertEqual('', UsageLedger.get_user_id('test-videos/cars_test.mp4'))
+
+    def test_without_connection(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Без Redis учет выключен: записи игнорируются, размер неизвестен
+        """
+
+        # Given
+        ledger = LedgerForTest()
+
+        # When
+        ledger.record_put(f'{remote_main_s3_path}/1/a.json', 100)
+
+        # Then
+        self.assertIsNone(ledger.total())
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, NoReturn, Union
+
+from flask import Flask
+from flask_jwt_extended import decode_token
+from kallosus_packages.over_logging import GetTraceback, Logger
+
+from database.models import User
+from resources.errors import UserDoesNotExists
+
+console_logger = Logger(__file__)
+get_traceback = GetTraceback(__file__)
+
+
+class TTLCache:
+    """
+    LRU-кэш ограниченного размера, записи которого устаревают через `ttl` секунд. Потокобезопасен.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        """
+        :param max_size: Максимальное количество записей, при переполнении удаляется самая давно использованная
+        :param ttl: Время жизни записи в секундах
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._items = OrderedDict()  # key -> (время устаревания, значение)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+
+            if item is None:
+                return default
+
+            if item[0] <= time.monotonic():
+                del self._items[key]
+                return default
+
+            self._items.move_to_end(key)
+
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> NoReturn:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> NoReturn:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> NoReturn:
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+USERS_CACHE = TTLCache(max_size=int(os.getenv('PD_AUTH_CACHE_SIZE', 10000)),
+                       ttl=float(os.getenv('PD_AUTH_CACHE_TTL', 60)),
+                       )
+"""
+Роли существующих пользователей по id. Удаленные пользователи и смена роли сбрасываются сразу
+(`UsersCacheInvalidator`), а `ttl` ограничивает устаревание, если сообщение об изменении потеряно
+"""
+
+
+def get_user_role(user_id: Union[int, str]) -> Union[str, None]:
+    """
+    :param user_id: id пользователя
+    :return: Роль пользователя, None - пользователя нет
+
+    Роль берется из `USERS_CACHE`, а при промахе - из БД. Отсутствие пользователя не кэшируется
+    """
+
+    key = str(user_id)
+    role = USERS_CACHE.get(key)
+
+    if role is None:
+        user = User.find_by_id(user_id)
+
+        if user is None:
+            return None
+
+        role = user.role
+        USERS_CACHE.set(key, role)
+
+    return role
+
+
+def authenticate(access_token: str) -> str:
+    """
+    :param access_token: Токен пользователя
+    :return: id пользователя из токена
+
+    Ошибки токена (`ExpiredSignatureError`, `DecodeError`, `InvalidTokenError`) пробрасываются как при `decode_token`,
+    если пользователя нет - `UserDoesNotExists`
+    """
+
+    user_id = decode_token(access_token)['sub']
+
+    if get_user_role(user_id) is None:
+        raise UserDoesNotExists
+
+    return user_id
+
+
+class UsersCacheInvalidator:
+    """
+    Сбрасывает записи `USERS_CACHE` по сообщениям из канала Redis pub/sub `User.USERS_CHANNEL`, в который сервер
+    авторизации публикует id удаленных пользователей и пользователей со смененной ролью.
+
+    Подписка выполняется в фоновом потоке каждого процесса API. Пока подписки нет (потеряно соединение с Redis),
+    сообщения могут быть пропущены, поэтому после переподключения кэш очищается полностью.
+    """
+
+    def __init__(self, app: Flask, cache: TTLCache = USERS_CACHE, retry_interval: float = 1.0):
+        """
+        :param app: Приложение с `redis`
+        :param cache: Кэш пользователей
+        :param retry_interval: Пауза перед переподключением к Redis в секундах
+        """
+
+        self.app = app
+        self.cache = cache
+        self.retry_interval = retry_interval
+        self._reconnect = False
+
+    def start(self) -> NoReturn:
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> NoReturn:
+        while True:
+            try:
+                pubsub = self.app.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(User.USERS_CHANNEL)
+
+                # Сообщения, опубликованные без подписки, потеряны
+                if self._reconnect:
+                    self.cache.clear()
+
+                self._reconnect = True
+
+                for message in pubsub.listen():
+                    self.invalidate(message['data'])
+            except Exception as e:
+                get_traceback.error(f'{e}')
+
+            time.sleep(self.retry_interval)
+
+    def invalidate(self, user_id: Union[bytes, str]) -> NoReturn:
+        """
+        :param user_id: id пользователя из сообщения
+        :return: `NoReturn`
+        """
+
+        user_id = user_id.decode() if isinstance(user_id, bytes) else str(user_id)
+        self.cache.pop(user_id)
+        console_logger.debug(f'User {user_id} removed from cache')
@@ -10,6 +10,7 @@ from flask_limiter.util import get_remote_address
 from flask_mail import Mail
 from flask_restful import Api
 from kallosus_packages.over_logging import Logger
+from redis import Redis
 
 import env_register  # noqa
 from config import DEBUG
@@ -142,6 +143,17 @@ class KallosusApplication:
         )
         console_logger.info('Limiter initialized')
 
+    def _init_redis(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+
+        Подключение к Redis для публикации изменений пользователей и задач (`User.publish_changed`,
+        `Task.publish_status`), которые получает nn-server
+        """
+
+        self._app.redis = Redis.from_url(self._app.config['KALLOSUS_REDIS_URL'])
+        console_logger.info('Redis initialized')
+
     def create_app(self) -> Flask:
         """
         :return: `Flask`
@@ -192,6 +204,7 @@ class KallosusApplication:
         self._init_jwt()
         self._init_mail()
         self._init_limiter()
+        self._init_redis()
         self._app.mail = self._mail
 
         self._init_db()
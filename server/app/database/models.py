@@ -4,7 +4,9 @@ try:
     from .db import db
 except ImportError:
     from db import db
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.orm import load_only
 
 from flask import current_app
 from flask_bcrypt import generate_password_hash, check_password_hash
@@ -13,9 +15,10 @@ from redis.exceptions import RedisError
 from rq.exceptions import NoSuchJobError
 from rq.job import Job
 from typing import Self, Union, NoReturn
+import hashlib
 import json
 import pytz
-from sqlalchemy import asc as sql_asc_sort
+from sqlalchemy import asc as sql_asc_sort, tuple_
 
 from datetime import datetime
 
@@ -83,6 +86,12 @@ class User(db.Model):
     Дата создания записи по Московскому времени
     """
 
+    USERS_CHANNEL = 'pd-users:changed'
+    """
+    Канал Redis pub/sub, в который публикуются id удаленных пользователей и пользователей со смененной ролью
+    (сброс кэша пользователей nn-server, `utils.auth`)
+    """
+
     def update_role(self, new_role: str) -> NoReturn:
         """
         Обновляет роль пользователя.
@@ -92,6 +101,7 @@ class User(db.Model):
 
         self.role = new_role
         self.save_to_db()
+        self.publish_changed(self.id)
 
     def update_last_login(self) -> NoReturn:
         """
@@ -187,8 +197,23 @@ class User(db.Model):
         Удаляем текущего пользователя из БД
         """
 
+        user_id = self.id
+
         db.session.delete(self)
         db.session.commit()
+        self.publish_changed(user_id)
+
+    @classmethod
+    def publish_changed(cls, user_id: int) -> NoReturn:
+        """
+        :param user_id: id удаленного пользователя или пользователя со смененной ролью
+        :return: `NoReturn`
+        """
+
+        try:
+            current_app.redis.publish(cls.USERS_CHANNEL, str(user_id))
+        except (RedisError, AttributeError) as e:
+            get_traceback.error(f'{e}')
 
     def set_subscribe(self, subscribe: bool) -> NoReturn:
         """
@@ -238,6 +263,15 @@ class Task(db.Model):
     Название таблицы
     """
 
+    __table_args__ = (
+        db.Index('ix_task_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_task_job_id', 'job_id'),
+        db.Index('ix_task_status', 'status'),
+    )
+    """
+    Индексы для постраничного списка задач пользователя, поиска по `job_id` и по статусу (`JobReaper`)
+    """
+
     id = db.Column(db.BigInteger, primary_key=True, unique=True, autoincrement=True, nullable=False)
     """
     id элемента таблицы
@@ -261,27 +295,27 @@ class Task(db.Model):
     """
     _STATUSES = ['queue', 'run', 'complete', 'stopped', 'error']
 
-    user_current_time_folders = db.Column(MutableList.as_mutable(db.PickleType), default=[])
+    user_current_time_folders = db.Column(MutableList.as_mutable(JSONB), default=list)
     """
     Пути к папкам пользователя, где лежат src видео:
     S3/user_id/dd_mm_yy/time
     `[S3/user_id_1/dd_mm_yy/time, S3/user_id_1/dd_mm_yy/time2]`
     """
 
-    queue_files = db.Column(MutableList.as_mutable(db.PickleType), default=[])
+    queue_files = db.Column(MutableList.as_mutable(JSONB), default=list)
     """
     `.mp4, .jpg, .png` файлы, которые должны быть обработаны моделью ML
     `[file.mp4, file2.mp4]`
     """
 
-    done_res_files = db.Column(MutableList.as_mutable(db.PickleType), default=[])
+    done_res_files = db.Column(MutableList.as_mutable(JSONB), default=list)
     """
     Список json файлов, которые уже обработаны
     """
 
-    is_files_upload = db.Column(db.Text, nullable=True)
+    is_files_upload = db.Column(JSONB, nullable=True)
     """
-    `dict` объект, показывающей, сохранены ли успешно все файлы, если хоть что-то False,
+    `dict` объект (JSONB), показывающей, сохранены ли успешно все файлы, если хоть что-то False,
     то может быть ошибка:
         {'test-videos/cars_test.mp4': [
             {'video': True}, - Загружено ли выходное видео в S3
@@ -291,7 +325,7 @@ class Task(db.Model):
         }
     """
 
-    created_at = db.Column(db.DateTime, default=datetime.now(pytz.timezone('Europe/Moscow')), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(pytz.timezone('Europe/Moscow')), nullable=False)
     """
     Дата создания записи по Московскому времени
     """
@@ -303,7 +337,7 @@ class Task(db.Model):
         Достаем из в БД `is_files_upload`
         """
 
-        return json.loads(self.is_files_upload) if self.is_files_upload else self.is_files_upload
+        return self.is_files_upload
 
     @upload_data.setter
     def upload_data(self, upload_data: dict) -> NoReturn:
@@ -312,7 +346,7 @@ class Task(db.Model):
         Заносим в БД `is_files_upload`
         """
 
-        self.is_files_upload = json.dumps(upload_data)
+        self.is_files_upload = upload_data
 
     def launch_task(self, *args, **kwargs) -> NoReturn:
         """
@@ -344,6 +378,27 @@ class Task(db.Model):
 
         db.session.commit()
 
+    @staticmethod
+    def launch_render(res_file: str, at_front: bool = False) -> Job:
+        """
+        :param res_file: Путь до json с результатами обработки видео
+        :param at_front: Поднять задачу в начало очереди (видео запрошено пользователем)
+        :return: `Job` отрисовки видео с bbox, для одного `res_file` существует не более одной задачи
+        """
+
+        queue = current_app.render_queue
+        job_id = f'render-{hashlib.md5(res_file.encode()).hexdigest()}'
+        job = queue.fetch_job(job_id)
+
+        if job is not None and job.get_status() not in ['failed', 'stopped', 'canceled']:
+            if at_front and job.get_status() == 'queued':
+                queue.remove(job)
+                queue.enqueue_job(job, at_front=True)
+
+            return job
+
+        return queue.enqueue('task.render.render_video', res_file, job_id=job_id, job_timeout=-1, at_front=at_front)
+
     def finish_task(self, output_files: list, is_files_upload: dict, error: bool = False) -> NoReturn:
         """
         :param output_files: путь к выходным файлам
@@ -362,6 +417,7 @@ class Task(db.Model):
         self.queue_files.clear()
 
         db.session.commit()
+        self.publish_status()
 
     def get_rq_job(self) -> Union[Job, None]:
         """
@@ -409,6 +465,27 @@ class Task(db.Model):
 
         self.status = status
         self.save_to_db()
+        self.publish_status()
+
+    @staticmethod
+    def channel(task_id: int) -> str:
+        """
+        :param task_id: id задачи
+        :return: Канал Redis pub/sub, в который публикуются статус и прогресс задачи (см. `StatusStreamApi`)
+        """
+
+        return f'pd-task:{task_id}'
+
+    def publish_status(self) -> NoReturn:
+        """
+        :return: `NoReturn`
+        Публикует статус задачи подписчикам канала задачи
+        """
+
+        try:
+            current_app.redis.publish(self.channel(self.id), json.dumps({'status': self.status}))
+        except (RedisError, AttributeError) as e:
+            get_traceback.error(f'{e}')
 
     def save_to_db(self) -> NoReturn:
         """
@@ -439,10 +516,11 @@ class Task(db.Model):
         return cls.query.filter_by(job_id=job_id).first()
 
     @classmethod
-    def find_by_user_id(cls, user_id: int, first: bool = True) -> Self:
+    def find_by_user_id(cls, user_id: int, first: bool = True, columns: Union[list[str], None] = None) -> Self:
         """
         :param user_id: id пользователя
         :param first: Получить только первую запись
+        :param columns: Загружаемые колонки, None - все (остальные колонки загружаются при обращении)
 
         :return: class 'database.models.User'
         Получаем сущности БД по `user_id`
@@ -450,6 +528,9 @@ class Task(db.Model):
 
         rec = cls.query.filter_by(user_id=user_id)
 
+        if columns:
+            rec = rec.options(load_only(*[getattr(cls, column) for column in columns]))
+
         if first:
             rec = rec.first()
         else:
@@ -457,6 +538,48 @@ class Task(db.Model):
 
         return rec
 
+    @classmethod
+    def find_page_by_user_id(cls,
+                             user_id: int,
+                             limit: int,
+                             cursor: Union[tuple[datetime, int], None] = None,
+                             columns: Union[list[str], None] = None,
+                             ) -> list[Self]:
+        """
+        :param user_id: id пользователя
+        :param limit: Количество задач на странице
+        :param cursor: (`created_at`, `id`) последней задачи предыдущей страницы, None - первая страница
+        :param columns: Загружаемые колонки, None - все (`id` и `created_at` загружаются всегда)
+
+        :return: list 'database.models.Task'
+
+        Задачи пользователя от новых к старым. Страница выбирается по курсору, а не по `OFFSET`, поэтому
+        запрос использует индекс `ix_task_user_id_created_at` и не зависит от номера страницы
+        """
+
+        rec = cls.query.filter_by(user_id=user_id)
+
+        if columns is not None:
+            columns = {'created_at', *columns}
+            rec = rec.options(load_only(*[getattr(cls, column) for column in columns]))
+
+        if cursor is not None:
+            rec = rec.filter(tuple_(cls.created_at, cls.id) < tuple_(*cursor))
+
+        return rec.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit).all()
+
+    @classmethod
+    def find_by_status(cls, status: str) -> list[Self]:
+        """
+        :param status: Статус задачи, один из `_STATUSES`
+
+        :return: list 'database.models.Task'
+
+        Поиск задач по статусу (например, задачи в `run`, воркер которых мог упасть)
+        """
+
+        return cls.query.filter_by(status=status).all()
+
     @classmethod
     def find_by_id(cls, task_id: int) -> Self:
         """
@@ -471,6 +594,24 @@ class Task(db.Model):
 
         return rec
 
+    @classmethod
+    def find_by_ids(cls, task_ids: list[int], user_id: Union[int, None] = None) -> list[Self]:
+        """
+        :param task_ids: id задач
+        :param user_id: id пользователя, None - задачи любых пользователей
+
+        :return: list 'database.models.Task'
+
+        Поиск нескольких задач одним запросом (`IN`)
+        """
+
+        rec = cls.query.filter(cls.id.in_(task_ids))
+
+        if user_id is not None:
+            rec = rec.filter_by(user_id=user_id)
+
+        return rec.all()
+
 
 if __name__ == '__main__':
     from app import KallosusNNApplication
@@ -0,0 +1,38 @@
+"""Added task indexes for result pagination, job_id and status lookups
+
+Revision ID: 7d2c5f1a9e3b
+Revises: b51bbc807211
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+from migrations.utils import index_exists
+
+# revision identifiers, used by Alembic.
+revision = '7d2c5f1a9e3b'
+down_revision = 'b51bbc807211'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_task_user_id_created_at': ['user_id', 'created_at'],  # Постраничный список задач пользователя
+    'ix_task_job_id': ['job_id'],
+    'ix_task_status': ['status'],  # Задачи в run (`JobReaper`)
+}
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY не блокирует запись в task на время построения индекса,
+    # но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES.items():
+            if not index_exists('task', name):
+                op.create_index(name, 'task', columns, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            if index_exists('task', name):
+                op.drop_index(name, table_name='task', postgresql_concurrently=True)
@@ -0,0 +1,36 @@
+"""Added JSONB copies of task PickleType columns
+
+Revision ID: 9a4e6b2c1d8f
+Revises: 7d2c5f1a9e3b
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+from migrations.utils import column_exists
+
+# revision identifiers, used by Alembic.
+revision = '9a4e6b2c1d8f'
+down_revision = '7d2c5f1a9e3b'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ['queue_files_jsonb', 'done_res_files_jsonb', 'user_current_time_folders_jsonb', 'is_files_upload_jsonb']
+
+
+def upgrade():
+    # Колонки без значения по умолчанию добавляются без перезаписи таблицы,
+    # данные переносятся порциями: `python -m migrations.backfill`
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in COLUMNS:
+            if not column_exists('task', column):
+                batch_op.add_column(sa.Column(column, postgresql.JSONB(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        for column in COLUMNS:
+            if column_exists('task', column):
+                batch_op.drop_column(column)
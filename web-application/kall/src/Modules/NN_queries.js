@@ -22,11 +22,45 @@ const get_status = async (storedAccessToken, currentTask_id) => {
     }
 };
 
+// Поток статуса задачи (Server-Sent Events): первым событием приходит текущий статус, затем только изменившиеся поля.
+// EventSource сам переподключается при обрыве соединения, onError вызывается, если сервер отклонил подключение
+const subscribe_status = (storedAccessToken, currentTask_id, onStatus, onError) => {
+    const params = new URLSearchParams({access_token: storedAccessToken, task_id: currentTask_id});
+    const source = new EventSource(URL_nn() + 'pd/v1.0.0/status/stream?' + params.toString());
+
+    source.onmessage = event => {
+        const result = JSON.parse(event.data);
+        onStatus(result);
+
+        if (['complete', 'error', 'stopped'].includes(result.status)) {
+            source.close();
+        }
+    };
+
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && onError) {
+            onError();
+        }
+    };
+
+    return source;
+};
+
+// Ссылка на плейлист HLS (`preview` из статуса задачи или `dst` результата с расширением .m3u8),
+// сегменты в котором подписаны сервером. Пока видео обрабатывается, плеер сам перезапрашивает плейлист
+const preview_url = (storedAccessToken, path) => {
+    const params = new URLSearchParams({access_token: storedAccessToken, path: path});
+    return URL_nn() + 'pd/v1.0.0/preview?' + params.toString();
+};
+
+// Видео с bbox сохраняется плейлистом HLS, который можно смотреть во время обработки (preview_url).
+// Если на сервере нет ffmpeg, видео сохраняется в mp4
 const predict = async (storedAccessToken, links_dict) => {
     try {
         const response = await axios.post(URL_nn() + 'pd/v1.0.0/predict', {
             access_token: storedAccessToken,
-            queue_files: links_dict
+            queue_files: links_dict,
+            video_format: 'hls'
         }, {
             headers: {
                 'Accept': 'application/json',
@@ -143,4 +177,4 @@ const handleError = (error) => {
     throw error;
 };
 
-export { get_status, predict, get_results, get_result, create_folders, stop };
\ No newline at end of file
+export { get_status, subscribe_status, preview_url, predict, get_results, get_result, create_folders, stop };
\ No newline at end of file
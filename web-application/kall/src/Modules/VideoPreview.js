@@ -1,7 +1,8 @@
 import React, { useRef, useState, useEffect } from 'react';
 import ReactPlayer from 'react-player';
 
-const VideoPreview = ({ url, homepage }) => {
+// hls - url ведет на плейлист HLS (см. preview_url), который во время обработки видео еще пополняется
+const VideoPreview = ({ url, homepage, hls = false }) => {
     const playerRef = useRef(null);
     const [isUserInteracted, setIsUserInteracted] = useState(homepage);
     const [hasEnded, setHasEnded] = useState(false);
@@ -73,6 +74,13 @@ const VideoPreview = ({ url, homepage }) => {
                     muted={homepage}
                     onEnded={handleEnded}
                     onError={handleError}
+                    config={{
+                        file: {
+                            forceHLS: hls,
+                            // Воспроизведение с начала видео, а не с последнего загруженного сегмента
+                            hlsOptions: {startPosition: 0},
+                        },
+                    }}
                 />
             )}
         </div>
@@ -5,7 +5,7 @@ import ProgressBar from "../Modules/ProgressBar";
 
 import {getObjectFromS3, getSignedUrl, uploadObjectToS3} from '../Modules/s3Helper';
 import Matrix from "../Modules/Matrix";
-import {create_folders, get_results, get_status, predict, stop} from "../Modules/NN_queries";
+import {create_folders, get_results, get_status, predict, preview_url, stop, subscribe_status} from "../Modules/NN_queries";
 import Alert from "../Modules/Alert";
 import "./LK.css"
 import ChartModule from "../Modules/Chart";
@@ -40,6 +40,8 @@ function LK() {
 
     const [infect, setInfect] = useState([]);
     const [videoUrl, setVideoUrl] = useState('');
+    const [isHls, setIsHls] = useState(false);
+    const [preview, setPreview] = useState('');  // Плейлист обрабатываемого видео
     const [videoDate, setVideoDate] = useState('');
     //const [videoDate, setVideoDate] = useState('');
 
@@ -244,54 +246,56 @@ function LK() {
     }, [currentTask_id, storedTask_id]);
 
     useEffect(() => {
+        if (!loading || !currentTask_id) {
+            return;
+        }
 
-        if ((status === "queue" || status === "run" || status === "complete") && loading && currentTask_id) {
-            const interval = setInterval(() => {
-                get_status(storedAccessToken, currentTask_id)
-                    .then(result => {
-                        setBar(result.progress);
-                        setStatus(result.status);
-                        setEta(result.eta);
-                    })
-                    .catch(error => {
-                        setErrorMessage(`Ошибка при получении статуса обработки: ${error}`);
-                        setOpen(true)
-                    });
-                if (status === "complete") {
-                    clearInterval(interval);
-                    setLoading(false);
-                    setCurrentTask_id(0);
-                    localStorage.removeItem('Task_id')
-                    setBar(0);
-                    setStatus('');
-                    setIsProgressModalOpen(false)
-                    get_results(storedAccessToken)
-                        .then(result => {
-                            setPrevFiles(removeEmptyElements(result.files))
-                            setCurrentVideoIndex((removeEmptyElements(result.files)).length - 1)
-                        })
-                        .catch(error => {
-                            setErrorMessage(`Ошибка при получении истории результатов анализа: ${error}`);
-                            setOpen(true)
-                        })
-
-                    window.location.href = '/lk';
-
-                } else if (status === 'error') {
-                    clearInterval(interval);
-                    setLoading(false);
-                    setCurrentTask_id(0);
-                    localStorage.removeItem('Task_id')
-                    setBar(0);
-                    setStatus('');
-                    setIsProgressModalOpen(false)
-                    setErrorMessage(`Ошибка при формировании ответа, попробуйте еще раз или обратитесь в поддержку!`);
+        // Прогресс, eta и статус приходят от сервера по мере обработки (Server-Sent Events), без опроса статуса
+        const source = subscribe_status(storedAccessToken, currentTask_id, result => {
+            if (result.progress !== undefined) setBar(result.progress);
+            if (result.status !== undefined) setStatus(result.status);
+            if (result.eta !== undefined) setEta(result.eta);
+            if (result.preview) setPreview(result.preview);
+        }, () => {
+            setErrorMessage(`Ошибка при получении статуса обработки`);
+            setOpen(true)
+        });
+
+        return () => source.close();
+    }, [loading, currentTask_id]);
+
+    useEffect(() => {
+        if (status === "complete") {
+            setLoading(false);
+            setCurrentTask_id(0);
+            localStorage.removeItem('Task_id')
+            setBar(0);
+            setStatus('');
+            setPreview('');
+            setIsProgressModalOpen(false)
+            get_results(storedAccessToken)
+                .then(result => {
+                    setPrevFiles(removeEmptyElements(result.files))
+                    setCurrentVideoIndex((removeEmptyElements(result.files)).length - 1)
+                })
+                .catch(error => {
+                    setErrorMessage(`Ошибка при получении истории результатов анализа: ${error}`);
                     setOpen(true)
-                }
+                })
 
-            }, 3000);
+            window.location.href = '/lk';
+
+        } else if (status === 'error') {
+            setLoading(false);
+            setCurrentTask_id(0);
+            localStorage.removeItem('Task_id')
+            setBar(0);
+            setStatus('');
+            setPreview('');
+            setIsProgressModalOpen(false)
+            setErrorMessage(`Ошибка при формировании ответа, попробуйте еще раз или обратитесь в поддержку!`);
+            setOpen(true)
         }
-
     }, [status]);
 
     useEffect(() => {
@@ -314,15 +318,21 @@ function LK() {
                     setChartData(jsonData.num_detected);
 
 
-                    getSignedUrl(jsonData.dst)
-                        .then(result => {
-                            setVideoUrl(result)
-                            //console.log(result)
-                        })
-                        .catch(error => {
-                            setErrorMessage(`Ошибка при получении видео: ${error}`);
-                            setOpen(true);
-                        })
+                    // Сегменты плейлиста HLS подписывает сервер, поэтому ссылка на плейлист не подписывается
+                    setIsHls(jsonData.dst.endsWith('.m3u8'));
+                    if (jsonData.dst.endsWith('.m3u8')) {
+                        setVideoUrl(preview_url(storedAccessToken, jsonData.dst));
+                    } else {
+                        getSignedUrl(jsonData.dst)
+                            .then(result => {
+                                setVideoUrl(result)
+                                //console.log(result)
+                            })
+                            .catch(error => {
+                                setErrorMessage(`Ошибка при получении видео: ${error}`);
+                                setOpen(true);
+                            })
+                    }
 
 
                     fetchImages(jsonData.source_of_infection);
@@ -346,7 +356,7 @@ function LK() {
                     const key = parts[parts.length - 1];
 
                     const response = await getObjectFromS3(bucket, key);
-                    const blob = new Blob([response.data.Body], {type: 'image/png'});
+                    const blob = new Blob([response.data.Body], {type: response.data.ContentType || 'image/png'});
                     const imageUrl = URL.createObjectURL(blob);
                     return [imageUrl, item[1]];
                 })
@@ -444,7 +454,7 @@ function LK() {
                         {infect.length > 0 && (
                             <>
                             <ErrorBoundary>
-                                <VideoPreview url={videoUrl} homepage={false}/>
+                                <VideoPreview url={videoUrl} homepage={false} hls={isHls}/>
                             </ErrorBoundary>
                                 <div >
                                     <ChartModule data={chartData}/>
@@ -498,6 +508,12 @@ function LK() {
                                 </div>
                                 <button className="stop" onClick={handleStop}>Стоп</button>
                             </div>
+                            {preview && (
+                                // Уже обработанная часть видео, пополняется по мере обработки
+                                <ErrorBoundary>
+                                    <VideoPreview url={preview_url(storedAccessToken, preview)} homepage={false} hls={true}/>
+                                </ErrorBoundary>
+                            )}
                         </div>
                     </div>
                 )}